@@ -0,0 +1,96 @@
+import threading
+import time
+
+# Quality levels from best to cheapest: (name, run detection every k-th frame, input scale)
+QUALITY_LEVELS = [
+    ("full", 1, 1.0),
+    ("skip2", 2, 1.0),
+    ("skip2_scaled", 2, 0.75),
+    ("skip3_scaled", 3, 0.5),
+    ("skip4_scaled", 4, 0.5),
+]
+
+
+class QualityController:
+    """Adaptive frame skipping and input scaling driven by inference load.
+
+    Every detector run reports its latency and the inference queue depth.
+    When the effective cost per frame (latency / k) exceeds the budget for
+    ``target_fps``, or frames are queueing up, the controller steps down to
+    a cheaper level; when there is plenty of headroom it steps back up.
+    Changes are rate-limited by ``cooldown`` seconds to avoid flapping.
+
+    ``keyframe_interval`` sets the detector cadence at full quality; with an
+    object tracker carrying boxes between keyframes it can be above 1
+    even when there is no load.
+    """
+
+    def __init__(self, target_fps=15.0, max_queue_depth=1, cooldown=2.0, levels=QUALITY_LEVELS,
+                 keyframe_interval=1):
+        self.target_fps = target_fps
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.max_queue_depth = max_queue_depth
+        self.cooldown = cooldown
+        self.levels = levels
+        self.level = 0
+        self.avg_latency_ms = 0.0
+        self._changed_at = 0.0
+        self._frame_counts = {}
+        self._lock = threading.Lock()
+
+    @property
+    def budget_ms(self):
+        return 1000.0 / self.target_fps
+
+    @property
+    def detect_every(self):
+        return max(self.keyframe_interval, self.levels[self.level][1])
+
+    @property
+    def scale(self):
+        return self.levels[self.level][2]
+
+    def should_detect(self, source_id):
+        """True if this frame from ``source_id`` should go through the detector."""
+        with self._lock:
+            count = self._frame_counts.get(source_id, 0)
+            self._frame_counts[source_id] = count + 1
+            return count % max(self.keyframe_interval, self.levels[self.level][1]) == 0
+
+    def forget(self, source_id):
+        with self._lock:
+            self._frame_counts.pop(source_id, None)
+
+    def record(self, latency_ms, queue_depth=0):
+        """Feed one detector run's latency and the current backlog."""
+        now = time.monotonic()
+        with self._lock:
+            if self.avg_latency_ms == 0.0:
+                self.avg_latency_ms = latency_ms
+            else:
+                self.avg_latency_ms += 0.2 * (latency_ms - self.avg_latency_ms)
+            if now - self._changed_at < self.cooldown:
+                return
+
+            cost_ms = self.avg_latency_ms / max(self.keyframe_interval, self.levels[self.level][1])
+            if (cost_ms > self.budget_ms or queue_depth > self.max_queue_depth) \
+                    and self.level < len(self.levels) - 1:
+                self.level += 1
+                self._changed_at = now
+            elif cost_ms < 0.5 * self.budget_ms and queue_depth == 0 and self.level > 0:
+                self.level -= 1
+                self._changed_at = now
+                # The last average was measured at the cheaper level; start fresh
+                self.avg_latency_ms = 0.0
+
+    def mode(self):
+        with self._lock:
+            name, detect_every, scale = self.levels[self.level]
+            return {
+                "mode": name,
+                "level": self.level,
+                "detect_every": max(self.keyframe_interval, detect_every),
+                "scale": scale,
+                "target_fps": self.target_fps,
+                "avg_latency_ms": round(self.avg_latency_ms, 2)
+            }
@@ -0,0 +1,374 @@
+"""Offline analysis of recorded inspection footage.
+
+Streams video files and image folders through the same detector, object
+tracker and barcode stages as the live server, as fast as the CPU allows
+rather than in real time. Every input is read by a decode thread a few
+frames ahead of the detector, frames are run through the detector in
+batches, and with ``--workers`` several inputs are processed in parallel
+worker processes. Only a bounded number of frames and results are in
+flight at any time, so memory stays flat however long the footage is.
+
+Results go to a JSONL file (one line per analyzed frame) and/or to the
+events database the dashboard's history endpoints read, as new object
+tracks and newly seen codes timestamped with the recording time.
+
+    python analyze.py shift-2024-06-01/ --output shift.jsonl --workers 4
+    python analyze.py gate3.mp4 --db instance/events.db --stride 3 --start 2024-06-01T06:00:00
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import cv2
+
+VIDEO_EXTENSIONS = {".mp4", ".avi", ".mov", ".mkv", ".m4v", ".webm"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+class Source(NamedTuple):
+    name: str  # Reported as the source id
+    kind: str  # 'video' or 'images'
+    files: list
+
+
+def find_sources(paths):
+    """Expand inputs into sources: each video is one, a folder's images are one sequence."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+            images = [f for f in files if os.path.splitext(f)[1].lower() in IMAGE_EXTENSIONS]
+            if images:
+                sources.append(Source(path.rstrip("/"), "images", images))
+            sources.extend(find_sources([f for f in files if os.path.splitext(f)[1].lower() in VIDEO_EXTENSIONS]))
+        elif os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS:
+            sources.append(Source(path, "video", [path]))
+        elif os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            sources.append(Source(path, "images", [path]))
+        else:
+            raise ValueError(f"Not a video, image or folder: {path}")
+    return sources
+
+
+def read_frames(source, stride=1, start=None):
+    """Yield ``(index, timestamp, frame)`` for every ``stride``-th frame of a source.
+
+    Video timestamps are ``start`` plus the position in the video; without
+    ``start`` the file's modification time is taken as the end of the
+    recording. Images are timestamped with their modification time.
+    """
+    if source.kind == "images":
+        for index, path in enumerate(source.files):
+            if index % stride:
+                continue
+            frame = cv2.imread(path)
+            if frame is not None:
+                yield index, os.path.getmtime(path), frame
+        return
+
+    cap = cv2.VideoCapture(source.files[0])
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video: {source.files[0]}")
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        if start is None:
+            start = os.path.getmtime(source.files[0]) - cap.get(cv2.CAP_PROP_FRAME_COUNT) / fps
+        index = 0
+        while True:
+            # grab() skips the colour conversion and copy of frames we don't analyze
+            if not cap.grab():
+                break
+            if index % stride == 0:
+                ok, frame = cap.retrieve()
+                if not ok:
+                    break
+                yield index, start + index / fps, frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def prefetch(iterable, depth=8):
+    """Run ``iterable`` in a background thread, keeping at most ``depth`` items ready."""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # Gives up once the consumer has gone away instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def fill():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(done)
+        except BaseException as e:
+            put(e)
+
+    thread = threading.Thread(target=fill, name="decode", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = items.get()
+            if item is done:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def analyze_source(source, detector, scanner, batch_size=8, stride=1, start=None):
+    """Yield one result record per analyzed frame of ``source``.
+
+    Detections get track ids from an ``ObjectTracker`` and codes are
+    deduplicated by a ``BarcodeTracker``, both clocked by the recording
+    time, so ``new_tracks`` and ``new_codes`` are the same events the
+    live server would have raised.
+    """
+    from barcodes import BarcodeTracker
+    from detection import analyze_frame
+    from tracking import ObjectTracker
+
+    now = [0.0]
+    tracker = ObjectTracker(clock=lambda: now[0])
+    code_tracker = BarcodeTracker(clock=lambda: now[0])
+    for batch in batched(prefetch(read_frames(source, stride, start)), batch_size):
+        results = detector.predict_batch([frame for _, _, frame in batch])
+        for (index, timestamp, frame), result in zip(batch, results):
+            now[0] = timestamp
+            _, detections, codes = analyze_frame(frame, lambda _: result, scanner=scanner,
+                                                 source_id=source.name, annotate=False)
+            detections = tracker.update(detections)
+            new_codes = code_tracker.update(source.name, codes)
+            yield {
+                "source_id": source.name,
+                "frame": index,
+                "timestamp": round(timestamp, 3),
+                "detections": detections,
+                "codes": codes,
+                "new_tracks": tracker.started,
+                "new_codes": new_codes
+            }
+
+
+# Worker processes: each loads its own detector and streams record chunks back to the parent
+_worker = {}
+
+
+def _init_worker(results, started, model_path, backend, threads, batch_size, stride, start, records=None):
+    cv2.setNumThreads(threads)
+    _worker.update(results=results, started=started, model_path=model_path, backend=backend, threads=threads,
+                   batch_size=batch_size, stride=stride, start=start, records=records or _analyze)
+
+
+def _analyze(source):
+    if "detector" not in _worker:
+        # Loaded here rather than in the pool initializer, where a failure makes the pool
+        # respawn workers forever instead of reporting it
+        from barcodes import BarcodeScanner
+        from detectors import load_detector
+        _worker["detector"] = load_detector(_worker["model_path"], _worker["backend"], _worker["threads"])
+        _worker["scanner"] = BarcodeScanner(max_workers=_worker["threads"])
+    return analyze_source(source, _worker["detector"], _worker["scanner"],
+                          _worker["batch_size"], _worker["stride"], _worker["start"])
+
+
+def _run_source(source):
+    results = _worker["results"]
+    # Tells the parent which process to watch for this source. A SimpleQueue writes before
+    # returning, where a Queue's feeder thread could die with the process before sending it
+    _worker["started"].put((source.name, os.getpid()))
+    frames, error = 0, None
+    try:
+        for chunk in batched(_worker["records"](source), 32):
+            results.put(("records", chunk))
+            frames += len(chunk)
+    except Exception as e:
+        error = repr(e)
+    results.put(("done", source.name, frames, error))
+
+
+def run_parallel(sources, workers, model_path, backend, threads, batch_size, stride, start,
+                 records=None, poll_interval=1.0):
+    """Analyze sources in worker processes, yielding records as they arrive.
+
+    Yields ``("records", [record, ...])`` chunks and one
+    ``("done", source_id, frames, error)`` per source. A worker process
+    that dies (out of memory, a crash in native code) takes its source's
+    task with it and the pool never finishes; that source is reported
+    failed instead of waited for. ``records(source)`` replaces the
+    per-source analysis in the workers.
+    """
+    ctx = mp.get_context("spawn")
+    # Bounded, so workers pause rather than piling up results the writer hasn't caught up with
+    results = ctx.Queue(maxsize=workers * 4)
+    started = ctx.SimpleQueue()
+    with ctx.Pool(workers, initializer=_init_worker,
+                  initargs=(results, started, model_path, backend, threads, batch_size, stride, start,
+                            records)) as pool:
+        outcome = pool.map_async(_run_source, sources, chunksize=1)
+        pending = {source.name for source in sources}
+        running, frames = {}, {}
+        while pending:
+            while not started.empty():
+                name, pid = started.get()
+                if name in pending:
+                    running[name] = pid
+            try:
+                message = results.get(timeout=poll_interval)
+            except queue.Empty:
+                alive = {process.pid for process in mp.active_children()}
+                lost = {name: f"worker process {pid} exited" for name, pid in running.items() if pid not in alive}
+                if outcome.ready():
+                    # Every task returned, or the map itself failed, and these never reported back
+                    try:
+                        outcome.get(0)
+                        error = "worker never reported back"
+                    except Exception as e:
+                        error = repr(e)
+                    lost.update((name, lost.get(name, error)) for name in pending)
+                for name, error in lost.items():
+                    pending.discard(name)
+                    running.pop(name, None)
+                    yield "done", name, frames.get(name, 0), error
+                continue
+            if message[0] == "records" and message[1]:
+                name = message[1][0]["source_id"]
+                frames[name] = frames.get(name, 0) + len(message[1])
+            elif message[0] == "done":
+                pending.discard(message[1])
+                running.pop(message[1], None)
+            yield message
+
+
+def run_inline(sources, model_path, backend, threads, batch_size, stride, start):
+    """Same messages as ``run_parallel``, in this process."""
+    from barcodes import BarcodeScanner
+    from detectors import load_detector
+
+    detector = load_detector(model_path, backend, threads)
+    scanner = BarcodeScanner(max_workers=threads or 4)
+    for source in sources:
+        frames, error = 0, None
+        try:
+            for chunk in batched(analyze_source(source, detector, scanner, batch_size, stride, start), 32):
+                yield "records", chunk
+                frames += len(chunk)
+        except Exception as e:
+            error = repr(e)
+        yield "done", source.name, frames, error
+
+
+class EventWriter:
+    """Stores new tracks and codes in the events database, never dropping any."""
+
+    def __init__(self, path):
+        from events import EventStore
+        self.store = EventStore(path, max_pending=10000, drop_when_full=False).start()
+
+    def write(self, record):
+        self.store.record_detections(record["source_id"], record["new_tracks"], record["timestamp"])
+        self.store.record_barcodes(record["source_id"], record["new_codes"], record["timestamp"])
+
+    def close(self):
+        self.store.flush(timeout=60)
+        self.store.stop()
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = sys.stdout if path == "-" else open(path, "w")
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="Video files, images or folders of either")
+    parser.add_argument("--output", help="Write per-frame results as JSONL ('-' for stdout)")
+    parser.add_argument("--db", help="Record new tracks and codes in this events database")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "yolov8n.pt"))
+    parser.add_argument("--backend", default=os.environ.get("DETECTOR_BACKEND", "auto"))
+    parser.add_argument("--workers", type=int, default=1, help="Inputs analyzed in parallel processes")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Threads per worker (default: CPUs divided between workers)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per detector batch")
+    parser.add_argument("--stride", type=int, default=1, help="Analyze every Nth frame")
+    parser.add_argument("--start", help="Recording start time (ISO 8601) for video timestamps")
+    args = parser.parse_args()
+    if not args.output and not args.db:
+        parser.error("nothing to do: give --output and/or --db")
+
+    sources = find_sources(args.inputs)
+    start = datetime.fromisoformat(args.start).timestamp() if args.start else None
+    workers = max(1, min(args.workers, len(sources)))
+    threads = args.threads or max(1, (os.cpu_count() or 1) // workers)
+    writers = ([JsonlWriter(args.output)] if args.output else []) + ([EventWriter(args.db)] if args.db else [])
+
+    if workers > 1:
+        messages = run_parallel(sources, workers, args.model, args.backend, threads, args.batch_size,
+                                args.stride, start)
+    else:
+        messages = run_inline(sources, args.model, args.backend, threads, args.batch_size, args.stride, start)
+
+    began = time.perf_counter()
+    total, failed = 0, 0
+    try:
+        for message in messages:
+            if message[0] == "records":
+                for record in message[1]:
+                    for writer in writers:
+                        writer.write(record)
+                continue
+            _, name, frames, error = message
+            total += frames
+            if error:
+                failed += 1
+                print(f"{name}: failed after {frames} frames: {error}", file=sys.stderr)
+            else:
+                print(f"{name}: {frames} frames", file=sys.stderr)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    elapsed = time.perf_counter() - began
+    print(f"Analyzed {total} frames from {len(sources)} inputs in {elapsed:.1f}s "
+          f"({total / max(elapsed, 1e-9):.1f} frames/s)", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+from pyzbar.pyzbar import decode
+
+
+def decode_codes(image, offset=(0, 0)):
+    """Decode QR codes and barcodes, keeping their position in the frame.
+
+    ``offset`` is added to every coordinate so codes found in a crop are
+    reported in full-frame coordinates.
+    """
+    ox, oy = offset
+    codes_data = []
+    for code in decode(image):
+        x, y, w, h = code.rect
+        codes_data.append({
+            "data": code.data.decode('utf-8'),
+            "type": code.type,
+            "rect": [int(x + ox), int(y + oy), int(w), int(h)],
+            "polygon": [[int(p.x + ox), int(p.y + oy)] for p in code.polygon]
+        })
+    return codes_data
+
+
+def _pad(rect, padding, width, height):
+    x1, y1, x2, y2 = rect
+    pad_x = int((x2 - x1) * padding) + 8
+    pad_y = int((y2 - y1) * padding) + 8
+    return [max(0, x1 - pad_x), max(0, y1 - pad_y), min(width, x2 + pad_x), min(height, y2 + pad_y)]
+
+
+def _merge(rects):
+    """Merge overlapping [x1, y1, x2, y2] rects so no area is decoded twice."""
+    merged = [list(r) for r in rects]
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for rect in merged:
+            for other in result:
+                if rect[0] <= other[2] and other[0] <= rect[2] and rect[1] <= other[3] and other[1] <= rect[3]:
+                    other[0], other[1] = min(other[0], rect[0]), min(other[1], rect[1])
+                    other[2], other[3] = max(other[2], rect[2]), max(other[3], rect[3])
+                    changed = True
+                    break
+            else:
+                result.append(rect)
+        merged = result
+    return merged
+
+
+class BarcodeScanner:
+    """Region-of-interest barcode decoding driven by detector output.
+
+    Instead of scanning the whole frame every time, ``scan`` decodes
+    grayscale crops around the detector's boxes and around codes found in
+    the last ``memory_frames`` frames of the same source. Every
+    ``full_scan_every`` frames (and whenever there is nothing to look at)
+    it falls back to a full-frame scan so new codes outside any box are
+    still picked up. Independent crops are decoded in parallel; zbar runs
+    through ctypes, which releases the GIL.
+    """
+
+    def __init__(self, full_scan_every=10, padding=0.15, memory_frames=15, max_workers=4):
+        self.full_scan_every = max(1, int(full_scan_every))
+        self.padding = padding
+        self.memory_frames = memory_frames
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="barcode")
+        self._sources = {}
+        self._lock = threading.Lock()
+        self.full_scans = 0
+        self.roi_scans = 0
+
+    def forget(self, source_id):
+        with self._lock:
+            self._sources.pop(source_id, None)
+
+    def scan(self, frame, boxes=(), source_id=None):
+        """Decode codes in ``frame`` using ``boxes`` ([x1, y1, x2, y2]) as hints."""
+        height, width = frame.shape[:2]
+        gray = frame if frame.ndim == 2 else cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        with self._lock:
+            state = self._sources.setdefault(source_id, {"frame": 0, "recent": {}})
+            index = state["frame"]
+            state["frame"] += 1
+            recent = [rect for rect, seen in state["recent"].values() if index - seen <= self.memory_frames]
+
+        regions = _merge([_pad(rect, self.padding, width, height) for rect in list(boxes) + recent])
+        regions = [r for r in regions if r[2] - r[0] > 8 and r[3] - r[1] > 8]
+
+        full_scan = index % self.full_scan_every == 0 or not regions
+        with self._lock:
+            if full_scan:
+                self.full_scans += 1
+            else:
+                self.roi_scans += 1
+
+        if full_scan:
+            codes_data = decode_codes(gray)
+        else:
+            crops = [(gray[y1:y2, x1:x2], (x1, y1)) for x1, y1, x2, y2 in regions]
+            if len(crops) == 1:
+                found = [decode_codes(*crops[0])]
+            else:
+                found = list(self._executor.map(lambda crop: decode_codes(*crop), crops))
+            # Merged regions can't overlap, but keep results unique per code anyway
+            seen = set()
+            codes_data = []
+            for code in (c for codes in found for c in codes):
+                key = (code["type"], code["data"], tuple(code["rect"]))
+                if key not in seen:
+                    seen.add(key)
+                    codes_data.append(code)
+
+        with self._lock:
+            # Remember where each code was last seen so the next frames look there first
+            recent = state["recent"]
+            for key in [k for k, (_, seen) in recent.items() if index - seen > self.memory_frames]:
+                del recent[key]
+            for code in codes_data:
+                x, y, w, h = code["rect"]
+                recent[(code["type"], code["data"])] = ([x, y, x + w, y + h], index)
+
+        return codes_data
+
+    def snapshot(self):
+        with self._lock:
+            return {"full_scans": self.full_scans, "roi_scans": self.roi_scans}
+
+
+class BarcodeTracker:
+    """Deduplicates decoded codes across consecutive frames.
+
+    A code is identified by its type, data and approximate position: a
+    sighting within ``max_distance`` code-widths of the last position of a
+    tracked code with the same type and data is the same physical label.
+    Each tracked code keeps first-seen and last-seen timestamps and is
+    evicted once it has not been seen for ``ttl`` seconds. ``update``
+    returns only the codes seen for the first time, so consumers get one
+    event per scanned item instead of one per frame.
+    """
+
+    def __init__(self, ttl=10.0, max_distance=1.5, clock=time.time):
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.clock = clock
+        self._tracks = {}  # (source_id, type, data) -> list of tracks
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        for key in list(self._tracks):
+            tracks = [t for t in self._tracks[key] if now - t["last_seen"] <= self.ttl]
+            if tracks:
+                self._tracks[key] = tracks
+            else:
+                del self._tracks[key]
+
+    def update(self, source_id, codes_data):
+        """Record a frame's codes. Sets ``track_id`` on each and returns the new ones."""
+        now = self.clock()
+        new_codes = []
+        with self._lock:
+            self._evict(now)
+            for code in codes_data:
+                x, y, w, h = code["rect"]
+                center = (x + w / 2.0, y + h / 2.0)
+                limit = self.max_distance * max(w, h, 1)
+                tracks = self._tracks.setdefault((source_id, code["type"], code["data"]), [])
+                track = min(tracks, default=None,
+                            key=lambda t: abs(t["center"][0] - center[0]) + abs(t["center"][1] - center[1]))
+                if track is None or abs(track["center"][0] - center[0]) + abs(track["center"][1] - center[1]) > limit:
+                    track = {
+                        "track_id": self._next_id,
+                        "source_id": source_id,
+                        "type": code["type"],
+                        "data": code["data"],
+                        "first_seen": now,
+                        "sightings": 0
+                    }
+                    self._next_id += 1
+                    tracks.append(track)
+                    new_codes.append(code)
+                track["center"] = center
+                track["rect"] = code["rect"]
+                track["last_seen"] = now
+                track["sightings"] += 1
+                code["track_id"] = track["track_id"]
+        return new_codes
+
+    def active(self, source_id=None):
+        """Codes currently tracked, optionally for one source, oldest first."""
+        now = self.clock()
+        with self._lock:
+            self._evict(now)
+            tracks = [t for ts in self._tracks.values() for t in ts
+                      if source_id is None or t["source_id"] == source_id]
+        return [{
+            "track_id": t["track_id"],
+            "source_id": t["source_id"],
+            "type": t["type"],
+            "data": t["data"],
+            "rect": t["rect"],
+            "first_seen": t["first_seen"],
+            "last_seen": t["last_seen"],
+            "sightings": t["sightings"]
+        } for t in sorted(tracks, key=lambda t: t["first_seen"])]
@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """Micro-batching front end for a batched predict function.
+
+    Callers on any thread call ``predict(frame)`` and block until their
+    result is ready. A single scheduler thread collects pending frames for
+    up to ``max_wait_ms`` (or until ``max_batch_size`` frames are waiting),
+    runs ``predict_batch(frames)`` once for the whole batch and hands each
+    caller its own result. With several cameras streaming at once this
+    turns N single-frame forward passes into one batched pass.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=4, max_wait_ms=10):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.batches = 0
+        self.frames = 0
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        # Callers still waiting on frames that never made it into a batch
+        with self._cond:
+            leftover = list(self._pending)
+            self._pending.clear()
+        for _, future in leftover:
+            future.set_exception(RuntimeError("scheduler stopped"))
+
+    def submit(self, frame):
+        """Queue a frame and return a Future for its result."""
+        future = Future()
+        with self._cond:
+            self._pending.append((frame, future))
+            self._cond.notify()
+        return future
+
+    def predict(self, frame, timeout=None):
+        """Run ``frame`` through the next batch and return its result."""
+        if self._thread is None:
+            # Scheduler not running (e.g. tests or scripts): predict inline
+            return self.predict_batch([frame])[0]
+        return self.submit(frame).result(timeout)
+
+    def snapshot(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            "batches": self.batches,
+            "frames": self.frames,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0.0,
+            "pending": pending,
+        }
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._stop.is_set():
+                self._cond.wait(0.1)
+            if self._stop.is_set():
+                return []
+            # Hold the window open for more sources unless the batch is already full
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._pending), self.max_batch_size)
+            return [self._pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.predict_batch(frames)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"predict_batch returned {len(results)} results for {len(batch)} frames")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
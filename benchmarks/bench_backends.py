@@ -0,0 +1,118 @@
+"""Compare detector backends for latency and agreement with PyTorch.
+
+Runs every image in a folder through each backend given on the command
+line and reports per-image latency (mean, p50, p95) plus accuracy
+against the PyTorch model: precision and recall of each backend's boxes
+matched to the reference boxes (same class, IoU >= 0.5) and the mean
+IoU of the matches. Export the models first with detectors.py.
+
+    python benchmarks/bench_backends.py --images samples/ \\
+        --backend pytorch=yolov8n.pt \\
+        --backend onnx=yolov8n.onnx \\
+        --backend openvino=yolov8n_openvino_model \\
+        --backend openvino=yolov8n_int8_openvino_model --threads 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection import CONFIDENCE_THRESHOLD
+from detectors import load_detector
+from tracking import iou_matrix
+
+
+def load_images(folder):
+    images = []
+    for name in sorted(os.listdir(folder)):
+        image = cv2.imread(os.path.join(folder, name))
+        if image is not None:
+            images.append(image)
+    if not images:
+        raise SystemExit(f"No images found in {folder}")
+    return images
+
+
+def run_backend(detector, images, warmup):
+    for image in images[:warmup]:
+        detector.predict_batch([image])
+    times, outputs = [], []
+    for image in images:
+        start = time.perf_counter()
+        boxes = detector.predict_batch([image])[0].boxes
+        times.append((time.perf_counter() - start) * 1000)
+        outputs.append(boxes[boxes[:, 4] > CONFIDENCE_THRESHOLD])
+    return times, outputs
+
+
+def agreement(reference, candidate, iou_threshold=0.5):
+    """Greedy same-class IoU matching of candidate boxes against reference boxes."""
+    matched = ref_total = cand_total = 0
+    ious = []
+    for ref, cand in zip(reference, candidate):
+        ref_total += len(ref)
+        cand_total += len(cand)
+        iou = iou_matrix(ref[:, :4], cand[:, :4])
+        if iou.size:
+            iou = np.where(ref[:, None, 5] == cand[None, :, 5], iou, 0.0)
+        used = []
+        for r in range(len(ref)):
+            if not len(cand):
+                break
+            row = iou[r].copy()
+            row[used] = 0.0
+            c = int(np.argmax(row))
+            if row[c] >= iou_threshold:
+                used.append(c)
+                matched += 1
+                ious.append(row[c])
+    return {
+        "precision": round(matched / cand_total, 4) if cand_total else None,
+        "recall": round(matched / ref_total, 4) if ref_total else None,
+        "mean_iou": round(float(np.mean(ious)), 4) if ious else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", required=True, help="Folder of sample images")
+    parser.add_argument("--backend", action="append", required=True, metavar="BACKEND=MODEL",
+                        help="Backend and model path; the first one is the accuracy reference")
+    parser.add_argument("--threads", type=int, default=0, help="Threads per backend (0 = default)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    results = []
+    reference = None
+    print(f"{'backend':>10} {'model':>32} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'precision':>9} {'recall':>7} {'mean IoU':>8}")
+    for spec in args.backend:
+        backend, model_path = spec.split("=", 1)
+        detector = load_detector(model_path, backend, args.threads)
+        times, outputs = run_backend(detector, images, args.warmup)
+        if reference is None:
+            reference = outputs
+        row = dict({"backend": backend, "model": model_path,
+                    "mean_ms": round(float(np.mean(times)), 2),
+                    "p50_ms": round(float(np.percentile(times, 50)), 2),
+                    "p95_ms": round(float(np.percentile(times, 95)), 2)},
+                   **agreement(reference, outputs))
+        results.append(row)
+        print(f"{backend:>10} {model_path[-32:]:>32} {row['mean_ms']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+              f"{str(row['precision']):>9} {str(row['recall']):>7} {str(row['mean_iou']):>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"images": len(images), "threads": args.threads, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Compare YOLO throughput for different micro-batch sizes.
+
+Simulates several cameras pushing frames at once through BatchScheduler
+and reports total frames/second for each batch size.
+
+    python benchmarks/bench_batching.py --sources 8 --duration 15
+    python benchmarks/bench_batching.py --frames recorded/ --batch-sizes 1 2 4 8
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import BatchScheduler
+
+
+def load_frames(folder, width=640, height=480, count=8):
+    """Load sample frames from a folder, or make random ones if none is given."""
+    frames = []
+    if folder:
+        for name in sorted(os.listdir(folder)):
+            frame = cv2.imread(os.path.join(folder, name))
+            if frame is not None:
+                frames.append(frame)
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+    return frames
+
+
+def run_batch_size(model, frames, batch_size, sources, duration, window_ms):
+    scheduler = BatchScheduler(lambda batch: model(batch, verbose=False),
+                               max_batch_size=batch_size,
+                               max_wait_ms=window_ms).start()
+    latencies = []
+    latencies_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def camera(index):
+        i = index
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            scheduler.predict(frames[i % len(frames)])
+            with latencies_lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+            i += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=camera, args=(i,)) for i in range(sources)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    scheduler.stop()
+
+    stats = scheduler.snapshot()
+    return {
+        "batch_size": batch_size,
+        "frames": len(latencies),
+        "fps": round(len(latencies) / elapsed, 2),
+        "avg_batch_size": stats["avg_batch_size"],
+        "p50_latency_ms": round(float(np.percentile(latencies, 50)), 2) if latencies else 0.0,
+        "p95_latency_ms": round(float(np.percentile(latencies, 95)), 2) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--frames", help="Folder of sample images (random frames if omitted)")
+    parser.add_argument("--sources", type=int, default=8, help="Concurrent camera sources")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per batch size")
+    parser.add_argument("--window-ms", type=float, default=10.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    from ultralytics import YOLO
+    model = YOLO(args.model)
+    frames = load_frames(args.frames)
+    model(frames[0], verbose=False)  # Warm up before timing
+
+    results = []
+    print(f"{'batch':>6} {'fps':>8} {'avg batch':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for batch_size in args.batch_sizes:
+        row = run_batch_size(model, frames, batch_size, args.sources, args.duration, args.window_ms)
+        results.append(row)
+        print(f"{row['batch_size']:>6} {row['fps']:>8} {row['avg_batch_size']:>10} "
+              f"{row['p50_latency_ms']:>8} {row['p95_latency_ms']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"sources": args.sources, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
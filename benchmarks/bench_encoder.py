@@ -0,0 +1,75 @@
+"""Measure JPEG encode time and size across encoder settings.
+
+Encodes sample frames with cv2.imencode defaults (what the app used
+before) and with JpegEncoder at several quality / max-width settings, on
+every available backend (libjpeg-turbo needs PyTurboJPEG installed).
+
+    python benchmarks/bench_encoder.py --frames recorded/ --repeat 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoding import JpegEncoder, load_turbojpeg
+
+RESOLUTIONS = [(1280, 720), (1920, 1080)]
+SETTINGS = [(90, None), (80, None), (70, None), (80, 1280), (70, 960), (60, 640)]
+
+
+def sample_frames(folder):
+    if folder:
+        images = [cv2.imread(os.path.join(folder, n)) for n in sorted(os.listdir(folder))]
+        return [img for img in images if img is not None]
+    rng = np.random.default_rng(0)
+    frames = []
+    for width, height in RESOLUTIONS:
+        small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+        frames.append(cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC))
+    return frames
+
+
+def measure(encode, frame, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        jpeg = encode(frame)
+    return (time.perf_counter() - start) * 1000 / repeat, len(jpeg)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="Folder of sample frames (synthetic if omitted)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    backends = ["opencv"] + (["turbojpeg"] if load_turbojpeg() is not None else [])
+    results = []
+    print(f"{'frame':>10} {'backend':>10} {'quality':>8} {'max width':>10} {'ms':>8} {'bytes':>9}")
+    for frame in sample_frames(args.frames):
+        name = f"{frame.shape[1]}x{frame.shape[0]}"
+        ms, size = measure(lambda f: cv2.imencode('.jpg', f)[1].tobytes(), frame, args.repeat)
+        rows = [("imencode", 95, None, ms, size)]
+        for backend in backends:
+            for quality, max_width in SETTINGS:
+                encoder = JpegEncoder(quality=quality, max_width=max_width, backend=backend)
+                ms, size = measure(encoder.encode, frame, args.repeat)
+                rows.append((backend, quality, max_width, ms, size))
+        for backend, quality, max_width, ms, size in rows:
+            results.append({"frame": name, "backend": backend, "quality": quality,
+                            "max_width": max_width, "ms": round(ms, 3), "bytes": size})
+            print(f"{name:>10} {backend:>10} {quality:>8} {str(max_width):>10} {ms:>8.3f} {size:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Measure event store write throughput and query latency at scale.
+
+Fills a fresh events database with synthetic detection and barcode
+events spread over several weeks, through the same background batch
+writer the app uses, then times the audit queries.
+
+    python benchmarks/bench_event_store.py --rows 2000000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventStore
+
+LABELS = ["truck", "person", "car", "forklift", "container"]
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return len(rows), times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000, help="Detection events to insert")
+    parser.add_argument("--sources", type=int, default=8)
+    parser.add_argument("--days", type=int, default=30, help="Time span the events are spread over")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per query")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    start_ts = 1700000000.0
+    step = args.days * 86400.0 / args.rows
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = EventStore(os.path.join(tmpdir, "events.db"), max_pending=args.rows * 2).start()
+
+        start = time.perf_counter()
+        for i in range(args.rows):
+            ts = start_ts + i * step
+            source = f"lane{i % args.sources}"
+            store.record_detections(source, [{"label": rng.choice(LABELS), "confidence": 80.0,
+                                              "box": [0, 0, 10, 10], "track_id": i}], ts=ts)
+            if i % 4 == 0:
+                store.record_barcodes(source, [{"type": "CODE128", "data": f"CONT{i % 50000:07d}",
+                                                "rect": [0, 0, 10, 10]}], ts=ts)
+        store.flush(timeout=3600)
+        write_s = time.perf_counter() - start
+
+        end_ts = start_ts + args.days * 86400.0
+        queries = {
+            "sightings_of_one_code": lambda: store.barcode_sightings("CONT0001000"),
+            "one_code_on_one_source": lambda: store.barcode_sightings("CONT0001000", source_id="lane2"),
+            "label_events_in_one_hour": lambda: store.detection_events(
+                "truck", since=start_ts + 86400, until=start_ts + 90000, limit=1000),
+            "source_events_last_day": lambda: store.detection_events(
+                source_id="lane3", since=end_ts - 86400, limit=1000),
+            "hourly_counts_all": lambda: store.hourly_counts(),
+            "hourly_counts_one_day": lambda: store.hourly_counts(since=end_ts - 86400, until=end_ts),
+        }
+
+        results = {
+            "rows": store.snapshot()["written"],
+            "write_rows_per_s": round(store.snapshot()["written"] / write_s),
+            "database_mb": round(os.path.getsize(os.path.join(tmpdir, "events.db")) / 1e6, 1),
+            "queries": {}
+        }
+        print(f"{'query':>26} {'rows':>6} {'mean ms':>9} {'p95 ms':>9}")
+        for name, fn in queries.items():
+            count, times = timed(fn, args.repeat)
+            results["queries"][name] = {
+                "rows": count,
+                "mean_ms": round(float(np.mean(times)), 3),
+                "p95_ms": round(float(np.percentile(times, 95)), 3)
+            }
+            print(f"{name:>26} {count:>6} {np.mean(times):>9.3f} {np.percentile(times, 95):>9.3f}")
+        store.stop()
+
+    print(f"{results['rows']} rows written at {results['write_rows_per_s']} rows/s, "
+          f"{results['database_mb']} MB")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
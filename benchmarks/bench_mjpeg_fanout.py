@@ -0,0 +1,125 @@
+"""Measure /video CPU cost as the number of MJPEG viewers grows.
+
+Compares the old model, where every viewer runs its own process+encode
+loop, with the shared producer that encodes each frame once into the
+stream's ring buffer. The per-frame work is a stand-in for YOLO unless
+--model is given.
+
+    python benchmarks/bench_mjpeg_fanout.py --viewers 1 5 10 25 50
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streams import StreamState, FrameProducer
+
+
+def make_worker(model, width, height, fps):
+    """Return a function that 'captures', processes and encodes one frame."""
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    interval = 1.0 / fps
+
+    def work():
+        started = time.perf_counter()
+        if model is not None:
+            annotated = model(frame, verbose=False)[0].plot()
+        else:
+            annotated = cv2.GaussianBlur(frame, (9, 9), 0)
+        _, buffer = cv2.imencode('.jpg', annotated)
+        # Pace like a camera delivering frames at a fixed rate
+        remaining = interval - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        return buffer.tobytes()
+
+    return work
+
+
+def per_viewer(work, viewers, duration):
+    """Old behaviour: each viewer generator does its own capture/process/encode."""
+    stop_at = time.perf_counter() + duration
+    delivered = [0] * viewers
+
+    def viewer(index):
+        while time.perf_counter() < stop_at:
+            work()
+            delivered[index] += 1
+
+    return _run_viewers(viewer, viewers), sum(delivered)
+
+
+def shared(work, viewers, duration):
+    """New behaviour: one producer publishes into the ring, viewers read from it."""
+    stream = StreamState("bench")
+    producer = FrameProducer(lambda: stream.update(work(), [], []) or True, idle_timeout=0.5)
+    stop_at = time.perf_counter() + duration
+    delivered = [0] * viewers
+
+    def viewer(index):
+        seq = 0
+        while time.perf_counter() < stop_at:
+            producer.demand()
+            seq, frame = stream.wait_for_frame(seq, timeout=0.5)
+            if frame is not None:
+                delivered[index] += 1
+
+    cpu = _run_viewers(viewer, viewers)
+    while producer.running:  # Let the producer go idle before the next run
+        time.sleep(0.05)
+    return cpu, sum(delivered)
+
+
+def _run_viewers(viewer, count):
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    threads = [threading.Thread(target=viewer, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - wall_start
+    return round(100.0 * (time.process_time() - cpu_start) / wall, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--viewers", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per run")
+    parser.add_argument("--fps", type=float, default=15.0, help="Camera frame rate")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--model", help="Run a YOLO model instead of the stand-in workload")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+    work = make_worker(model, args.width, args.height, args.fps)
+
+    results = []
+    print(f"{'viewers':>8} {'per-viewer CPU%':>16} {'shared CPU%':>12} {'shared frames':>14}")
+    for count in args.viewers:
+        old_cpu, _ = per_viewer(work, count, args.duration)
+        new_cpu, frames = shared(work, count, args.duration)
+        results.append({"viewers": count, "per_viewer_cpu_percent": old_cpu,
+                        "shared_cpu_percent": new_cpu, "shared_frames_delivered": frames})
+        print(f"{count:>8} {old_cpu:>16} {new_cpu:>12} {frames:>14}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
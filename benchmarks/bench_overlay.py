@@ -0,0 +1,101 @@
+"""Compare server-drawn and client-drawn overlays per frame.
+
+Server mode copies the frame, draws boxes and labels and JPEG-encodes
+the annotated copy. Client mode encodes the untouched frame and builds
+the compact box list sent in the 'overlay' event. Detections are
+synthetic; pass --model to time ultralytics' result.plot() as well.
+
+    python benchmarks/bench_overlay.py --boxes 10 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detection import annotate_frame
+from streams import StreamState
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def sample_frame(width, height):
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+
+def sample_results(width, height, boxes):
+    rng = np.random.default_rng(1)
+    detections = []
+    for i in range(boxes):
+        x, y = int(rng.integers(0, width - 200)), int(rng.integers(20, height - 200))
+        detections.append({"label": "truck", "confidence": 87.5, "box": [x, y, x + 180, y + 160],
+                           "track_id": i + 1})
+    codes = [{"type": "QRCODE", "data": "MSCU1234567", "rect": [50, 60, 120, 120],
+              "polygon": [[50, 60], [170, 60], [170, 180], [50, 180]]}]
+    return detections, codes
+
+
+def time_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=10, help="Detections per frame")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--model", help="YOLO model to also time result.plot()")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+
+    results = {}
+    print(f"{'resolution':>10} {'server ms':>10} {'client ms':>10} {'plot() ms':>10} {'overlay bytes':>14}")
+    for width, height in RESOLUTIONS:
+        frame = sample_frame(width, height)
+        detections, codes = sample_results(width, height, args.boxes)
+        stream = StreamState("bench")
+        stream.update(None, detections, codes)
+
+        def server():
+            return cv2.imencode('.jpg', annotate_frame(frame, detections, codes))[1].tobytes()
+
+        def client():
+            jpeg = cv2.imencode('.jpg', frame)[1].tobytes()
+            return jpeg, json.dumps(stream.overlay())
+
+        plot_ms = None
+        if model is not None:
+            result = model(frame, verbose=False)[0]
+            plot_ms = round(time_ms(result.plot, args.repeat), 3)
+
+        name = f"{width}x{height}"
+        results[name] = {
+            "server_ms": round(time_ms(server, args.repeat), 3),
+            "client_ms": round(time_ms(client, args.repeat), 3),
+            "plot_ms": plot_ms,
+            "overlay_bytes": len(json.dumps(stream.overlay()))
+        }
+        r = results[name]
+        print(f"{name:>10} {r['server_ms']:>10} {r['client_ms']:>10} {str(plot_ms):>10} {r['overlay_bytes']:>14}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare decode/re-encode against JPEG passthrough for uploaded frames.
+
+The old path decodes every upload at full size and JPEG-encodes it again
+for viewers. With passthrough the uploaded bytes go to viewers untouched
+and the frame is only decoded for inference, at 1/2 or 1/4 size through
+libjpeg DCT scaling when the upload is large enough. Reports wall-clock
+latency and process CPU time per frame; inference itself is the same in
+both paths and left out.
+
+    python benchmarks/bench_passthrough.py --frames recorded/ --repeat 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transport import decode_jpeg
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (3840, 2160)]
+
+
+def sample_jpegs(folder):
+    if folder:
+        images = [cv2.imread(os.path.join(folder, n)) for n in sorted(os.listdir(folder))]
+        images = [img for img in images if img is not None]
+    else:
+        rng = np.random.default_rng(0)
+        images = []
+        for width, height in RESOLUTIONS:
+            small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+            images.append(cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC))
+    return [(f"{img.shape[1]}x{img.shape[0]}", cv2.imencode('.jpg', img)[1].tobytes()) for img in images]
+
+
+def measure(fn, repeat):
+    """Mean wall-clock and CPU milliseconds per call."""
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for _ in range(repeat):
+        fn()
+    return ((time.perf_counter() - wall) * 1000 / repeat,
+            (time.process_time() - cpu) * 1000 / repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="Folder of sample frames (synthetic if omitted)")
+    parser.add_argument("--min-width", type=int, default=960, help="JPEG_DECODE_MIN_WIDTH")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'frame':>10} {'old wall':>9} {'old cpu':>8} {'new wall':>9} {'new cpu':>8} {'decoded':>10}")
+    for name, jpeg in sample_jpegs(args.frames):
+        def reencode():
+            frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            return frame, cv2.imencode('.jpg', frame)[1].tobytes()
+
+        def passthrough():
+            frame, reduction = decode_jpeg(jpeg, args.min_width)
+            return frame, jpeg
+
+        old_wall, old_cpu = measure(reencode, args.repeat)
+        new_wall, new_cpu = measure(passthrough, args.repeat)
+        decoded = decode_jpeg(jpeg, args.min_width)[0]
+        results[name] = {
+            "jpeg_bytes": len(jpeg),
+            "reencode_ms": round(old_wall, 3),
+            "reencode_cpu_ms": round(old_cpu, 3),
+            "passthrough_ms": round(new_wall, 3),
+            "passthrough_cpu_ms": round(new_cpu, 3),
+            "decoded_size": f"{decoded.shape[1]}x{decoded.shape[0]}"
+        }
+        r = results[name]
+        print(f"{name:>10} {r['reencode_ms']:>9} {r['reencode_cpu_ms']:>8} "
+              f"{r['passthrough_ms']:>9} {r['passthrough_cpu_ms']:>8} {r['decoded_size']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Measure how inference throughput scales with worker processes.
+
+Runs process_frame's detection + barcode + drawing work through
+ProcessPoolEngine with 1..N workers, alongside the same number of threads
+sharing one in-process model for comparison.
+
+    python benchmarks/bench_process_pool.py --workers 1 2 4 8 --duration 10
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workers import ProcessPoolEngine, load_yolo_analyzer
+
+
+def drive(process, frame, callers, duration):
+    """Call ``process(frame)`` from ``callers`` threads and return frames/second."""
+    counts = [0] * callers
+    stop_at = time.perf_counter() + duration
+
+    def caller(index):
+        while time.perf_counter() < stop_at:
+            process(frame)
+            counts[index] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return round(sum(counts) / (time.perf_counter() - started), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="yolov8n.pt")
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    frame = np.random.default_rng(0).integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    analyze = load_yolo_analyzer(args.model, threads=os.cpu_count() or 1)
+    analyze(frame)  # Warm up
+
+    results = []
+    print(f"{'workers':>8} {'threads fps':>12} {'process fps':>12} {'speedup':>8}")
+    for count in args.workers:
+        thread_fps = drive(analyze, frame, count, args.duration)
+        engine = ProcessPoolEngine(args.model, workers=count).start()
+        try:
+            drive(engine.process, frame, count, 1.0)  # Wait for every worker's model to load
+            process_fps = drive(engine.process, frame, count, args.duration)
+        finally:
+            engine.stop()
+        results.append({"workers": count, "thread_fps": thread_fps, "process_fps": process_fps})
+        print(f"{count:>8} {thread_fps:>12} {process_fps:>12} "
+              f"{process_fps / results[0]['process_fps']:>7.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
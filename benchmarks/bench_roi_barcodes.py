@@ -0,0 +1,111 @@
+"""Compare full-frame and region-of-interest barcode decoding.
+
+Runs every frame through a full-frame pyzbar scan and through
+BarcodeScanner (crops around detector boxes and recent codes, with a
+periodic full scan), then reports decode time per frame and the ROI
+scanner's recall against the full-frame results.
+
+    python benchmarks/bench_roi_barcodes.py --frames recorded/ --model yolov8n.pt
+    python benchmarks/bench_roi_barcodes.py   # synthetic frames with moving QR codes
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from barcodes import BarcodeScanner, decode_codes
+
+
+def synthetic_frames(count, width=1920, height=1080):
+    """Frames with a QR code that drifts across a textured background.
+
+    The 'detector box' is a loose box around the code, as YOLO would give
+    for the container or truck carrying the label.
+    """
+    rng = np.random.default_rng(0)
+    qr = cv2.QRCodeEncoder.create().encode("MSCU1234567")
+    qr = cv2.resize(qr, (qr.shape[1] * 8, qr.shape[0] * 8), interpolation=cv2.INTER_NEAREST)
+    qr = cv2.copyMakeBorder(qr, 16, 16, 16, 16, cv2.BORDER_CONSTANT, value=255)
+    background = cv2.resize(rng.integers(0, 255, (height // 8, width // 8, 3), dtype=np.uint8),
+                            (width, height), interpolation=cv2.INTER_LINEAR)
+    frames = []
+    for i in range(count):
+        frame = background.copy()
+        x = 100 + (i * 7) % (width - qr.shape[1] - 200)
+        y = height // 3
+        frame[y:y + qr.shape[0], x:x + qr.shape[1]] = cv2.cvtColor(qr, cv2.COLOR_GRAY2BGR)
+        box = [x - 150, y - 100, x + qr.shape[1] + 150, y + qr.shape[0] + 200]
+        frames.append((frame, [box]))
+    return frames
+
+
+def recorded_frames(folder, model_path):
+    model = None
+    if model_path:
+        from ultralytics import YOLO
+        model = YOLO(model_path)
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        frame = cv2.imread(os.path.join(folder, name))
+        if frame is None:
+            continue
+        boxes = []
+        if model is not None:
+            result = model(frame, verbose=False)[0]
+            boxes = [[int(v) for v in b.xyxy[0].tolist()] for b in result.boxes if float(b.conf[0]) > 0.3]
+        frames.append((frame, boxes))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="Folder of recorded frames (synthetic frames if omitted)")
+    parser.add_argument("--model", help="YOLO model used to produce boxes for recorded frames")
+    parser.add_argument("--count", type=int, default=200, help="Synthetic frame count")
+    parser.add_argument("--full-scan-every", type=int, default=10)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    frames = recorded_frames(args.frames, args.model) if args.frames else synthetic_frames(args.count)
+    scanner = BarcodeScanner(full_scan_every=args.full_scan_every)
+
+    full_ms, roi_ms = [], []
+    expected = found = 0
+    for frame, boxes in frames:
+        start = time.perf_counter()
+        full = decode_codes(frame)
+        full_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        roi = scanner.scan(frame, boxes, source_id="bench")
+        roi_ms.append((time.perf_counter() - start) * 1000)
+
+        full_keys = {(c["type"], c["data"]) for c in full}
+        expected += len(full_keys)
+        found += len(full_keys & {(c["type"], c["data"]) for c in roi})
+
+    results = {
+        "frames": len(frames),
+        "full_frame_mean_ms": round(float(np.mean(full_ms)), 3),
+        "full_frame_p95_ms": round(float(np.percentile(full_ms, 95)), 3),
+        "roi_mean_ms": round(float(np.mean(roi_ms)), 3),
+        "roi_p95_ms": round(float(np.percentile(roi_ms, 95)), 3),
+        "recall": round(found / expected, 4) if expected else None,
+        "scans": scanner.snapshot(),
+    }
+    for key, value in results.items():
+        print(f"{key:>20}: {value}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
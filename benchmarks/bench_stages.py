@@ -0,0 +1,224 @@
+"""Time every stage of the frame pipeline separately, with regression checks.
+
+Runs each stage on a fixed corpus of frames at several resolutions:
+payload unwrapping (base64 data URL and binary frame), JPEG decode (full
+and DCT-reduced), the detector, full-frame and ROI barcode decoding,
+drawing the overlay and JPEG encoding (cv2.imencode and JpegEncoder).
+Reports mean/p50/p95/p99 ms per stage, plus the memory a single call
+allocates: peak traced bytes, bytes still held afterwards and the number
+of allocated blocks (tracemalloc; NumPy and OpenCV arrays are included).
+
+Save a baseline on one commit and compare another commit against it on
+the same machine; stages whose p50 is more than --threshold slower are
+flagged and the exit status is 1:
+
+    python benchmarks/bench_stages.py --frames recorded/ --save-baseline baseline.json
+    python benchmarks/bench_stages.py --frames recorded/ --compare baseline.json
+    python benchmarks/bench_stages.py --model ""   # skip the detector stage
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from barcodes import BarcodeScanner, decode_codes
+from detection import annotate_frame
+from encoding import JpegEncoder
+from transport import decode_data_url, decode_jpeg, pack_frame, unpack_frame
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def corpus(folder, count):
+    """Base images: the first ``count`` from a folder, or seeded synthetic scenes with a QR code."""
+    if folder:
+        images = [cv2.imread(os.path.join(folder, n)) for n in sorted(os.listdir(folder))]
+        images = [img for img in images if img is not None][:count]
+        if not images:
+            raise SystemExit(f"No images found in {folder}")
+        return images
+    rng = np.random.default_rng(0)
+    qr = cv2.QRCodeEncoder.create().encode("CONT0001000")
+    qr = cv2.resize(qr, (qr.shape[1] * 6, qr.shape[0] * 6), interpolation=cv2.INTER_NEAREST)
+    images = []
+    for i in range(count):
+        small = rng.integers(0, 255, (68, 120, 3), dtype=np.uint8)
+        image = cv2.resize(small, (1920, 1080), interpolation=cv2.INTER_CUBIC)
+        # Wrapped so any --corpus-size keeps the code inside the frame
+        x = 200 + (i * 150) % (image.shape[1] - qr.shape[1] - 200)
+        y = 300 + (i * 40) % (image.shape[0] - qr.shape[0] - 300)
+        image[y:y + qr.shape[0], x:x + qr.shape[1]] = qr[:, :, None]
+        images.append(image)
+    return images
+
+
+def sample_detections(frame, detector):
+    """Boxes to draw and to hint the ROI scanner: the detector's, or a fixed set."""
+    height, width = frame.shape[:2]
+    if detector is not None:
+        result = detector.predict_batch([frame])[0]
+        detections = [{"label": result.names.get(int(c), str(int(c))), "confidence": round(float(s) * 100, 2),
+                       "box": [int(v) for v in (x1, y1, x2, y2)]}
+                      for x1, y1, x2, y2, s, c in result.boxes if s > 0.5]
+        if detections:
+            return detections
+    return [{"label": "truck", "confidence": 90.0,
+             "box": [int(width * i / 12), int(height / 4), int(width * (i + 2) / 12), int(height * 3 / 4)]}
+            for i in range(0, 10, 2)]
+
+
+def build_stages(frame, detector, scanner, encoder):
+    jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+    data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()
+    packed = pack_frame(jpeg, "bench", 1)
+    detections = sample_detections(frame, detector)
+    codes = decode_codes(frame)
+    boxes = [d["box"] for d in detections] + [[x, y, x + w, y + h] for x, y, w, h in (c["rect"] for c in codes)]
+    scanner.scan(frame, boxes, "bench")  # The first scan of a source is a full one
+
+    stages = {
+        "base64 decode": lambda: decode_data_url(data_url),
+        "binary unpack": lambda: unpack_frame(packed),
+        "imdecode": lambda: cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR),
+        "reduced decode": lambda: decode_jpeg(jpeg, 960),
+    }
+    if detector is not None:
+        stages["detector"] = lambda: detector.predict_batch([frame])
+    stages.update({
+        "pyzbar full frame": lambda: decode_codes(frame),
+        "pyzbar roi": lambda: scanner.scan(frame, boxes, "bench"),
+        "draw overlay": lambda: annotate_frame(frame, detections, codes),
+        "imencode": lambda: cv2.imencode(".jpg", frame),
+        "JpegEncoder": lambda: encoder.encode(frame),
+    })
+    return stages
+
+
+def time_stage(fn, repeat, warmup):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def memory_stage(fn):
+    """Peak and retained traced bytes and allocated block count for one call."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    blocks = sum(max(stat.count_diff, 0) for stat in after.compare_to(before, "traceback"))
+    return {"peak_kb": round((peak - baseline) / 1024, 1), "retained_kb": round((current - baseline) / 1024, 1),
+            "blocks": blocks}
+
+
+def machine_info():
+    return {"host": platform.node(), "platform": platform.platform(), "python": platform.python_version(),
+            "cpus": os.cpu_count(), "opencv": cv2.__version__, "numpy": np.__version__}
+
+
+def compare(results, baseline, threshold):
+    """Rows of stages whose p50 grew by more than ``threshold`` (a fraction) over the baseline."""
+    before = {(r["stage"], r["resolution"]): r for r in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = before.get((row["stage"], row["resolution"]))
+        if old and old["p50_ms"] > 0 and row["p50_ms"] > old["p50_ms"] * (1 + threshold):
+            regressions.append(dict(row, baseline_p50_ms=old["p50_ms"],
+                                    change=round(row["p50_ms"] / old["p50_ms"] - 1, 3)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="Folder of sample frames (synthetic if omitted)")
+    parser.add_argument("--corpus-size", type=int, default=3, help="Frames per resolution")
+    parser.add_argument("--model", default="yolov8n.pt", help="Detector model; empty to skip the detector")
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per stage and frame")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--save-baseline", help="Write these results as a baseline to this file")
+    parser.add_argument("--compare", help="Baseline file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed p50 slowdown (0.15 = 15%%)")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    detector = None
+    if args.model:
+        from detectors import load_detector
+        detector = load_detector(args.model, args.backend)
+    scanner = BarcodeScanner(full_scan_every=10 ** 9)
+    encoder = JpegEncoder()
+
+    results = []
+    print(f"{'stage':>18} {'resolution':>10} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'peak KB':>9} {'held KB':>8} {'blocks':>7}")
+    for width, height in RESOLUTIONS:
+        frames = [cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+                  for image in corpus(args.frames, args.corpus_size)]
+        per_stage = {}
+        for frame in frames:
+            for name, fn in build_stages(frame, detector, scanner, encoder).items():
+                entry = per_stage.setdefault(name, {"times": [], "memory": []})
+                entry["times"] += time_stage(fn, args.repeat, args.warmup)
+                entry["memory"].append(memory_stage(fn))
+        for name, entry in per_stage.items():
+            times = np.asarray(entry["times"])
+            memory = {key: max(m[key] for m in entry["memory"]) for key in entry["memory"][0]}
+            row = dict({"stage": name, "resolution": f"{width}x{height}",
+                        "mean_ms": round(float(times.mean()), 3),
+                        "p50_ms": round(float(np.percentile(times, 50)), 3),
+                        "p95_ms": round(float(np.percentile(times, 95)), 3),
+                        "p99_ms": round(float(np.percentile(times, 99)), 3)}, **memory)
+            results.append(row)
+            print(f"{name:>18} {row['resolution']:>10} {row['mean_ms']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                  f"{row['p99_ms']:>8} {row['peak_kb']:>9} {row['retained_kb']:>8} {row['blocks']:>7}")
+
+    report = {"machine": machine_info(), "settings": {"corpus": args.frames or "synthetic",
+                                                      "corpus_size": args.corpus_size, "model": args.model,
+                                                      "repeat": args.repeat},
+              "results": results}
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("machine", {}).get("host") != report["machine"]["host"]:
+            print(f"Warning: baseline was measured on {baseline.get('machine', {}).get('host')}, "
+                  f"timings may not be comparable")
+        regressions = compare(results, baseline, args.threshold)
+        for row in regressions:
+            print(f"REGRESSION {row['stage']} @ {row['resolution']}: p50 {row['baseline_p50_ms']} -> "
+                  f"{row['p50_ms']} ms ({row['change']:+.0%})")
+        if not regressions:
+            print(f"No stage regressed by more than {args.threshold:.0%}")
+        report["regressions"] = regressions
+
+    for path in (args.save_baseline, args.output):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
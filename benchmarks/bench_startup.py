@@ -0,0 +1,72 @@
+"""Measure cold boot time of the server process up to model ready.
+
+Starts a fresh interpreter that imports run.py and starts its services
+(the model loader runs in the background), waits for the loader and
+reports, per boot: how long until the app was importable and able to
+serve requests, model load time, warm-up time and total boot to ready. Also times the first
+inference after warm-up against a steady-state one, to check the warm-up
+actually absorbed the cold-start cost.
+
+    python benchmarks/bench_startup.py --boots 3
+    INFERENCE_ENGINE=process python benchmarks/bench_startup.py
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, time
+import numpy as np
+import run
+run.start_services()
+ready = run.model_loader.wait(600)
+result = run.model_loader.snapshot()
+if ready:
+    frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    for name in ("first_inference_ms", "second_inference_ms"):
+        start = time.perf_counter()
+        run.process_frame(frame, source_id="bench-startup")
+        result[name] = round((time.perf_counter() - start) * 1000, 2)
+print("RESULT " + json.dumps(result))
+"""
+
+
+def boot():
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return dict(json.loads(line[len("RESULT "):]), process_wall_s=round(wall, 3))
+    raise RuntimeError(f"Boot failed:\n{proc.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--boots", type=int, default=3, help="Cold boots to run")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    boots = [boot() for _ in range(args.boots)]
+    keys = ["import_s", "load_s", "warm_up_s", "boot_to_ready_s", "first_inference_ms", "second_inference_ms"]
+    print(f"{'boot':>5} " + " ".join(f"{k:>19}" for k in keys))
+    for index, result in enumerate(boots, 1):
+        print(f"{index:>5} " + " ".join(f"{str(result.get(k)):>19}" for k in keys))
+
+    summary = {k: round(float(np.median([b[k] for b in boots if b.get(k) is not None])), 3)
+               for k in keys if any(b.get(k) is not None for b in boots)}
+    print("median " + ", ".join(f"{k}={v}" for k, v in summary.items()))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"boots": boots, "median": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare base64 data URL and binary android_frame payloads.
+
+Reports bytes on the wire and per-frame decode time (payload unwrapping
+alone, and through cv2.imdecode) for both transports.
+
+    python benchmarks/bench_transport.py --frames recorded/ --repeat 200
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transport import decode_data_url, pack_frame, unpack_frame
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def sample_jpegs(folder):
+    """JPEG-encoded sample frames, from a folder or synthesised per resolution."""
+    if folder:
+        images = [cv2.imread(os.path.join(folder, n)) for n in sorted(os.listdir(folder))]
+        images = [img for img in images if img is not None]
+    else:
+        rng = np.random.default_rng(0)
+        images = []
+        for width, height in RESOLUTIONS:
+            # Smooth noise compresses like a real scene rather than pure noise
+            small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+            images.append(cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC))
+    return [(f"{img.shape[1]}x{img.shape[0]}", cv2.imencode('.jpg', img)[1].tobytes()) for img in images]
+
+
+def time_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def measure(jpeg, repeat):
+    data_url = "data:image/jpeg;base64," + base64.b64encode(jpeg).decode('ascii')
+    packed = pack_frame(jpeg, source_id="lane-1", seq=1)
+
+    def unwrap_base64():
+        return np.frombuffer(decode_data_url({'data': data_url}), np.uint8)
+
+    def unwrap_binary():
+        return np.frombuffer(unpack_frame(packed)[3], np.uint8)
+
+    return {
+        "jpeg_bytes": len(jpeg),
+        "base64_wire_bytes": len(data_url.encode('ascii')),
+        "binary_wire_bytes": len(packed),
+        "base64_unwrap_ms": round(time_ms(unwrap_base64, repeat), 4),
+        "binary_unwrap_ms": round(time_ms(unwrap_binary, repeat), 4),
+        "base64_decode_ms": round(time_ms(lambda: cv2.imdecode(unwrap_base64(), cv2.IMREAD_COLOR), repeat), 3),
+        "binary_decode_ms": round(time_ms(lambda: cv2.imdecode(unwrap_binary(), cv2.IMREAD_COLOR), repeat), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", help="Folder of sample images (synthetic frames if omitted)")
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'frame':>10} {'b64 bytes':>10} {'bin bytes':>10} {'b64 unwrap':>11} {'bin unwrap':>11} "
+          f"{'b64 decode':>11} {'bin decode':>11}")
+    for name, jpeg in sample_jpegs(args.frames):
+        row = results[name] = measure(jpeg, args.repeat)
+        print(f"{name:>10} {row['base64_wire_bytes']:>10} {row['binary_wire_bytes']:>10} "
+              f"{row['base64_unwrap_ms']:>9}ms {row['binary_unwrap_ms']:>9}ms "
+              f"{row['base64_decode_ms']:>9}ms {row['binary_decode_ms']:>9}ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Measure how many dashboards the web tier serves as web workers are added.
+
+Starts serve.py with each ``--workers`` count and runs stress.py against
+it with a growing number of dashboards (no cameras or MJPEG viewers),
+spread over the workers. Each step passes if the worst p95 over the
+dashboards' Socket.IO connects, acks and HTTP polls is within --slo-ms
+and at most --max-errors of them fail. A worker count's capacity is the
+largest step that passed, and its steps stop at the first failure.
+
+Chat messages are sent by dashboards on every worker and pushed to all
+of them through the message queue. "chat delivery" is pushes received
+per message sent, divided by the number of dashboards. It stays near 1
+when broadcasts reach every worker, and falls short only for messages
+sent during the ramp-up, before every dashboard has joined.
+
+The workers share a Redis message queue. Without --message-queue, a
+fakeredis server is started in this process as a stand-in (pip install
+fakeredis redis). That is enough to show the scaling, but it becomes a
+bottleneck well before a real Redis would. The load generator runs on
+this machine too, so leave it some cores.
+
+    python benchmarks/bench_workers.py --workers 1,2,4 --dashboards 100,200,400,800
+    python benchmarks/bench_workers.py --message-queue redis://localhost:6379/0 --output capacity.json
+"""
+import argparse
+import json
+import os
+import platform
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OK_OUTCOMES = {"ok", "success", "200"}
+
+
+def start_stand_in(port):
+    from fakeredis import TcpFakeServer
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, name="fakeredis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0"
+
+
+def wait_until_serving(url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url + "/login", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.5)
+    return False
+
+
+def start_workers(workers, port, message_queue, log, timeout):
+    server = subprocess.Popen([sys.executable, "serve.py", "--workers", str(workers), "--port", str(port),
+                               "--message-queue", message_queue, "--start-timeout", str(timeout)],
+                              cwd=ROOT, stdout=log, stderr=log)
+    urls = [f"http://127.0.0.1:{port + i}" for i in range(workers)]
+    for url in urls:
+        if not wait_until_serving(url, timeout):
+            stop_workers(server)
+            raise SystemExit(f"{url} did not come up; see the server log")
+    return server, urls
+
+
+def stop_workers(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+def run_step(urls, dashboards, args):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    try:
+        subprocess.run([sys.executable, "stress.py", "--url", ",".join(urls), "--dashboards", str(dashboards),
+                        "--viewers", "0", "--uploaders", "0", "--users", str(args.users),
+                        "--duration", str(args.duration), "--ramp", str(args.ramp),
+                        "--poll-interval", str(args.poll_interval), "--chat-rate", str(args.chat_rate),
+                        "--output", output],
+                       cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        with open(output) as f:
+            return json.load(f)["metrics"]
+    finally:
+        os.unlink(output)
+
+
+def evaluate(metrics, dashboards):
+    """Worst p95, error rate and chat delivery over what a dashboard does."""
+    worst, total, errors = 0.0, 0, 0
+    for name, stats in metrics.items():
+        if not name.startswith(("connect dashboard", "event ", "http GET ")):
+            continue
+        worst = max(worst, stats.get("p95_ms") or 0.0)
+        for outcome, count in stats["outcomes"].items():
+            total += count
+            if outcome not in OK_OUTCOMES:
+                errors += count
+    sent = metrics.get("event send_chat", {}).get("outcomes", {}).get("success", 0)
+    pushed = sum(metrics.get("push chat_message", {}).get("outcomes", {}).values())
+    return {"worst_p95_ms": round(worst, 1), "requests": total,
+            "error_rate": round(errors / total, 4) if total else 1.0,
+            "chat_delivery": round(pushed / (sent * dashboards), 3) if sent else None}
+
+
+def machine_info():
+    return {"host": platform.node(), "platform": platform.platform(), "python": platform.python_version(),
+            "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to measure")
+    parser.add_argument("--dashboards", default="100,200,400,800,1600", help="Comma-separated load steps")
+    parser.add_argument("--message-queue", help="Redis URL (default: a fakeredis stand-in)")
+    parser.add_argument("--port", type=int, default=5101, help="Port of the first worker")
+    parser.add_argument("--slo-ms", type=float, default=500, help="Allowed worst p95 latency")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="Allowed fraction of failures")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of full load per step")
+    parser.add_argument("--ramp", type=float, default=10)
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--chat-rate", type=float, default=0.02)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--start-timeout", type=float, default=120, help="Seconds to wait for each worker")
+    parser.add_argument("--log", default="bench_workers.log", help="Server output goes here")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    message_queue = args.message_queue or start_stand_in(6390)
+    results, capacity = [], {}
+    print(f"{'workers':>7} {'dashboards':>10} {'p95 ms':>8} {'errors':>7} {'chat delivery':>13}  result")
+    with open(args.log, "w") as log:
+        for workers in [int(n) for n in args.workers.split(",")]:
+            server, urls = start_workers(workers, args.port, message_queue, log, args.start_timeout)
+            try:
+                capacity[workers] = 0
+                for dashboards in [int(n) for n in args.dashboards.split(",")]:
+                    row = dict({"workers": workers, "dashboards": dashboards},
+                               **evaluate(run_step(urls, dashboards, args), dashboards))
+                    row["passed"] = row["worst_p95_ms"] <= args.slo_ms and row["error_rate"] <= args.max_errors
+                    results.append(row)
+                    print(f"{workers:>7} {dashboards:>10} {row['worst_p95_ms']:>8} {row['error_rate']:>7} "
+                          f"{str(row['chat_delivery']):>13}  {'ok' if row['passed'] else 'over SLO'}")
+                    if not row["passed"]:
+                        break
+                    capacity[workers] = dashboards
+            finally:
+                stop_workers(server)
+
+    print(f"\nDashboards within p95 <= {args.slo_ms:g} ms and <= {args.max_errors:.0%} errors:")
+    for workers, dashboards in capacity.items():
+        print(f"  {workers} worker(s): {dashboards}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"machine": machine_info(), "message_queue": args.message_queue or "fakeredis",
+                       "settings": {"slo_ms": args.slo_ms, "max_errors": args.max_errors,
+                                    "duration": args.duration, "poll_interval": args.poll_interval},
+                       "results": results, "capacity": capacity}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+
+class ChatHistory:
+    """Recent chat messages per room, kept in memory so history needs no query.
+
+    Each room holds its last ``max_messages`` messages in a ring buffer
+    and ``since`` only returns ones younger than ``max_age`` seconds, the
+    window the dashboard shows. A room is filled from the database once,
+    with ``load``, the first time its history is asked for; after that
+    new messages are appended with ``add`` as they are sent. Messages are
+    dicts with an increasing ``id``, which clients pass back as
+    ``since_id`` to fetch only what they haven't seen.
+    """
+
+    def __init__(self, max_messages=200, max_age=3600, clock=datetime.utcnow):
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self.clock = clock
+        self._rooms = {}  # room -> deque of (sent_at, message)
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def loaded(self, room):
+        return room in self._loaded
+
+    def load(self, room, messages):
+        """Fill a room from (sent_at, message) pairs read from the database.
+
+        Messages added meanwhile are kept, so a message sent while the
+        query ran is neither lost nor duplicated.
+        """
+        with self._lock:
+            if room in self._loaded:
+                return
+            merged = {message["id"]: (sent_at, message) for sent_at, message in messages}
+            merged.update((message["id"], (sent_at, message)) for sent_at, message in self._rooms.get(room, ()))
+            self._rooms[room] = deque((merged[i] for i in sorted(merged)), maxlen=self.max_messages)
+            self._loaded.add(room)
+
+    def add(self, room, sent_at, message):
+        with self._lock:
+            buffer = self._rooms.get(room)
+            if buffer is None:
+                buffer = self._rooms[room] = deque(maxlen=self.max_messages)
+            buffer.append((sent_at, message))
+
+    def since(self, room, since_id=0, limit=50):
+        """Up to ``limit`` most recent messages newer than ``since_id``, oldest first."""
+        cutoff = self.clock() - timedelta(seconds=self.max_age)
+        with self._lock:
+            messages = [message for sent_at, message in self._rooms.get(room, ())
+                        if message["id"] > since_id and sent_at >= cutoff]
+        return messages[-limit:]
+
+    def clear(self):
+        with self._lock:
+            self._rooms.clear()
+            self._loaded.clear()
@@ -0,0 +1,105 @@
+import cv2
+import numpy as np
+
+from barcodes import decode_codes
+
+CONFIDENCE_THRESHOLD = 0.3
+BOX_COLOR = (0, 165, 255)  # Orange for object boxes we draw ourselves
+
+
+def draw_codes(annotated_frame, codes_data):
+    for code in codes_data:
+        code_data = code["data"]
+        code_type = code["type"]
+
+        # Different colors for QR codes vs barcodes
+        color = (0, 255, 0)  # Green for barcodes
+        if code_type == "QRCODE":
+            color = (255, 0, 0)  # Blue for QR codes
+
+        rect_points = code.get("polygon")
+        if rect_points:
+            pts = np.array([rect_points], np.int32)
+            cv2.polylines(annotated_frame, [pts], True, color, 2)
+
+        x, y, w, h = code["rect"]
+        cv2.putText(annotated_frame, f"{code_type}: {code_data}",
+                    (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, color, 2)
+
+
+def draw_detections(annotated_frame, detection_data):
+    for det in detection_data:
+        box = det.get("box")
+        if not box:
+            continue
+        x1, y1, x2, y2 = box
+        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), BOX_COLOR, 2)
+        cv2.putText(annotated_frame, f"{det['label']} {det['confidence']:.0f}%",
+                    (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, BOX_COLOR, 2)
+
+
+def scale_results(detection_data, codes_data, factor):
+    """Map detections and codes found on a reduced-size decode back to full size."""
+    if factor == 1:
+        return detection_data, codes_data
+    detections = [dict(d, box=[int(v * factor) for v in d["box"]]) if d.get("box") else d
+                  for d in detection_data]
+    codes = [dict(c, rect=[int(v * factor) for v in c["rect"]],
+                  polygon=[[int(x * factor), int(y * factor)] for x, y in c.get("polygon", [])])
+             for c in codes_data]
+    return detections, codes
+
+
+def annotate_frame(frame, detection_data, codes_data):
+    """Draw previously computed detections and codes on a copy of ``frame``."""
+    annotated_frame = frame.copy()
+    draw_detections(annotated_frame, detection_data)
+    draw_codes(annotated_frame, codes_data)
+    return annotated_frame
+
+
+def analyze_frame(frame, predict, scale=1.0, scanner=None, source_id=None, annotate=True):
+    """Run object detection and code scanning on a frame.
+
+    ``predict(frame)`` returns a ``detectors.Detections`` for one frame,
+    whichever backend produced it. With ``scale`` below 1 the detector
+    sees a downscaled copy and boxes are mapped back to full resolution.
+    With a ``BarcodeScanner`` codes are only decoded around the
+    detector's boxes and recent codes, otherwise the whole frame is
+    scanned. Returns the annotated frame (None when ``annotate`` is off
+    because viewers draw overlays themselves) plus the detection and
+    barcode lists. Kept free of Flask state so inference worker
+    processes can import it.
+    """
+    # Object detection
+    if scale < 1.0:
+        small = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        result = predict(small)
+    else:
+        result = predict(frame)
+
+    # Process detection data
+    detection_data = []
+    for x1, y1, x2, y2, conf, cls_id in result.boxes:
+        if conf > CONFIDENCE_THRESHOLD:
+            detection_data.append({
+                "label": result.names.get(int(cls_id), str(int(cls_id))),
+                "confidence": round(float(conf) * 100, 2),
+                "box": [int(v / scale) for v in (x1, y1, x2, y2)]
+            })
+
+    # Code detection (both QR and barcodes)
+    if scanner is not None:
+        codes_data = scanner.scan(frame, [d["box"] for d in detection_data], source_id)
+    else:
+        codes_data = decode_codes(frame)
+
+    if not annotate:
+        return None, detection_data, codes_data
+    annotated_frame = frame.copy()
+    draw_detections(annotated_frame, detection_data)
+    draw_codes(annotated_frame, codes_data)
+
+    return annotated_frame, detection_data, codes_data
@@ -0,0 +1,234 @@
+"""Pluggable object detector backends.
+
+Every backend exposes ``names`` (class id -> label) and
+``predict_batch(frames)``, which takes BGR frames and returns one
+``Detections`` per frame: an (N, 6) float array of
+``[x1, y1, x2, y2, confidence, class_id]`` in that frame's pixel
+coordinates. ``analyze_frame`` only relies on this, so the PyTorch model
+can be swapped for an exported ONNX Runtime or OpenVINO (FP32 or INT8)
+model by config.
+
+Export a model with:
+
+    python detectors.py export --model yolov8n.pt --format onnx
+    python detectors.py export --model yolov8n.pt --format openvino --int8 --data coco128.yaml
+"""
+import argparse
+import ast
+import glob
+import os
+from typing import NamedTuple
+
+import cv2
+import numpy as np
+
+BACKENDS = ("pytorch", "onnx", "openvino")
+
+
+class Detections(NamedTuple):
+    boxes: np.ndarray  # (N, 6): x1, y1, x2, y2, confidence, class_id
+    names: dict
+
+
+def guess_backend(model_path):
+    """Pick a backend from the model file: .onnx, an OpenVINO .xml/dir, else PyTorch."""
+    if model_path.endswith(".onnx"):
+        return "onnx"
+    if model_path.endswith(".xml") or model_path.rstrip("/").endswith("_openvino_model"):
+        return "openvino"
+    return "pytorch"
+
+
+def letterbox(frame, size):
+    """Resize keeping the aspect ratio and pad to ``size`` x ``size``, as YOLO was trained."""
+    height, width = frame.shape[:2]
+    ratio = min(size / height, size / width)
+    new_w, new_h = round(width * ratio), round(height * ratio)
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    if (new_w, new_h) != (width, height):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, left = round(pad_y - 0.1), round(pad_x - 0.1)
+    frame = cv2.copyMakeBorder(frame, top, size - new_h - top, left, size - new_w - left,
+                               cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return frame, ratio, (left, top)
+
+
+def postprocess(output, ratio, pad, shape, conf_threshold, iou_threshold):
+    """Decode one (4 + classes, anchors) YOLOv8 head output into boxes in frame coordinates."""
+    preds = output.T
+    scores = preds[:, 4:]
+    class_ids = scores.argmax(axis=1)
+    confidences = scores[np.arange(len(scores)), class_ids]
+    keep = confidences > conf_threshold
+    preds, class_ids, confidences = preds[keep], class_ids[keep], confidences[keep]
+    if not len(preds):
+        return np.zeros((0, 6), np.float32)
+
+    cx, cy, w, h = preds[:, 0], preds[:, 1], preds[:, 2], preds[:, 3]
+    xywh = np.stack([cx - w / 2, cy - h / 2, w, h], axis=1)
+    indices = cv2.dnn.NMSBoxesBatched(xywh.tolist(), confidences.tolist(), class_ids.tolist(),
+                                      conf_threshold, iou_threshold)
+    indices = np.array(indices, dtype=int).reshape(-1)
+    xywh, confidences, class_ids = xywh[indices], confidences[indices], class_ids[indices]
+
+    boxes = np.empty((len(indices), 6), np.float32)
+    boxes[:, 0] = (xywh[:, 0] - pad[0]) / ratio
+    boxes[:, 1] = (xywh[:, 1] - pad[1]) / ratio
+    boxes[:, 2] = boxes[:, 0] + xywh[:, 2] / ratio
+    boxes[:, 3] = boxes[:, 1] + xywh[:, 3] / ratio
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+    boxes[:, 4] = confidences
+    boxes[:, 5] = class_ids
+    return boxes
+
+
+class UltralyticsDetector:
+    """PyTorch model through ultralytics (also loads any format ultralytics can export)."""
+
+    def __init__(self, model_path, threads=0, imgsz=640, conf=0.25, iou=0.7):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        from ultralytics import YOLO
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+
+    def predict_batch(self, frames):
+        results = self.model(list(frames), imgsz=self.imgsz, conf=self.conf, iou=self.iou, verbose=False)
+        return [Detections(r.boxes.data.cpu().numpy()[:, :6].astype(np.float32), self.names)
+                for r in results]
+
+
+class ExportedDetector:
+    """Shared pre/post-processing for exported YOLOv8 graphs run outside PyTorch."""
+
+    imgsz = 640
+    conf = 0.25
+    iou = 0.7
+    batch_size = 1  # Fixed batch dimension of the exported graph, or None if dynamic
+
+    def run(self, batch):
+        raise NotImplementedError
+
+    def predict_batch(self, frames):
+        prepared = [letterbox(frame, self.imgsz) for frame in frames]
+        tensors = np.stack([cv2.cvtColor(img, cv2.COLOR_BGR2RGB).transpose(2, 0, 1) for img, _, _ in prepared])
+        tensors = tensors.astype(np.float32) / 255.0
+        if self.batch_size is None:
+            outputs = self.run(tensors)
+        else:
+            # Static export: run fixed-size chunks
+            outputs = np.concatenate([self.run(tensors[i:i + self.batch_size])
+                                      for i in range(0, len(tensors), self.batch_size)])
+        return [Detections(postprocess(out, ratio, pad, frame.shape, self.conf, self.iou), self.names)
+                for out, (_, ratio, pad), frame in zip(outputs, prepared, frames)]
+
+
+class OnnxDetector(ExportedDetector):
+    """ONNX Runtime on CPU with a configurable intra-op thread count."""
+
+    def __init__(self, model_path, threads=0, imgsz=640, conf=0.25, iou=0.7):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        if isinstance(model_input.shape[2], int):
+            imgsz = model_input.shape[2]
+        self.imgsz, self.conf, self.iou = imgsz, conf, iou
+        # ultralytics stores the class names as a dict literal in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata["names"]) if "names" in metadata else {}
+
+    def run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoDetector(ExportedDetector):
+    """OpenVINO CPU plugin, for FP32 or INT8 (NNCF-quantized) exports."""
+
+    def __init__(self, model_path, threads=0, imgsz=640, conf=0.25, iou=0.7):
+        import openvino as ov
+        model_dir = model_path if os.path.isdir(model_path) else os.path.dirname(model_path)
+        xml_path = model_path if model_path.endswith(".xml") else glob.glob(os.path.join(model_path, "*.xml"))[0]
+        core = ov.Core()
+        model = core.read_model(xml_path)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        shape = model.input(0).get_partial_shape()
+        self.batch_size = shape[0].get_length() if shape[0].is_static else None
+        if shape[2].is_static:
+            imgsz = shape[2].get_length()
+        self.imgsz, self.conf, self.iou = imgsz, conf, iou
+        self.names = {}
+        metadata_path = os.path.join(model_dir, "metadata.yaml")
+        if os.path.exists(metadata_path):
+            import yaml
+            with open(metadata_path) as f:
+                self.names = yaml.safe_load(f).get("names", {})
+
+    def run(self, batch):
+        return self.compiled(batch)[self.compiled.output(0)]
+
+
+def load_detector(model_path, backend="auto", threads=0, imgsz=640):
+    """Create the detector for ``backend`` ('auto' guesses from the model path)."""
+    if backend == "auto":
+        backend = guess_backend(model_path)
+    if backend == "pytorch":
+        return UltralyticsDetector(model_path, threads, imgsz)
+    if backend == "onnx":
+        return OnnxDetector(model_path, threads, imgsz)
+    if backend == "openvino":
+        return OpenVinoDetector(model_path, threads, imgsz)
+    raise ValueError(f"Unknown detector backend: {backend} (expected one of {', '.join(BACKENDS)})")
+
+
+def export_model(model_path, fmt, int8=False, data=None, imgsz=640, dynamic=False):
+    """Export a PyTorch YOLO model with ultralytics. Returns the exported model path.
+
+    INT8 OpenVINO export runs NNCF post-training quantization and needs a
+    calibration dataset (``data``, e.g. coco128.yaml or your own images).
+    """
+    from ultralytics import YOLO
+    args = {"format": fmt, "imgsz": imgsz}
+    if int8:
+        args.update(int8=True, data=data)
+    if dynamic and fmt == "onnx":
+        # Lets the batch scheduler send several frames per run
+        args["dynamic"] = True
+    return YOLO(model_path).export(**args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detector backend tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Export a YOLO model for another backend")
+    export.add_argument("--model", default="yolov8n.pt")
+    export.add_argument("--format", choices=["onnx", "openvino"], required=True)
+    export.add_argument("--int8", action="store_true", help="Quantize to INT8 (OpenVINO)")
+    export.add_argument("--data", help="Calibration dataset YAML for --int8")
+    export.add_argument("--imgsz", type=int, default=640)
+    export.add_argument("--dynamic", action="store_true", help="Dynamic batch size (ONNX)")
+    args = parser.parse_args()
+
+    if args.int8 and args.format != "openvino":
+        parser.error("--int8 is only supported for the openvino format")
+    path = export_model(args.model, args.format, args.int8, args.data, args.imgsz, args.dynamic)
+    print(f"Exported {args.model} to {path}")
+    print(f"Run with: DETECTOR_BACKEND={guess_backend(str(path))} MODEL_PATH={path} python run.py")
+
+
+if __name__ == "__main__":
+    main()
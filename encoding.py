@@ -0,0 +1,155 @@
+import threading
+import time
+
+import cv2
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420, TJSAMP_422, TJSAMP_444
+except ImportError:
+    TurboJPEG = None
+
+OPENCV_SUBSAMPLING = {
+    "420": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420,
+    "422": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_422,
+    "444": cv2.IMWRITE_JPEG_SAMPLING_FACTOR_444,
+}
+
+
+def load_turbojpeg():
+    """Return a TurboJPEG instance, or None if PyTurboJPEG or libturbojpeg is missing."""
+    if TurboJPEG is None:
+        return None
+    try:
+        return TurboJPEG()
+    except (OSError, RuntimeError):
+        return None
+
+
+class EncoderStats:
+    def __init__(self):
+        self.frames = 0
+        self.total_ms = 0.0
+        self.total_bytes = 0
+        self.last_ms = 0.0
+        self.last_bytes = 0
+
+    def record(self, ms, size):
+        self.frames += 1
+        self.total_ms += ms
+        self.total_bytes += size
+        self.last_ms = ms
+        self.last_bytes = size
+
+    def snapshot(self):
+        return {
+            "frames": self.frames,
+            "avg_ms": round(self.total_ms / self.frames, 3) if self.frames else 0.0,
+            "avg_bytes": self.total_bytes // self.frames if self.frames else 0,
+            "last_ms": round(self.last_ms, 3),
+            "last_bytes": self.last_bytes
+        }
+
+
+class JpegEncoder:
+    """JPEG encoder with per-stream quality and size settings.
+
+    Defaults apply to every stream; ``configure(source_id, ...)``
+    overrides ``quality`` (1-100) and ``max_width`` for one stream.
+    Frames wider than ``max_width`` are downscaled first into a reusable
+    per-thread buffer. libjpeg-turbo is used through PyTurboJPEG when it
+    is installed (``backend="auto"``), otherwise cv2.imencode. The output
+    is always a fresh ``bytes`` object because it is shared with every
+    viewer of the stream's ring buffer. Encode time and size are tracked
+    per stream.
+    """
+
+    def __init__(self, quality=80, max_width=None, subsampling="420", backend="auto"):
+        if subsampling not in OPENCV_SUBSAMPLING:
+            raise ValueError(f"Unsupported chroma subsampling: {subsampling}")
+        self.defaults = {"quality": int(quality), "max_width": max_width}
+        self.subsampling = subsampling
+        self._turbo = load_turbojpeg() if backend in ("auto", "turbojpeg") else None
+        if backend == "turbojpeg" and self._turbo is None:
+            raise RuntimeError("PyTurboJPEG with libturbojpeg is not available")
+        self.backend = "turbojpeg" if self._turbo is not None else "opencv"
+        self._settings = {}
+        self._stats = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def configure(self, source_id, quality=None, max_width=None):
+        """Override the quality and/or max width of one stream."""
+        with self._lock:
+            settings = self._settings.setdefault(source_id, {})
+            if quality is not None:
+                quality = int(quality)
+                if not 1 <= quality <= 100:
+                    raise ValueError("quality must be between 1 and 100")
+                settings["quality"] = quality
+            if max_width is not None:
+                max_width = int(max_width)
+                # 0 goes back to the default limit
+                settings["max_width"] = max_width if max_width > 0 else self.defaults["max_width"]
+            return dict(self.defaults, **settings)
+
+    def settings(self, source_id=None):
+        with self._lock:
+            return dict(self.defaults, **self._settings.get(source_id, {}))
+
+    def forget(self, source_id):
+        with self._lock:
+            self._settings.pop(source_id, None)
+            self._stats.pop(source_id, None)
+
+    def _resize(self, frame, max_width):
+        height, width = frame.shape[:2]
+        if not max_width or width <= max_width:
+            return frame
+        size = (max_width, max(1, round(height * max_width / width)))
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        # OpenCV only has a fast INTER_AREA path for exact halving; elsewhere it is several times slower
+        interpolation = cv2.INTER_AREA if width == 2 * max_width else cv2.INTER_LINEAR
+        key = (size, frame.shape[2:], frame.dtype.str)
+        out = buffers.get(key)
+        if out is None:
+            out = buffers[key] = cv2.resize(frame, size, interpolation=interpolation)
+            return out
+        return cv2.resize(frame, size, dst=out, interpolation=interpolation)
+
+    def encode(self, frame, source_id=None):
+        """Encode a BGR frame with the stream's settings. Returns JPEG bytes."""
+        settings = self.settings(source_id)
+        started = time.perf_counter()
+        frame = self._resize(frame, settings["max_width"])
+        if self._turbo is not None:
+            subsample = {"420": TJSAMP_420, "422": TJSAMP_422, "444": TJSAMP_444}[self.subsampling]
+            jpeg = self._turbo.encode(frame, quality=settings["quality"], pixel_format=TJPF_BGR,
+                                      jpeg_subsample=subsample)
+        else:
+            _, buffer = cv2.imencode('.jpg', frame, [
+                cv2.IMWRITE_JPEG_QUALITY, settings["quality"],
+                cv2.IMWRITE_JPEG_SAMPLING_FACTOR, OPENCV_SUBSAMPLING[self.subsampling]
+            ])
+            jpeg = buffer.tobytes()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._stats.setdefault(source_id, EncoderStats()).record(elapsed_ms, len(jpeg))
+        return jpeg
+
+    def stats(self, source_id=None):
+        with self._lock:
+            stats = self._stats.get(source_id)
+            return stats.snapshot() if stats else EncoderStats().snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "subsampling": self.subsampling,
+                "defaults": dict(self.defaults),
+                "streams": {str(source_id): dict(self.defaults, **self._settings.get(source_id, {}),
+                                                 **stats.snapshot())
+                            for source_id, stats in self._stats.items()}
+            }
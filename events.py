@@ -0,0 +1,249 @@
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS detection_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source_id TEXT NOT NULL,
+    track_id INTEGER,
+    label TEXT NOT NULL,
+    confidence REAL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_detection_events_ts ON detection_events (ts);
+CREATE INDEX IF NOT EXISTS ix_detection_events_source_ts ON detection_events (source_id, ts);
+CREATE INDEX IF NOT EXISTS ix_detection_events_label_ts ON detection_events (label, ts);
+
+CREATE TABLE IF NOT EXISTS barcode_events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    source_id TEXT NOT NULL,
+    track_id INTEGER,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    x INTEGER, y INTEGER, w INTEGER, h INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_barcode_events_ts ON barcode_events (ts);
+CREATE INDEX IF NOT EXISTS ix_barcode_events_source_ts ON barcode_events (source_id, ts);
+CREATE INDEX IF NOT EXISTS ix_barcode_events_data_ts ON barcode_events (data, ts);
+
+-- Hourly rollup kept up to date by the writer so per-hour counts never scan the raw events
+CREATE TABLE IF NOT EXISTS detection_hourly (
+    hour INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    label TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, source_id, label)
+) WITHOUT ROWID;
+"""
+
+
+def _where(clauses):
+    return (" WHERE " + " AND ".join(clauses)) if clauses else ""
+
+
+class EventStore:
+    """Append-only SQLite store for detection and barcode events.
+
+    ``record_*`` only put rows on a queue; a background writer drains it
+    and commits up to ``batch_size`` rows per transaction at least every
+    ``flush_interval`` seconds, so frame processing never waits on disk.
+    The database runs in WAL mode so the query methods, which open their
+    own read-only connection per thread, don't block the writer either.
+    If the writer falls more than ``max_pending`` rows behind, new events
+    are dropped and counted rather than growing memory without bound;
+    with ``drop_when_full`` off (offline analysis) callers wait instead.
+    """
+
+    def __init__(self, path, batch_size=500, flush_interval=0.5, max_pending=100000, drop_when_full=True):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_when_full = drop_when_full
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._local = threading.local()
+        self._thread = None
+        self._stop = threading.Event()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    def start(self):
+        """Create the database if needed and start the writer."""
+        conn = sqlite3.connect(self.path)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _put(self, item):
+        if not self.drop_when_full:
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_detections(self, source_id, detections, ts=None):
+        """Queue one event per detection (new object tracks in the app)."""
+        ts = time.time() if ts is None else ts
+        for det in detections:
+            x1, y1, x2, y2 = det.get("box") or (None, None, None, None)
+            self._put(("detection", (ts, source_id, det.get("track_id"), det["label"],
+                                     det.get("confidence"), x1, y1, x2, y2)))
+
+    def record_barcodes(self, source_id, codes, ts=None):
+        """Queue one event per code sighting."""
+        ts = time.time() if ts is None else ts
+        for code in codes:
+            x, y, w, h = code.get("rect") or (None, None, None, None)
+            self._put(("barcode", (ts, source_id, code.get("track_id"), code["type"],
+                                   code["data"], x, y, w, h)))
+
+    def _run(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            while not (self._stop.is_set() and self._queue.empty()):
+                batch = []
+                try:
+                    batch.append(self._queue.get(timeout=self.flush_interval))
+                except queue.Empty:
+                    continue
+                # Collect whatever else arrives within the flush window
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        detections = [row for kind, row in batch if kind == "detection"]
+        barcodes = [row for kind, row in batch if kind == "barcode"]
+        hourly = {}
+        for row in detections:
+            key = (int(row[0] // 3600) * 3600, row[1], row[3])
+            hourly[key] = hourly.get(key, 0) + 1
+        with conn:
+            conn.executemany(
+                "INSERT INTO detection_events (ts, source_id, track_id, label, confidence, x1, y1, x2, y2)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", detections)
+            conn.executemany(
+                "INSERT INTO barcode_events (ts, source_id, track_id, type, data, x, y, w, h)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", barcodes)
+            conn.executemany(
+                "INSERT INTO detection_hourly (hour, source_id, label, count) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (hour, source_id, label) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in hourly.items()])
+        self.written += len(batch)
+        self.batches += 1
+        for _ in batch:
+            self._queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until everything queued so far has been written."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    # Queries
+    def _reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def barcode_sightings(self, data=None, source_id=None, since=None, until=None, limit=100):
+        """Barcode events, newest first, filtered by data, source and time range."""
+        clauses, params = [], []
+        for column, op, value in (("data", "=", data), ("source_id", "=", source_id),
+                                  ("ts", ">=", since), ("ts", "<", until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        rows = self._reader().execute(
+            "SELECT ts, source_id, track_id, type, data, x, y, w, h FROM barcode_events"
+            + _where(clauses) + " ORDER BY ts DESC LIMIT ?", params + [limit])
+        return [{
+            "timestamp": row["ts"],
+            "source_id": row["source_id"],
+            "track_id": row["track_id"],
+            "type": row["type"],
+            "data": row["data"],
+            "rect": [row["x"], row["y"], row["w"], row["h"]]
+        } for row in rows]
+
+    def detection_events(self, label=None, source_id=None, since=None, until=None, limit=100):
+        """Detection events, newest first, filtered by label, source and time range."""
+        clauses, params = [], []
+        for column, op, value in (("label", "=", label), ("source_id", "=", source_id),
+                                  ("ts", ">=", since), ("ts", "<", until)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        rows = self._reader().execute(
+            "SELECT ts, source_id, track_id, label, confidence, x1, y1, x2, y2 FROM detection_events"
+            + _where(clauses) + " ORDER BY ts DESC LIMIT ?", params + [limit])
+        return [{
+            "timestamp": row["ts"],
+            "source_id": row["source_id"],
+            "track_id": row["track_id"],
+            "label": row["label"],
+            "confidence": row["confidence"],
+            "box": [row["x1"], row["y1"], row["x2"], row["y2"]]
+        } for row in rows]
+
+    def hourly_counts(self, label=None, source_id=None, since=None, until=None):
+        """Detections per label per hour from the rollup table, oldest hour first."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append("hour >= ?")
+            params.append(int(since // 3600) * 3600)
+        if until is not None:
+            clauses.append("hour < ?")
+            params.append(until)
+        for column, value in (("label", label), ("source_id", source_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        rows = self._reader().execute(
+            "SELECT hour, label, SUM(count) AS count FROM detection_hourly"
+            + _where(clauses) + " GROUP BY hour, label ORDER BY hour, label", params)
+        return [{"hour": row["hour"], "label": row["label"], "count": row["count"]} for row in rows]
+
+    def snapshot(self):
+        return {
+            "pending": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches
+        }
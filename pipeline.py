@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class FrameQueue:
+    """Per-source bounded queue that keeps only the newest frames.
+
+    Each source gets its own deque of ``maxsize`` entries. Putting into a
+    full deque drops the oldest entry, so a slow consumer always sees the
+    most recent frame instead of working through a backlog. ``get`` serves
+    sources round-robin so one busy phone cannot starve the others.
+
+    With ``claim=True`` a source handed out by ``get`` is skipped until
+    ``release`` is called for it, so several consumers can work in parallel
+    on different sources while each source stays in order.
+    """
+
+    def __init__(self, maxsize=1):
+        self.maxsize = max(1, int(maxsize))
+        self._queues = OrderedDict()
+        self._claimed = set()
+        self._cond = threading.Condition()
+
+    def put(self, source_id, item):
+        """Queue ``item`` for ``source_id``. Returns the number of frames dropped."""
+        with self._cond:
+            queue = self._queues.get(source_id)
+            if queue is None:
+                queue = self._queues[source_id] = deque()
+            dropped = 0
+            while len(queue) >= self.maxsize:
+                queue.popleft()
+                dropped += 1
+            queue.append(item)
+            self._cond.notify()
+            return dropped
+
+    def get(self, timeout=None, claim=False):
+        """Return ``(source_id, item)`` for the next source with work, or None on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for source_id, queue in self._queues.items():
+                    if queue and source_id not in self._claimed:
+                        item = queue.popleft()
+                        if claim:
+                            self._claimed.add(source_id)
+                        # Rotate so the next get() starts with a different source
+                        self._queues.move_to_end(source_id)
+                        return source_id, item
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+
+    def release(self, source_id):
+        """Make a claimed source available to ``get`` again."""
+        with self._cond:
+            self._claimed.discard(source_id)
+            self._cond.notify_all()
+
+    def discard(self, source_id):
+        """Forget a source and any frames still queued for it."""
+        with self._cond:
+            queue = self._queues.pop(source_id, None)
+            return len(queue) if queue else 0
+
+    def depth(self):
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+
+class PipelineStats:
+    """Thread-safe counters for the frame pipeline."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0
+        self.dropped = 0
+        self.processed = 0
+        self.errors = 0
+        self.last_latency_ms = 0.0
+        self.avg_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def add(self, received=0, dropped=0, errors=0):
+        with self._lock:
+            self.received += received
+            self.dropped += dropped
+            self.errors += errors
+
+    def record_processed(self, latency_ms):
+        with self._lock:
+            self.processed += 1
+            self.last_latency_ms = latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            # Exponential moving average keeps the figure responsive to load changes
+            if self.processed == 1:
+                self.avg_latency_ms = latency_ms
+            else:
+                self.avg_latency_ms += 0.1 * (latency_ms - self.avg_latency_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "received": self.received,
+                "dropped": self.dropped,
+                "processed": self.processed,
+                "errors": self.errors,
+                "last_latency_ms": round(self.last_latency_ms, 2),
+                "avg_latency_ms": round(self.avg_latency_ms, 2),
+                "max_latency_ms": round(self.max_latency_ms, 2),
+            }
+
+
+class FramePipeline:
+    """Ingest -> inference -> encode pipeline running on dedicated threads.
+
+    ``submit`` is the ingest stage and only queues the frame, so Socket.IO
+    handlers return immediately. The inference and encode stages each run
+    on their own thread and are connected by drop-oldest ``FrameQueue``s, so
+    when uploads outpace the model the older frames are discarded and
+    end-to-end latency stays bounded.
+
+    Jobs are plain dicts. ``infer(job)`` and ``encode(job)`` fill in fields
+    and return the job (or None to drop it); ``publish(job)`` delivers the
+    result. ``on_error(job, exc)`` is called when a stage raises.
+    ``on_timing(stage, seconds)``, if given, receives how long each frame
+    waited for inference ('queue'), spent in 'infer', 'encode' and
+    'publish', and its end-to-end latency ('total').
+
+    ``inference_workers`` > 1 runs several inference threads so frames from
+    different sources can be in flight together (and batched by the model
+    scheduler); frames from one source are still processed in order.
+    """
+
+    def __init__(self, infer, encode, publish, on_error=None, queue_size=1,
+                 inference_workers=1, on_timing=None):
+        self.infer = infer
+        self.encode = encode
+        self.publish = publish
+        self.on_error = on_error
+        self.on_timing = on_timing
+        self.inference_workers = max(1, int(inference_workers))
+        self.inference_queue = FrameQueue(queue_size)
+        self.encode_queue = FrameQueue(queue_size)
+        self.stats = PipelineStats()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        stages = [(f"inference-{i}", self._inference_loop) for i in range(self.inference_workers)]
+        stages.append(("encode", self._encode_loop))
+        for name, target in stages:
+            t = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=1.0):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def submit(self, source_id, job):
+        """Ingest stage: queue a frame job for ``source_id``."""
+        job.setdefault("source_id", source_id)
+        job.setdefault("received_at", time.monotonic())
+        dropped = self.inference_queue.put(source_id, job)
+        self.stats.add(received=1, dropped=dropped)
+        return dropped == 0
+
+    def discard_source(self, source_id):
+        dropped = self.inference_queue.discard(source_id) + self.encode_queue.discard(source_id)
+        if dropped:
+            self.stats.add(dropped=dropped)
+
+    def snapshot(self):
+        data = self.stats.snapshot()
+        data["inference_queue"] = self.inference_queue.depth()
+        data["encode_queue"] = self.encode_queue.depth()
+        return data
+
+    def _run_stage(self, name, stage, job):
+        started = time.monotonic()
+        try:
+            return stage(job)
+        except Exception as e:
+            self.stats.add(errors=1)
+            if self.on_error:
+                self.on_error(job, e)
+            return None
+        finally:
+            if self.on_timing:
+                self.on_timing(name, time.monotonic() - started)
+
+    def _inference_loop(self):
+        while not self._stop.is_set():
+            entry = self.inference_queue.get(timeout=0.1, claim=True)
+            if entry is None:
+                continue
+            source_id, job = entry
+            if self.on_timing:
+                self.on_timing("queue", time.monotonic() - job["received_at"])
+            try:
+                job = self._run_stage("infer", self.infer, job)
+            finally:
+                self.inference_queue.release(source_id)
+            if job is not None:
+                self.stats.add(dropped=self.encode_queue.put(source_id, job))
+
+    def _encode_loop(self):
+        while not self._stop.is_set():
+            entry = self.encode_queue.get(timeout=0.1)
+            if entry is None:
+                continue
+            _, job = entry
+            job = self._run_stage("encode", self.encode, job)
+            if job is None:
+                continue
+            self._run_stage("publish", self.publish, job)
+            latency = time.monotonic() - job["received_at"]
+            self.stats.record_processed(latency * 1000)
+            if self.on_timing:
+                self.on_timing("total", latency)
@@ -0,0 +1,128 @@
+import threading
+import time
+
+
+class PresenceTracker:
+    """Who is online, driven by Socket.IO connections rather than HTTP requests.
+
+    Each socket (one per open dashboard tab) is registered with ``connect``
+    and removed with ``disconnect``; a user counts as online while at
+    least one of their sockets is, so closing one of several tabs doesn't
+    drop them. Sockets refresh ``last_seen`` with ``heartbeat`` and a
+    background sweep drops the ones silent for longer than ``timeout``,
+    in case a disconnect never arrived. Display names are cached when the
+    user connects and the list served to ``/active_users`` is rebuilt only
+    when someone comes or goes, so reading it is a dict lookup.
+    ``on_change(user_id, name, online)`` is called, outside the lock,
+    whenever a user comes online or goes offline.
+    """
+
+    def __init__(self, timeout=60, sweep_interval=15, on_change=None, clock=time.monotonic):
+        self.timeout = timeout
+        self.sweep_interval = sweep_interval
+        self.on_change = on_change
+        self.clock = clock
+        self.sockets = {}  # sid -> [user_id, last_seen]
+        self.refcounts = {}  # user_id -> open sockets
+        self.names = {}  # user_id -> display name
+        self.version = 0
+        self._users = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sweep_loop, name="presence-sweep", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def connect(self, sid, user_id, name):
+        """Register a socket. Returns True if this brought the user online."""
+        with self._lock:
+            if sid in self.sockets:
+                self.sockets[sid][1] = self.clock()
+                return False
+            self.sockets[sid] = [user_id, self.clock()]
+            self.refcounts[user_id] = self.refcounts.get(user_id, 0) + 1
+            came_online = self.refcounts[user_id] == 1
+            if came_online or self.names.get(user_id) != name:
+                self.names[user_id] = name
+                self._rebuild()
+        if came_online:
+            self._notify(user_id, name, True)
+        return came_online
+
+    def disconnect(self, sid):
+        """Forget a socket. Returns True if that was the user's last one."""
+        with self._lock:
+            went_offline = self._remove(sid)
+        for user_id, name in went_offline:
+            self._notify(user_id, name, False)
+        return bool(went_offline)
+
+    def heartbeat(self, sid):
+        """Refresh a socket. Returns False if it is unknown (e.g. already swept)."""
+        with self._lock:
+            entry = self.sockets.get(sid)
+            if entry is None:
+                return False
+            entry[1] = self.clock()
+            return True
+
+    def expire(self):
+        """Drop sockets without a heartbeat for ``timeout`` seconds."""
+        deadline = self.clock() - self.timeout
+        with self._lock:
+            stale = [sid for sid, (_, last_seen) in self.sockets.items() if last_seen < deadline]
+            went_offline = [user for sid in stale for user in self._remove(sid)]
+        for user_id, name in went_offline:
+            self._notify(user_id, name, False)
+        return len(stale)
+
+    def users(self):
+        """Online users as [{'user_id', 'name'}], sorted by name."""
+        return self._users
+
+    def is_online(self, user_id):
+        return user_id in self.refcounts
+
+    def user_of(self, sid):
+        """The user a socket was registered for, or None."""
+        with self._lock:
+            entry = self.sockets.get(sid)
+            return entry[0] if entry else None
+
+    def snapshot(self):
+        with self._lock:
+            return {"users": len(self.refcounts), "sockets": len(self.sockets), "version": self.version}
+
+    def _remove(self, sid):
+        entry = self.sockets.pop(sid, None)
+        if entry is None:
+            return []
+        user_id = entry[0]
+        self.refcounts[user_id] -= 1
+        if self.refcounts[user_id]:
+            return []
+        del self.refcounts[user_id]
+        self._rebuild()
+        return [(user_id, self.names.get(user_id))]
+
+    def _rebuild(self):
+        # Replaced rather than mutated so readers never see a half-built list
+        self._users = sorted(({"user_id": u, "name": self.names[u]} for u in self.refcounts),
+                             key=lambda user: (user["name"], user["user_id"]))
+        self.version += 1
+
+    def _notify(self, user_id, name, online):
+        if self.on_change is not None:
+            self.on_change(user_id, name, online)
+
+    def _sweep_loop(self):
+        while not self._stop.wait(self.sweep_interval):
+            self.expire()
@@ -1,19 +1,42 @@
-from flask import Flask, render_template, Response, jsonify, redirect, url_for, request, flash
+import time
+BOOT_STARTED = time.monotonic()  # Cold boot to model-ready time is measured from here
+
+from flask import Flask, render_template, Response, jsonify, redirect, url_for, request, flash, g
 import cv2
-from ultralytics import YOLO
-from pyzbar.pyzbar import decode
 import numpy as np
-import time
-import threading
 import atexit
 import uuid
+import os
+import json
+import re
+import socket
+import itertools
+from functools import partial
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
-from flask_socketio import SocketIO, emit
-import base64
+from datetime import datetime, timedelta, timezone
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import logging
+from pipeline import FramePipeline
+from batching import BatchScheduler
+from streams import StreamRegistry, FrameProducer
+from transport import decode_data_url, decode_jpeg, unpack_frame
+from detection import analyze_frame, annotate_frame, scale_results
+from adaptive import QualityController
+from barcodes import BarcodeScanner, BarcodeTracker
+from tracking import TrackerRegistry
+from events import EventStore
+from encoding import JpegEncoder
+from workers import ProcessPoolEngine, load_yolo_analyzer
+from startup import ModelLoader
+from presence import PresenceTracker
+from shared import LocalState, RedisState, SharedPresence
+from cache import LRUCache
+from chat import ChatHistory
+from detectors import load_detector
+from metrics import MetricsRegistry, CONTENT_TYPE, DEPTH_BUCKETS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -25,14 +48,47 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your_secret_key'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///users.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['FRAME_QUEUE_SIZE'] = 1  # Newest frames kept per source before dropping
+app.config['BATCH_MAX_SIZE'] = 4  # Frames per batched YOLO forward pass
+app.config['BATCH_WINDOW_MS'] = 10  # How long to wait for other sources to join a batch
+app.config['MODEL_PATH'] = os.environ.get('MODEL_PATH', 'yolov8n.pt')
+app.config['DETECTOR_BACKEND'] = os.environ.get('DETECTOR_BACKEND', 'auto')  # 'pytorch', 'onnx', 'openvino' or 'auto' (from MODEL_PATH)
+app.config['DETECTOR_THREADS'] = int(os.environ.get('DETECTOR_THREADS', 0))  # Threads per detector; 0 leaves the library default
+app.config['INFERENCE_ENGINE'] = os.environ.get('INFERENCE_ENGINE', 'thread')  # 'thread' or 'process'
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', os.cpu_count() or 1))
+app.config['MODEL_WAIT_TIMEOUT'] = 30  # Seconds a frame waits for the model to finish loading
+app.config['TARGET_FPS'] = 15  # Below this the quality controller skips frames and downscales
+app.config['OVERLAY_MODE'] = os.environ.get('OVERLAY_MODE', 'server')  # 'server' draws boxes into the JPEG, 'client' leaves it to the dashboard
+app.config['JPEG_QUALITY'] = int(os.environ.get('JPEG_QUALITY', 80))  # Default for every stream, adjustable per stream
+app.config['JPEG_MAX_WIDTH'] = int(os.environ.get('JPEG_MAX_WIDTH', 0)) or None  # Downscale wider frames before encoding
+app.config['JPEG_SUBSAMPLING'] = os.environ.get('JPEG_SUBSAMPLING', '420')  # Chroma subsampling: '420', '422' or '444'
+app.config['JPEG_BACKEND'] = os.environ.get('JPEG_BACKEND', 'auto')  # 'auto' uses libjpeg-turbo when PyTurboJPEG is installed
+app.config['JPEG_DECODE_MIN_WIDTH'] = 960  # Uploads wider than 2x/4x this are decoded at 1/2 or 1/4 size
+app.config['KEYFRAME_INTERVAL'] = 3  # Run YOLO every Nth frame; the tracker moves boxes in between
+app.config['BARCODE_FULL_SCAN_EVERY'] = 10  # Frames between full-frame barcode scans
+app.config['BARCODE_TTL'] = 10  # Seconds a code must be gone before it counts as new again
+app.config['USER_CACHE_SIZE'] = 1024  # Logged-in users kept in memory by the Flask-Login user loader
+app.config['USER_CACHE_TTL'] = 300  # Seconds before a cached user is re-read from the database
+app.config['CHAT_ROOMS'] = os.environ.get('CHAT_ROOMS', 'general').split(',')  # One chat room per port or lane, e.g. 'general,port-mombasa,lane-3'
+app.config['CHAT_HISTORY_SIZE'] = 200  # Recent messages kept in memory per room
+app.config['CHAT_MAX_LENGTH'] = 500  # Characters per message, the size of ChatMessage.message
+app.config['PRESENCE_TIMEOUT'] = 60  # Seconds without a heartbeat before a socket stops counting as online
+app.config['FRAME_LOG_EVERY'] = 100  # Log one uploaded frame in this many at INFO; the rest only at DEBUG
+app.config['SOCKETIO_LOGGING'] = os.environ.get('SOCKETIO_LOGGING') == '1'  # Per-packet Socket.IO/Engine.IO logs, for debugging clients
+app.config['MESSAGE_QUEUE'] = os.environ.get('MESSAGE_QUEUE')  # e.g. 'redis://localhost:6379/0' to run several web workers (see serve.py)
+app.config['WORKER_ID'] = os.environ.get('WORKER_ID') or f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+app.config['SHARED_STREAM_TTL'] = 30  # Seconds another worker's stream stays listed after its last detections push
+app.config['EVENTS_DB_PATH'] = os.environ.get('EVENTS_DB_PATH', os.path.join(app.instance_path, 'events.db'))
 db = SQLAlchemy(app)
 
 # Enhanced Flask-SocketIO Setup with explicit protocol version
+# With MESSAGE_QUEUE set, emits from any worker go through it and reach every worker's clients
 socketio = SocketIO(app,
+                  message_queue=app.config['MESSAGE_QUEUE'],
                   cors_allowed_origins="*",
                   async_mode='threading',
-                  engineio_logger=True,
-                  logger=True,
+                  engineio_logger=app.config['SOCKETIO_LOGGING'],
+                  logger=app.config['SOCKETIO_LOGGING'],
                   ping_timeout=60,
                   ping_interval=25,
                   max_http_buffer_size=10 * 1024 * 1024,
@@ -46,19 +102,115 @@ login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 # YOLO & Camera Setup
-model = YOLO("yolov8n.pt")
-cap = cv2.VideoCapture(0)
-lock = threading.Lock()
-latest_detections = []
-latest_barcodes = []
-latest_fps = 0.0
+# With the process engine, YOLO, pyzbar and drawing run in worker processes
+# outside the GIL and the model is not loaded in the web process at all.
+# Either way the engine comes up in the background (see model_loader below)
+detector = None
+batcher = None
+inference_pool = None
+# The webcam is opened on the first webcam stream request, not at import
+cap = None
 camera_active = True
-latest_frame = None
-frame_lock = threading.Lock()
 
-# User tracking
-active_users = set()
-active_users_lock = threading.Lock()
+# Per-source streams (each phone or the webcam) with their own frame and detections
+WEBCAM_SOURCE = 'webcam'
+streams = StreamRegistry()
+quality = QualityController(target_fps=app.config['TARGET_FPS'],
+                            keyframe_interval=app.config['KEYFRAME_INTERVAL'])
+object_tracker = TrackerRegistry()
+jpeg_encoder = JpegEncoder(quality=app.config['JPEG_QUALITY'],
+                           max_width=app.config['JPEG_MAX_WIDTH'],
+                           subsampling=app.config['JPEG_SUBSAMPLING'],
+                           backend=app.config['JPEG_BACKEND'])
+scanner = BarcodeScanner(full_scan_every=app.config['BARCODE_FULL_SCAN_EVERY'])
+barcode_tracker = BarcodeTracker(ttl=app.config['BARCODE_TTL'])
+
+# Detection/barcode history for audits, kept next to users.db and written off the frame path
+event_store = EventStore(app.config['EVENTS_DB_PATH'])
+
+# State the web workers share: presence, the latest detections per source and chat messages.
+# Kept in this process when there is only one worker
+WORKER_ID = app.config['WORKER_ID']
+shared = RedisState(app.config['MESSAGE_QUEUE']) if app.config['MESSAGE_QUEUE'] else LocalState()
+
+# Presence: who has a dashboard open on any worker, pushed to everyone as it changes
+def broadcast_presence(user_id, name, online):
+    socketio.emit('presence', {'user_id': user_id, 'name': name, 'online': online})
+
+presence = SharedPresence(shared, WORKER_ID, PresenceTracker(timeout=app.config['PRESENCE_TIMEOUT']),
+                          on_change=broadcast_presence, ttl=app.config['PRESENCE_TIMEOUT'])
+
+# Metrics served on /metrics. Recording in the frame path is a bisect and a locked increment;
+# state already kept elsewhere (queues, streams) is only read when scraped
+metrics = MetricsRegistry()
+frame_stage_seconds = metrics.histogram(
+    'frame_stage_seconds', "Seconds uploaded frames spend per pipeline stage ('infer' covers 'decode' and 'detect')",
+    ['stage'])
+inference_queue_depth = metrics.histogram(
+    'inference_queue_depth', 'Frames waiting for inference, sampled at every detector run',
+    buckets=DEPTH_BUCKETS).labels()
+metrics.gauge('inference_queue_frames', 'Frames waiting for inference',
+              callback=lambda: frame_pipeline.inference_queue.depth())
+metrics.counter('frames_received_total', 'Frames uploaded to the pipeline',
+                callback=lambda: frame_pipeline.stats.received)
+metrics.counter('frames_dropped_total', 'Frames dropped because a newer one from the same source arrived',
+                callback=lambda: frame_pipeline.stats.dropped)
+metrics.counter('frames_processed_total', 'Frames published to viewers',
+                callback=lambda: frame_pipeline.stats.processed)
+metrics.counter('frame_errors_total', 'Frames a pipeline stage failed on',
+                callback=lambda: frame_pipeline.stats.errors)
+
+def stream_values(key):
+    return {(s['source_id'],): s[key] for s in streams.list()}
+
+metrics.gauge('stream_fps', 'Processed frames per second per source', ['source_id'],
+              callback=partial(stream_values, 'fps'))
+metrics.gauge('mjpeg_viewers', 'Open MJPEG streams per source', ['source_id'],
+              callback=partial(stream_values, 'viewers'))
+socketio_clients = metrics.gauge('socketio_clients', 'Connected Socket.IO clients').labels()
+counted_clients = set()  # sids in socketio_clients, so a disconnect only undoes its own connect
+db_query_seconds = metrics.histogram('db_query_seconds', 'Database query time', ['db'])
+http_request_seconds = metrics.histogram('http_request_duration_seconds', 'Request latency per route',
+                                         ['method', 'route'])
+http_requests = metrics.counter('http_requests_total', 'Requests per route and status',
+                                ['method', 'route', 'status'])
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    if started is not None:
+        db_query_seconds.labels('users').observe(time.perf_counter() - started)
+
+# Only users.db is timed; other engines in the process (e.g. a library's) are left alone
+with app.app_context():
+    event.listen(db.engine, 'before_cursor_execute', start_query_timer)
+    event.listen(db.engine, 'after_cursor_execute', stop_query_timer)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    # Labelled by route pattern, not path, so /video/<source_id> is one series.
+    # Streamed responses (MJPEG) are timed until they start, not until the viewer leaves
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    if 'request_started' in g:
+        http_request_seconds.labels(request.method, route).observe(time.perf_counter() - g.request_started)
+    http_requests.labels(request.method, route, str(response.status_code)).inc()
+    return response
+
+# Uploaded frames are counted in /metrics; logging each one would cost more than handling it
+uploaded_frames = itertools.count(1)
+
+def log_frame(size):
+    n = next(uploaded_frames)
+    if (n - 1) % app.config['FRAME_LOG_EVERY'] == 0:
+        logger.info("Received frame #%d from Android (size: %s)", n, size)
+    else:
+        logger.debug("Received frame #%d from Android (size: %s)", n, size)
 
 # User Model
 class User(UserMixin, db.Model):
@@ -74,124 +226,279 @@ class User(UserMixin, db.Model):
 class ChatMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.String(8), nullable=False)
+    room = db.Column(db.String(32), nullable=False, default='general', server_default='general')
     message = db.Column(db.String(500), nullable=False)
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
+    __table_args__ = (db.Index('ix_chat_message_room_id', 'room', 'id'),)
 
-@app.before_request
-def track_active_users():
-    if current_user.is_authenticated:
-        with active_users_lock:
-            active_users.add(current_user.user_id)
+def create_schema():
+    """Create tables, adding columns and indexes missing from an older users.db."""
+    db.create_all()
+    columns = {c['name'] for c in db.inspect(db.engine).get_columns('chat_message')}
+    with db.engine.begin() as conn:
+        if 'room' not in columns:
+            conn.execute(db.text("ALTER TABLE chat_message ADD COLUMN room VARCHAR(32) NOT NULL DEFAULT 'general'"))
+        for index in ChatMessage.__table__.indexes:
+            index.create(conn, checkfirst=True)
 
-@app.teardown_request
-def remove_active_user(exception=None):
-    if current_user.is_authenticated:
-        with active_users_lock:
-            active_users.discard(current_user.user_id)
+# Chat history is served from memory; the database is only read to fill a room once.
+# Messages posted on other workers are added as they are published
+chat_history = ChatHistory(max_messages=app.config['CHAT_HISTORY_SIZE'])
+
+def add_shared_chat(message):
+    data = json.loads(message)
+    if data['worker'] != WORKER_ID:
+        chat_history.add(data['room'], datetime.fromisoformat(data['sent_at']), data['message'])
+
+# Every request loads the logged-in user; keep them in memory instead of hitting SQLite each time
+user_cache = LRUCache(max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL'])
+
+@login_manager.user_loader
+def load_user(user_id):
+    user = user_cache.get(int(user_id))
+    if user is None:
+        user = User.query.get(int(user_id))
+        if user is not None:
+            # Detach it so it outlives this request's session; it is only read from
+            db.session.expunge(user)
+            user_cache.put(user.id, user)
+    return user
 
 def release_camera():
     global cap
-    if cap.isOpened():
+    if cap is not None and cap.isOpened():
         cap.release()
         logger.info("Camera released")
+    cap = None
 
 atexit.register(release_camera)
 
-def process_frame(frame):
-    global model, lock, latest_detections, latest_barcodes
-    
-    # Object detection
-    results = model(frame)
-    annotated_frame = results[0].plot()
-    
-    # Code detection (both QR and barcodes)
-    codes = decode(frame)
-    codes_data = []
-    
-    for code in codes:
-        code_data = code.data.decode('utf-8')
-        code_type = code.type
-        codes_data.append({"data": code_data, "type": code_type})
-        
-        # Different colors for QR codes vs barcodes
-        color = (0, 255, 0)  # Green for barcodes
-        if code_type == "QRCODE":
-            color = (255, 0, 0)  # Blue for QR codes
-            
-        rect_points = code.polygon
-        if rect_points:
-            pts = np.array([rect_points], np.int32)
-            cv2.polylines(annotated_frame, [pts], True, color, 2)
-            
-        x, y, w, h = code.rect
-        cv2.putText(annotated_frame, f"{code_type}: {code_data}",
-                    (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5, color, 2)
-    
-    # Process detection data
-    labels = results[0].names
-    detections = results[0].boxes
-    detection_data = []
-    for box in detections:
-        conf = float(box.conf[0])
-        if conf > 0.3:
-            cls_id = int(box.cls[0])
-            detection_data.append({
-                "label": labels[cls_id],
-                "confidence": round(conf * 100, 2)
-            })
-    
-    with lock:
-        latest_detections = detection_data
-        latest_barcodes = codes_data
-    
-    return annotated_frame
+def load_inference_engine():
+    """Load YOLO in this process, or start the inference worker processes."""
+    global detector, batcher, inference_pool
+    if app.config['INFERENCE_ENGINE'] == 'process':
+        inference_pool = ProcessPoolEngine(app.config['MODEL_PATH'],
+                                           workers=app.config['INFERENCE_WORKERS'],
+                                           threads_per_worker=app.config['DETECTOR_THREADS'] or 1,
+                                           load_analyzer=partial(load_yolo_analyzer,
+                                                                 backend=app.config['DETECTOR_BACKEND'])).start()
+        atexit.register(inference_pool.stop)
+    else:
+        detector = load_detector(app.config['MODEL_PATH'], app.config['DETECTOR_BACKEND'],
+                                 app.config['DETECTOR_THREADS'])
+        batcher = BatchScheduler(detector.predict_batch,
+                                 max_batch_size=app.config['BATCH_MAX_SIZE'],
+                                 max_wait_ms=app.config['BATCH_WINDOW_MS']).start()
+
+def warm_up_inference_engine():
+    """Run a dummy frame through the whole analysis path before live traffic does."""
+    frame = np.zeros((480, 640, 3), np.uint8)
+    if inference_pool is not None:
+        inference_pool.warm_up(frame)
+    else:
+        analyze_frame(frame, batcher.predict)
+
+model_loader = ModelLoader(load_inference_engine, warm_up_inference_engine, boot_started=BOOT_STARTED)
+
+def overlay_needs(stream):
+    """Which JPEGs a stream's viewers need: ``(annotated, raw)``.
+
+    Viewers in client overlay mode draw boxes themselves from the
+    'overlay' event, so the server only annotates while someone watches
+    the server-drawn feed.
+    """
+    if stream is None:
+        return False, False
+    return stream.viewers > stream.raw_viewers, stream.raw_viewers > 0
+
+def process_frame(frame, source_id=WEBCAM_SOURCE, annotate=True, reduction=1):
+    """Run detection and code scanning on a frame.
+
+    Returns the annotated frame (None without ``annotate``) plus the
+    detection and barcode lists, so concurrent callers each get their own
+    results. YOLO only runs on keyframes; in between the object tracker
+    moves the last boxes along. Under load the quality controller spaces
+    keyframes further apart and runs the detector on a downscaled copy.
+    ``reduction`` is how much smaller than the original ``frame`` was
+    decoded; results are reported in original-image coordinates.
+    """
+    stream = streams.get(source_id, create=False)
+    if stream is not None and stream.seq > 0 and not quality.should_detect(source_id):
+        detection_data = object_tracker.predict(source_id)
+        annotated_frame = annotate_frame(frame, detection_data, stream.barcodes) if annotate else None
+        return annotated_frame, detection_data, stream.barcodes
+
+    if not model_loader.wait(app.config['MODEL_WAIT_TIMEOUT']):
+        raise RuntimeError(f"Model not ready ({model_loader.state})")
 
-def generate_frames():
-    global latest_frame, camera_active, cap, latest_fps, frame_lock
-    prev_time = time.time()
+    started = time.perf_counter()
+    # A frame decoded at reduced size already is part of the way to the detector scale
+    scale = min(1.0, quality.scale * reduction)
+    if inference_pool is not None:
+        results = inference_pool.process(frame, scale, source_id, annotate)
+    else:
+        # Object detection is batched with frames from other sources
+        results = analyze_frame(frame, batcher.predict, scale, scanner, source_id, annotate)
+    elapsed = time.perf_counter() - started
+    depth = frame_pipeline.inference_queue.depth()
+    quality.record(elapsed * 1000, depth)
+    frame_stage_seconds.labels('detect').observe(elapsed)
+    inference_queue_depth.observe(depth)
+    annotated_frame, detection_data, codes_data = results
+    detection_data, codes_data = scale_results(detection_data, codes_data, reduction)
+    detection_data, started = object_tracker.update(source_id, detection_data)
+    event_store.record_detections(source_id, started)
+    track_codes(source_id, codes_data)
+    return annotated_frame, detection_data, codes_data
+
+def track_codes(source_id, codes_data):
+    """Emit and store one 'new_code' event the first time each physical code is seen."""
+    new_codes = barcode_tracker.update(source_id, codes_data)
+    event_store.record_barcodes(source_id, new_codes)
+    for code in new_codes:
+        logger.info(f"New {code['type']} on {source_id}: {code['data']}")
+        socketio.emit('new_code', {
+            'source_id': source_id,
+            'track_id': code['track_id'],
+            'type': code['type'],
+            'data': code['data'],
+            'rect': code['rect'],
+            'timestamp': datetime.utcnow().isoformat()
+        }, to=[f"detections:{source_id}", "detections:all"])
+
+def mjpeg_part(frame_bytes, seq=0, source_id=WEBCAM_SOURCE):
+    # Sequence number and source let client-side overlays match boxes to this frame
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n'
+            + f'Content-Length: {len(frame_bytes)}\r\nX-Frame-Seq: {seq}\r\nX-Source-Id: {source_id}\r\n\r\n'.encode()
+            + frame_bytes + b'\r\n')
+
+def capture_webcam_frame():
+    """Read, process and encode one webcam frame into the webcam stream."""
+    global cap
+    if not camera_active:
+        return False
+    if model_loader.state == "failed":
+        # Nothing to detect with until a restart; the producer backs off between tries
+        raise RuntimeError(f"Model failed to load: {model_loader.error}")
+    if cap is None or not cap.isOpened():
+        cap = cv2.VideoCapture(0)
+        logger.info("Camera opened for webcam stream")
+        if not cap.isOpened():
+            return False
+
+    success, frame = cap.read()
+    if not success:
+        return False
+
+    webcam = streams.get(WEBCAM_SOURCE)
+    annotate, raw = overlay_needs(webcam)
+    annotated_frame, detection_data, codes_data = process_frame(frame, annotate=annotate)
+    webcam.update(encode_jpeg(annotated_frame), detection_data, codes_data,
+                  raw=encode_jpeg(frame) if raw else None, size=(frame.shape[1], frame.shape[0]))
+    push_detections(webcam)
+    push_overlay(webcam)
+    return True
+
+def encode_jpeg(frame, source_id=WEBCAM_SOURCE):
+    if frame is None:
+        return None
+    return jpeg_encoder.encode(frame, source_id)
+
+def push_detections(stream):
+    """Send a stream's detections to subscribed dashboards if they changed."""
+    update = stream.take_push()
+    if update is not None:
+        socketio.emit('detections', update,
+                      to=[f"detections:{stream.source_id}", "detections:all"])
+        share_stream(stream, update)
+
+def share_stream(stream, update):
+    """Store a stream's latest detections for dashboards connected to other workers."""
+    shared.hset('streams', stream.source_id, json.dumps(dict(
+        update,
+        quality=quality.mode(),
+        counts=object_tracker.counts(stream.source_id),
+        viewers=stream.viewers,
+        raw_viewers=stream.raw_viewers,
+        worker=WORKER_ID,
+        updated_at=time.time()
+    )))
+
+def remote_streams():
+    """Latest detections of streams processed by other workers, by source id."""
+    cutoff = time.time() - app.config['SHARED_STREAM_TTL']
+    entries, stale = {}, []
+    for source_id, value in shared.hgetall('streams').items():
+        entry = json.loads(value)
+        if entry['updated_at'] < cutoff:
+            stale.append(source_id)
+        elif entry['worker'] != WORKER_ID:
+            entries[source_id] = entry
+    shared.hdel('streams', *stale)
+    return entries
+
+def remote_detections(entry):
+    return {key: entry[key] for key in ('seq', 'objects', 'barcodes', 'fps', 'quality', 'counts')}
+
+def push_overlay(stream):
+    """Send this frame's box list to viewers drawing overlays client-side."""
+    if stream.raw_viewers > 0:
+        socketio.emit('overlay', stream.overlay(),
+                      to=[f"overlay:{stream.source_id}", "overlay:all"])
+
+# One capture+inference+encode loop feeds every webcam viewer
+webcam_producer = FrameProducer(capture_webcam_frame, name="webcam-producer")
+
+def generate_stream_frames(stream, producer=None, raw=False):
+    """Yield each new frame of a stream from its shared ring buffer."""
+    seq = max(stream.seq - 1, 0)
+    stream.add_viewer(raw=raw)
+    try:
+        while producer is not None or streams.get(stream.source_id, create=False) is stream:
+            if producer is not None:
+                producer.demand()
+            seq, frame_bytes = stream.wait_for_frame(seq, timeout=1.0, raw=raw)
+            if frame_bytes is not None:
+                yield mjpeg_part(frame_bytes, seq, stream.source_id)
+    finally:
+        stream.add_viewer(-1, raw=raw)
+
+def generate_frames(raw=False):
+    webcam = streams.get(WEBCAM_SOURCE)
+    seqs = {}
+    watching = None
     
-    while True:
-        if not camera_active:
-            time.sleep(0.1)
-            continue
-            
-        # Priority to SocketIO frames if available
-        with frame_lock:
-            if latest_frame:
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + latest_frame + b'\r\n')
-                time.sleep(0.05)
+    try:
+        while True:
+            if not camera_active:
+                time.sleep(0.1)
                 continue
-                
-        # Fallback to webcam if no SocketIO frames
-        if not cap.isOpened():
-            cap = cv2.VideoCapture(0)
-            time.sleep(0.1)
-            continue
-
-        success, frame = cap.read()
-        if not success:
-            time.sleep(0.1)
-            continue
-            
-        # Process frame and calculate FPS
-        annotated_frame = process_frame(frame)
-        current_time = time.time()
-        fps = 1.0 / (current_time - prev_time)
-        prev_time = current_time
-        latest_fps = round(fps, 2)
-        
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        frame_bytes = buffer.tobytes()
-        yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+            # Priority to SocketIO frames if available, fall back to the webcam
+            stream = streams.latest(exclude=(WEBCAM_SOURCE,))
+            if stream is None:
+                stream = webcam
+                webcam_producer.demand()
+
+            # Count as a viewer of whichever stream is shown so it renders what we need
+            if stream is not watching:
+                if watching is not None:
+                    watching.add_viewer(-1, raw=raw)
+                stream.add_viewer(raw=raw)
+                watching = stream
+
+            seq, frame_bytes = stream.wait_for_frame(seqs.get(stream.source_id, stream.seq - 1),
+                                                     timeout=0.5, raw=raw)
+            seqs[stream.source_id] = seq
+            if frame_bytes is not None:
+                yield mjpeg_part(frame_bytes, seq, stream.source_id)
+    finally:
+        if watching is not None:
+            watching.add_viewer(-1, raw=raw)
 
 # SocketIO Events with protocol version checking
 @socketio.on('connect')
@@ -208,12 +515,14 @@ def handle_connect():
             
         if current_user.is_authenticated:
             emit('auth_status', {'authenticated': True, 'user': current_user.first_name})
-            with active_users_lock:
-                active_users.add(current_user.user_id)
+            presence.connect(request.sid, current_user.user_id,
+                             f"{current_user.first_name} {current_user.last_name}")
             logger.info(f"Authenticated client connected: {current_user.user_id}")
         else:
             emit('auth_status', {'authenticated': False})
             logger.info("Unauthenticated client connected")
+        counted_clients.add(request.sid)
+        socketio_clients.inc()
             
     except Exception as e:
         logger.error(f"Connection error: {str(e)}")
@@ -222,9 +531,63 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     logger.info(f"Client disconnected: {request.sid}")
+    removed = streams.remove_owner(request.sid)
+    for source_id in removed:
+        frame_pipeline.discard_source(source_id)
+        quality.forget(source_id)
+        scanner.forget(source_id)
+        object_tracker.forget(source_id)
+        jpeg_encoder.forget(source_id)
+    shared.hdel('streams', *removed)
+    presence.disconnect(request.sid)
+    if request.sid in counted_clients:
+        counted_clients.discard(request.sid)
+        socketio_clients.dec()
+
+# Dashboards ping periodically so sockets that vanished without a disconnect expire
+@socketio.on('heartbeat')
+def handle_heartbeat(data=None):
+    if presence.heartbeat(request.sid):
+        return {'status': 'success'}
     if current_user.is_authenticated:
-        with active_users_lock:
-            active_users.discard(current_user.user_id)
+        # Swept while the client was unreachable; count it again
+        presence.connect(request.sid, current_user.user_id,
+                         f"{current_user.first_name} {current_user.last_name}")
+        return {'status': 'success'}
+    return {'status': 'error', 'message': 'Login required'}
+
+# Dashboards subscribe to detection pushes for one source, or all of them
+@socketio.on('subscribe_detections')
+def handle_subscribe_detections(data=None):
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'message': 'Login required'}
+    source_id = (data or {}).get('source_id')
+    join_room(f"detections:{source_id}" if source_id else "detections:all")
+
+    # Send the current state so the dashboard doesn't wait for the next change
+    stream = streams.get(source_id, create=False) if source_id else streams.latest()
+    if stream is not None:
+        emit('detections', dict(stream.snapshot(), source_id=stream.source_id))
+    return {'status': 'success'}
+
+@socketio.on('unsubscribe_detections')
+def handle_unsubscribe_detections(data=None):
+    source_id = (data or {}).get('source_id')
+    leave_room(f"detections:{source_id}" if source_id else "detections:all")
+
+# Viewers drawing overlays themselves get every frame's box list with its seq
+@socketio.on('subscribe_overlay')
+def handle_subscribe_overlay(data=None):
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'message': 'Login required'}
+    source_id = (data or {}).get('source_id')
+    join_room(f"overlay:{source_id}" if source_id else "overlay:all")
+    return {'status': 'success'}
+
+@socketio.on('unsubscribe_overlay')
+def handle_unsubscribe_overlay(data=None):
+    source_id = (data or {}).get('source_id')
+    leave_room(f"overlay:{source_id}" if source_id else "overlay:all")
 
 # Protocol information endpoint
 @app.route('/socket.io/')
@@ -239,56 +602,185 @@ def socketio_info():
     }), 200
 
 # Health check endpoint
+# Reports 503 until the model is loaded and warmed up, so load balancers wait for it
 @app.route('/health')
 def health_check():
+    status = {"ready": "healthy", "failed": "unhealthy"}.get(model_loader.state, "starting")
     return jsonify({
-        "status": "healthy",
+        "status": status,
+        "worker": WORKER_ID,
         "timestamp": datetime.utcnow().isoformat(),
         "components": {
             "database": "connected" if db.engine else "disconnected",
-            "camera": "active" if cap.isOpened() else "inactive",
-            "model": "loaded"
-        }
+            "camera": "active" if cap is not None and cap.isOpened() else "inactive",
+            "model": model_loader.state
+        },
+        "startup": model_loader.snapshot(),
+        "detector": {
+            "backend": type(detector).__name__ if detector else app.config['DETECTOR_BACKEND'],
+            "threads": app.config['DETECTOR_THREADS'] or "default"
+        },
+        "quality": quality.mode(),
+        "barcode_scanner": scanner.snapshot(),
+        "pipeline": frame_pipeline.snapshot(),
+        "batching": batcher.snapshot() if batcher else None,
+        "inference_pool": inference_pool.snapshot() if inference_pool else None,
+        "events": event_store.snapshot(),
+        "presence": presence.snapshot(),
+        "user_cache": user_cache.snapshot(),
+        "encoder": jpeg_encoder.snapshot()
+    }), 200 if status == "healthy" else 503
+
+# Prometheus scrape endpoint; like /health it needs no login
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+# Frame pipeline stages for uploaded frames
+# Source ids end up in MJPEG part headers and room names, so only plain characters are accepted
+SOURCE_ID_PATTERN = re.compile(r'[A-Za-z0-9_.:-]{1,64}')
+
+def uploader_id():
+    """The logged-in user sending this socket event, or None."""
+    return current_user.user_id if current_user.is_authenticated else None
+
+def replaces_owner(user_id, owner):
+    """Whether a session of ``user_id`` may take over a stream fed by session ``owner``.
+
+    A phone whose connection dropped uncleanly reconnects with a new sid
+    while the old one lingers until ping_interval + ping_timeout runs out.
+    It takes its stream over once the old session is gone, or straight
+    away if both sessions belong to the same logged-in user.
+    """
+    if not socketio.server.manager.is_connected(owner, '/'):
+        return True
+    return user_id is not None and presence.user_of(owner) == user_id
+
+def frame_source_id(data):
+    """Source id for an uploaded frame: the device id if sent, else the session id.
+
+    Raises ValueError for ids with other characters than ``SOURCE_ID_PATTERN``
+    allows, the webcam's id or one another session is feeding, so a client
+    cannot overwrite or take over someone else's stream.
+    """
+    if isinstance(data, dict):
+        source_id = data.get('source_id') or data.get('device_id')
+        if source_id:
+            source_id = str(source_id)
+            if not SOURCE_ID_PATTERN.fullmatch(source_id):
+                raise ValueError("Invalid source id")
+            if source_id == WEBCAM_SOURCE or not streams.available(source_id, request.sid,
+                                                                   partial(replaces_owner, uploader_id())):
+                raise ValueError(f"Source id in use: {source_id}")
+            return source_id
+    return request.sid
+
+def infer_stage(job):
+    annotate, _ = overlay_needs(streams.get(job['source_id'], create=False))
+    # Drawing boxes needs the full-size image; inference alone can use a DCT-reduced decode
+    started = time.perf_counter()
+    frame, reduction = decode_jpeg(job['data'], 0 if annotate else app.config['JPEG_DECODE_MIN_WIDTH'])
+    frame_stage_seconds.labels('decode').observe(time.perf_counter() - started)
+    if frame is None:
+        raise ValueError("Failed to decode image frame")
+
+    job['frame'], job['detections'], job['barcodes'] = process_frame(frame, job['source_id'],
+                                                                     annotate, reduction)
+    job['size'] = (frame.shape[1] * reduction, frame.shape[0] * reduction)
+    return job
+
+def encode_stage(job):
+    job['jpeg'] = encode_jpeg(job.pop('frame'), job['source_id'])
+    if job['jpeg'] is not None:
+        job['encode'] = jpeg_encoder.stats(job['source_id'])
+    return job
+
+def publish_stage(job):
+    # Checked again here: another session may have claimed the id since the frame was queued
+    stream = streams.claim(job['source_id'], job['sid'], partial(replaces_owner, job.get('user_id')))
+    if stream is None:
+        raise ValueError(f"Source id in use: {job['source_id']}")
+    # The uploaded JPEG goes to client-overlay viewers as-is, never re-encoded. Binary
+    # uploads arrive as a memoryview into the packet, copied only if someone will read it
+    _, raw = overlay_needs(stream)
+    stream.update(job['jpeg'], job['detections'], job['barcodes'], raw=bytes(job['data']) if raw else None,
+                  size=job.get('size'))
+    push_detections(stream)
+    push_overlay(stream)
+
+    socketio.emit('processed_frame', {
+        'status': 'success',
+        'source_id': job['source_id'],
+        'seq': job.get('seq'),
+        'detections': job['detections'],
+        'barcodes': job['barcodes'],
+        'fps': stream.fps,
+        'encode': job.get('encode'),
+        'timestamp': datetime.utcnow().isoformat()
+    }, to=job['sid'])
+
+def pipeline_error(job, error):
+    logger.error(f"Android frame handling error: {str(error)}")
+    socketio.emit('processed_frame', {
+        'status': 'error',
+        'message': str(error),
+        'timestamp': datetime.utcnow().isoformat()
+    }, to=job['sid'])
+
+frame_pipeline = FramePipeline(infer_stage, encode_stage, publish_stage,
+                               on_error=pipeline_error,
+                               queue_size=app.config['FRAME_QUEUE_SIZE'],
+                               inference_workers=max(app.config['BATCH_MAX_SIZE'],
+                                                     app.config['INFERENCE_WORKERS']
+                                                     if app.config['INFERENCE_ENGINE'] == 'process' else 1),
+                               on_timing=lambda stage, seconds: frame_stage_seconds.labels(stage).observe(seconds))
+
+def emit_frame_error(error):
+    logger.error(f"Android frame handling error: {str(error)}")
+    emit('processed_frame', {
+        'status': 'error',
+        'message': str(error),
+        'timestamp': datetime.utcnow().isoformat()
     })
 
 # Handle frames from Android devices
 @socketio.on('android_frame')
 def handle_android_frame(data):
-    global latest_frame
     try:
-        logger.info(f"Received frame from Android (size: {len(data) if isinstance(data, str) else 'binary'})")
-        
+        log_frame(len(data) if isinstance(data, str) else 'binary')
+
         # Handle both JSON and direct base64 strings
-        img_data = base64.b64decode(data['data'].split(",")[1] if isinstance(data, dict) else data.split(",")[1])
-        np_arr = np.frombuffer(img_data, np.uint8)
-        frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        img_data = decode_data_url(data)
+        source_id = frame_source_id(data)
+        frame_pipeline.submit(source_id, {'data': img_data, 'sid': request.sid, 'user_id': uploader_id()})
 
-        if frame is None:
-            raise ValueError("Failed to decode image frame")
+    except Exception as e:
+        emit_frame_error(e)
 
-        processed_frame = process_frame(frame)
-        _, buffer = cv2.imencode('.jpg', processed_frame)
-        
-        with frame_lock:
-            latest_frame = buffer.tobytes()
-        
-        emit('processed_frame', {
-            'status': 'success',
-            'detections': latest_detections,
-            'barcodes': latest_barcodes,
-            'fps': latest_fps,
-            'timestamp': datetime.utcnow().isoformat()
+# Binary frames: raw JPEG bytes with a small header, no base64 or data URL
+@socketio.on('android_frame_binary')
+def handle_android_frame_binary(data):
+    try:
+        if isinstance(data, dict):
+            # Socket.IO binary attachment with the header fields alongside
+            img_data = memoryview(data['data'])
+            seq = int(data.get('seq', 0))
+            captured_at = data.get('captured_at')
+        else:
+            source_id, seq, captured_at, img_data = unpack_frame(data)
+            if source_id:
+                data = {'source_id': source_id}
+        log_frame(len(img_data))
+        frame_pipeline.submit(frame_source_id(data), {
+            'data': img_data,
+            'sid': request.sid,
+            'user_id': uploader_id(),
+            'seq': seq,
+            'captured_at': captured_at
         })
-        
-        logger.info("Processed Android frame successfully")
-        
+
     except Exception as e:
-        logger.error(f"Android frame handling error: {str(e)}")
-        emit('processed_frame', {
-            'status': 'error',
-            'message': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        })
+        emit_frame_error(e)
 
 # Handle frames from web clients
 @socketio.on('frame')
@@ -329,6 +821,7 @@ def register():
         )
         db.session.add(new_user)
         db.session.commit()
+        user_cache.invalidate(new_user.id)
         flash('Registration successful. Please login.')
         return redirect(url_for('login'))
 
@@ -362,6 +855,7 @@ def reset_password():
         if user:
             user.password = generate_password_hash(new_password)
             db.session.commit()
+            user_cache.invalidate(user.id)
             flash('Your password has been updated. You can now log in.')
             return redirect(url_for('login'))
         else:
@@ -378,12 +872,15 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    return render_template('index.html')
+    return render_template('index.html', overlay_mode=app.config['OVERLAY_MODE'],
+                           chat_rooms=app.config['CHAT_ROOMS'])
 
-@app.route('/video')
-@login_required
-def video():
-    return Response(generate_frames(), 
+def raw_requested():
+    """True if this viewer draws overlays itself (``?overlay=client``)."""
+    return request.args.get('overlay', app.config['OVERLAY_MODE']) == 'client'
+
+def mjpeg_response(frames):
+    return Response(frames, 
                   mimetype='multipart/x-mixed-replace; boundary=frame',
                   headers={
                       'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -391,15 +888,135 @@ def video():
                       'Expires': '0'
                   })
 
+@app.route('/video')
+@login_required
+def video():
+    return mjpeg_response(generate_frames(raw=raw_requested()))
+
+@app.route('/video/<source_id>')
+@login_required
+def video_source(source_id):
+    raw = raw_requested()
+    if source_id == WEBCAM_SOURCE:
+        return mjpeg_response(generate_stream_frames(streams.get(WEBCAM_SOURCE), webcam_producer, raw))
+    stream = streams.get(source_id, create=False)
+    if stream is None:
+        return jsonify({"error": "Unknown source"}), 404
+    return mjpeg_response(generate_stream_frames(stream, raw=raw))
+
+# Streams processed on this worker are served from memory, other workers' from shared state
 @app.route('/detections')
 @login_required
 def get_detections():
-    with lock:
-        return jsonify({
-            "objects": latest_detections,
-            "barcodes": latest_barcodes,
-            "fps": latest_fps
-        })
+    stream = streams.latest()
+    if stream is None:
+        remote = max(remote_streams().values(), key=lambda entry: entry['updated_at'], default=None)
+        if remote is not None:
+            return jsonify(remote_detections(remote))
+        return jsonify({"objects": [], "barcodes": [], "fps": 0.0, "quality": quality.mode(),
+                        "counts": {"active": {}, "total": {}}})
+    return jsonify(dict(stream.snapshot(), quality=quality.mode(),
+                        counts=object_tracker.counts(stream.source_id)))
+
+@app.route('/detections/<source_id>')
+@login_required
+def get_source_detections(source_id):
+    stream = streams.get(source_id, create=False)
+    if stream is None:
+        remote = remote_streams().get(source_id)
+        if remote is not None:
+            return jsonify(remote_detections(remote))
+        return jsonify({"error": "Unknown source"}), 404
+    return jsonify(dict(stream.snapshot(), quality=quality.mode(),
+                        counts=object_tracker.counts(source_id)))
+
+@app.route('/barcodes')
+@login_required
+def get_tracked_barcodes():
+    return jsonify(barcode_tracker.active(request.args.get('source_id')))
+
+def time_arg(name):
+    """Read a query-string time as Unix seconds or ISO 8601 (UTC)."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+def limit_arg(default=100, maximum=1000):
+    # SQLite treats a negative LIMIT as no limit at all
+    return max(1, min(request.args.get('limit', default, type=int), maximum))
+
+def event_query_args():
+    return {
+        "source_id": request.args.get('source_id'),
+        "since": time_arg('since'),
+        "until": time_arg('until')
+    }
+
+@app.route('/events/barcodes', defaults={'data': None})
+@app.route('/events/barcodes/<path:data>')
+@login_required
+def barcode_sightings(data):
+    try:
+        args = event_query_args()
+    except ValueError:
+        return jsonify({"error": "Invalid time range"}), 400
+    limit = limit_arg()
+    with db_query_seconds.labels('events').time():
+        rows = event_store.barcode_sightings(data or request.args.get('data'), limit=limit, **args)
+    return jsonify(rows)
+
+@app.route('/events/detections')
+@login_required
+def detection_history():
+    try:
+        args = event_query_args()
+    except ValueError:
+        return jsonify({"error": "Invalid time range"}), 400
+    limit = limit_arg()
+    with db_query_seconds.labels('events').time():
+        rows = event_store.detection_events(request.args.get('label'), limit=limit, **args)
+    return jsonify(rows)
+
+@app.route('/events/counts')
+@login_required
+def detection_counts():
+    try:
+        args = event_query_args()
+    except ValueError:
+        return jsonify({"error": "Invalid time range"}), 400
+    with db_query_seconds.labels('events').time():
+        rows = event_store.hourly_counts(request.args.get('label'), **args)
+    return jsonify(rows)
+
+@app.route('/streams')
+@login_required
+def list_streams():
+    local = streams.list()
+    listed = {s['source_id'] for s in local}
+    remote = [{"source_id": e['source_id'], "fps": e['fps'], "frames": e['seq'], "viewers": e['viewers'],
+               "raw_viewers": e['raw_viewers'], "worker": e['worker']}
+              for e in remote_streams().values() if e['source_id'] not in listed]
+    return jsonify(local + remote)
+
+@app.route('/streams/<source_id>/encoder', methods=['GET', 'POST'])
+@login_required
+def stream_encoder(source_id):
+    if request.method == 'POST':
+        settings = request.get_json(silent=True) or request.form
+        try:
+            jpeg_encoder.configure(source_id,
+                                   quality=settings.get('quality'),
+                                   max_width=settings.get('max_width'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+    return jsonify(dict(jpeg_encoder.settings(source_id), **jpeg_encoder.stats(source_id)))
 
 @app.route('/camera/status')
 @login_required
@@ -412,72 +1029,166 @@ def toggle_camera():
     global camera_active, cap
     camera_active = not camera_active
     
-    if not camera_active and cap.isOpened():
+    if not camera_active and cap is not None and cap.isOpened():
         cap.release()
+        cap = None
         logger.info("Camera released due to toggle")
-    elif camera_active and not cap.isOpened():
-        cap = cv2.VideoCapture(0)
-        logger.info("Camera reinitialized due to toggle")
+    # Turning it back on leaves opening to the next webcam stream request
     
     return jsonify({"active": camera_active})
 
 @app.route('/active_users')
 @login_required
 def get_active_users():
-    with active_users_lock:
-        users = User.query.filter(User.user_id.in_(list(active_users))).all()
-        return jsonify([{
-            'user_id': u.user_id,
-            'name': f"{u.first_name} {u.last_name}"
-        } for u in users])
+    return jsonify(presence.users())
+
+# Chat: one Socket.IO room per chat room; history comes from the in-memory buffer
+def chat_room(name):
+    """The chat room to use for a request, or None if it isn't a configured one."""
+    name = name or app.config['CHAT_ROOMS'][0]
+    return name if name in app.config['CHAT_ROOMS'] else None
+
+def chat_text_error(text):
+    """Why ``text`` can't be sent as a chat message, or None if it can."""
+    if not text:
+        return 'Empty message'
+    if len(text) > app.config['CHAT_MAX_LENGTH']:
+        return f"Message longer than {app.config['CHAT_MAX_LENGTH']} characters"
+    return None
+
+def chat_payload(msg):
+    return {
+        "id": msg.id,
+        "room": msg.room,
+        "user_id": msg.user_id,
+        "name": f"{msg.first_name} {msg.last_name}",
+        "message": msg.message,
+        "timestamp": msg.timestamp.strftime("%H:%M:%S")
+    }
+
+def recent_chat(room, since_id=0):
+    if not chat_history.loaded(room):
+        cutoff = datetime.utcnow() - timedelta(seconds=chat_history.max_age)
+        messages = ChatMessage.query.filter(
+            ChatMessage.room == room,
+            ChatMessage.timestamp >= cutoff
+        ).order_by(ChatMessage.id.desc()).limit(chat_history.max_messages).all()
+        chat_history.load(room, [(msg.timestamp, chat_payload(msg)) for msg in messages])
+    return chat_history.since(room, since_id)
+
+def post_chat_message(room, text):
+    """Store a message from the current user and push it to everyone in the room."""
+    new_message = ChatMessage(
+        user_id=current_user.user_id,
+        room=room,
+        message=text,
+        first_name=current_user.first_name,
+        last_name=current_user.last_name
+    )
+    db.session.add(new_message)
+    db.session.commit()
+    payload = chat_payload(new_message)
+    chat_history.add(room, new_message.timestamp, payload)
+    shared.publish('chat', json.dumps({'worker': WORKER_ID, 'room': room,
+                                       'sent_at': new_message.timestamp.isoformat(), 'message': payload}))
+    socketio.emit('chat_message', payload, to=f"chat:{room}")
+    return payload
+
+@socketio.on('join_chat')
+def handle_join_chat(data=None):
+    """Join a chat room; the ack carries the messages after ``since_id``."""
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'message': 'Login required'}
+    data = data or {}
+    room = chat_room(data.get('room'))
+    if room is None:
+        return {'status': 'error', 'message': 'Unknown room'}
+    try:
+        since_id = int(data.get('since_id') or 0)
+    except (TypeError, ValueError):
+        return {'status': 'error', 'message': 'Invalid since_id'}
+    join_room(f"chat:{room}")
+    return {'status': 'success', 'room': room, 'messages': recent_chat(room, since_id)}
+
+@socketio.on('leave_chat')
+def handle_leave_chat(data=None):
+    room = chat_room((data or {}).get('room'))
+    if room is not None:
+        leave_room(f"chat:{room}")
+
+@socketio.on('send_chat')
+def handle_send_chat(data=None):
+    if not current_user.is_authenticated:
+        return {'status': 'error', 'message': 'Login required'}
+    data = data or {}
+    room = chat_room(data.get('room'))
+    if room is None:
+        return {'status': 'error', 'message': 'Unknown room'}
+    text = str(data.get('message') or '').strip()
+    error = chat_text_error(text)
+    if error:
+        return {'status': 'error', 'message': error}
+    return {'status': 'success', 'message': post_chat_message(room, text)}
 
 @app.route('/chat/send', methods=['POST'])
 @login_required
 def send_chat():
-    message = request.form.get('message')
-    if message and len(message.strip()) > 0:
-        new_message = ChatMessage(
-            user_id=current_user.user_id,
-            message=message.strip(),
-            first_name=current_user.first_name,
-            last_name=current_user.last_name
-        )
-        db.session.add(new_message)
-        db.session.commit()
-        socketio.emit('new_message', {
-            'user_id': current_user.user_id,
-            'name': f"{current_user.first_name} {current_user.last_name}",
-            'message': message.strip(),
-            'timestamp': datetime.utcnow().strftime("%H:%M:%S")
-        })
-        return jsonify({"status": "success"})
-    return jsonify({"status": "error", "message": "Empty message"}), 400
+    room = chat_room(request.form.get('room'))
+    if room is None:
+        return jsonify({"status": "error", "message": "Unknown room"}), 404
+    message = (request.form.get('message') or '').strip()
+    error = chat_text_error(message)
+    if error:
+        return jsonify({"status": "error", "message": error}), 400
+    post_chat_message(room, message)
+    return jsonify({"status": "success"})
 
 @app.route('/chat/messages')
 @login_required
 def get_chat_messages():
-    one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-    messages = ChatMessage.query.filter(
-        ChatMessage.timestamp >= one_hour_ago
-    ).order_by(ChatMessage.timestamp.desc()).limit(50).all()
-    
-    messages_data = [{
-        "id": msg.id,
-        "user_id": msg.user_id,
-        "name": f"{msg.first_name} {msg.last_name}",
-        "message": msg.message,
-        "timestamp": msg.timestamp.strftime("%H:%M:%S")
-    } for msg in messages]
-    return jsonify(messages_data[::-1])
+    room = chat_room(request.args.get('room'))
+    if room is None:
+        return jsonify({"status": "error", "message": "Unknown room"}), 404
+    return jsonify(recent_chat(room, request.args.get('since_id', 0, type=int)))
 
-if __name__ == '__main__':
+services_started = False
+
+def start_services():
+    """Start the event writer, shared state, presence, frame pipeline and model loader.
+
+    Not done on import: with INFERENCE_ENGINE=process, the inference
+    workers are spawned processes that import this module again when it
+    was run as a script, and must not boot a second app. ``serve`` calls
+    this; so must anything else that runs the app, such as the tests.
+    """
+    global services_started
+    if services_started:
+        return
+    services_started = True
+    os.makedirs(os.path.dirname(os.path.abspath(app.config['EVENTS_DB_PATH'])), exist_ok=True)
+    event_store.start()
+    atexit.register(event_store.stop)
+    shared.start()
+    atexit.register(shared.stop)
+    shared.subscribe('chat', add_shared_chat)
+    presence.start()
+    atexit.register(presence.stop)
+    frame_pipeline.start()
+    model_loader.start()
+
+def serve(host='0.0.0.0', port=5000, debug=False):
+    """Create missing tables and run the server; serve.py runs one of these per worker."""
     with app.app_context():
-        db.create_all()
-    
-    logger.info("Starting server with Engine.IO v4 support...")
-    socketio.run(app, 
-                 host='0.0.0.0', 
-                 port=5000, 
-                 debug=True,
+        create_schema()
+    start_services()
+
+    logger.info(f"Starting server with Engine.IO v4 support on port {port} (worker {WORKER_ID})...")
+    socketio.run(app,
+                 host=host,
+                 port=port,
+                 debug=debug,
                  allow_unsafe_werkzeug=True,
-                 use_reloader=False)
\ No newline at end of file
+                 use_reloader=False)
+
+if __name__ == '__main__':
+    serve(debug=True)
@@ -0,0 +1,91 @@
+"""Run several web worker processes that share a Socket.IO message queue.
+
+One process in threading mode is limited by a single interpreter and
+its GIL, however many cores the box has. This starts ``--workers``
+copies of the app, each on its own port, connected through Redis: every
+``socketio.emit`` goes through it as a message queue, so a broadcast
+from any worker reaches the clients of all of them, and presence, the
+latest detections per source and chat messages are shared there too
+(see shared.py).
+
+Socket.IO needs every request of one client to reach the same worker,
+so put a load balancer with sticky sessions in front of the ports, e.g.
+nginx with ``ip_hash``:
+
+    upstream ports_system { ip_hash; server 127.0.0.1:5001; server 127.0.0.1:5002; }
+
+Camera frames are processed, and their MJPEG stream served, by the
+worker the camera's socket is connected to; route uploads and
+``/video`` to one worker (the first) if dashboards on the others need
+the video as well as the detections. Every worker loads its own model.
+
+    python serve.py --workers 4 --port 5001 --message-queue redis://localhost:6379/0
+"""
+import argparse
+import multiprocessing as mp
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def run_worker(host, port, message_queue):
+    os.environ["MESSAGE_QUEUE"] = message_queue
+    os.environ["WORKER_ID"] = f"{socket.gethostname()}:{port}"
+    # Imported here so every worker builds its own app, sockets and threads
+    import run
+    run.serve(host, port)
+
+
+def wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5001, help="Port of the first worker; the rest follow it")
+    parser.add_argument("--message-queue", default=os.environ.get("MESSAGE_QUEUE", "redis://localhost:6379/0"))
+    parser.add_argument("--start-timeout", type=float, default=120, help="Seconds to wait for each worker")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    workers = []
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        for i in range(args.workers):
+            port = args.port + i
+            worker = ctx.Process(target=run_worker, args=(args.host, port, args.message_queue),
+                                 name=f"web-{port}")
+            worker.start()
+            workers.append(worker)
+            # One at a time, so only the first creates or upgrades the database schema
+            if not wait_for_port(port, args.start_timeout):
+                raise SystemExit(f"Worker on port {port} did not start")
+            print(f"Worker {i} listening on port {port}", file=sys.stderr)
+        print(f"{args.workers} workers on ports {args.port}-{args.port + args.workers - 1}, "
+              f"message queue {args.message_queue}", file=sys.stderr)
+        # Exit (and stop the rest) as soon as any worker dies
+        while all(worker.is_alive() for worker in workers):
+            time.sleep(1)
+        raise SystemExit("A worker exited")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join(10)
+
+
+if __name__ == "__main__":
+    main()
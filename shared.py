@@ -0,0 +1,236 @@
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class LocalState:
+    """In-process stand-in for ``RedisState`` when there is only one web worker.
+
+    Same interface: string hashes plus publish/subscribe. Subscribers are
+    called synchronously by ``publish`` and get the message as bytes.
+    """
+
+    def __init__(self):
+        self._hashes = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def hset(self, name, field, value):
+        with self._lock:
+            self._hashes.setdefault(name, {})[field] = value
+
+    def hdel(self, name, *fields):
+        with self._lock:
+            hash = self._hashes.get(name, {})
+            for field in fields:
+                hash.pop(field, None)
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._hashes.get(name, {}))
+
+    def publish(self, channel, message):
+        """Deliver ``message`` to this process's subscribers; returns how many got it."""
+        if isinstance(message, str):
+            message = message.encode()
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            callback(message)
+        return len(callbacks)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+
+class RedisState:
+    """State shared by every web worker, kept in Redis.
+
+    Hash values are strings (callers store JSON). Published messages
+    reach the subscribers in every worker, this one included; a listener
+    thread calls them with the message as bytes, so callbacks must not
+    block for long. Needs the ``redis`` package.
+    """
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="shared-state", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._pubsub.close()
+
+    def hset(self, name, field, value):
+        self._redis.hset(name, field, value)
+
+    def hdel(self, name, *fields):
+        if fields:
+            self._redis.hdel(name, *fields)
+
+    def hgetall(self, name):
+        return {field.decode(): value.decode() for field, value in self._redis.hgetall(name).items()}
+
+    def publish(self, channel, message):
+        return self._redis.publish(channel, message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.setdefault(channel, [])
+            if not callbacks:
+                self._pubsub.subscribe(channel)
+            callbacks.append(callback)
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(channel, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks and self._subscribers.pop(channel, None) is not None:
+                self._pubsub.unsubscribe(channel)
+
+    def _listen(self):
+        while not self._stop.is_set():
+            if not self._pubsub.subscribed:
+                self._stop.wait(0.1)
+                continue
+            try:
+                message = self._pubsub.get_message(timeout=1.0)
+            except Exception as e:
+                # redis-py reconnects and resubscribes on the next call
+                logger.warning(f"Shared state listener error: {e}")
+                self._stop.wait(1.0)
+                continue
+            if message is None:
+                continue
+            with self._lock:
+                callbacks = list(self._subscribers.get(message["channel"].decode(), ()))
+            for callback in callbacks:
+                try:
+                    callback(message["data"])
+                except Exception:
+                    logger.exception("Shared state subscriber failed")
+
+
+class SharedPresence:
+    """Online users across all web workers.
+
+    Each worker tracks its own sockets in a ``PresenceTracker`` and keeps
+    the users it has online in the shared 'presence' hash under its
+    worker id, with an expiry time refreshed every ``refresh_interval``
+    seconds, so a worker that dies drops out of the list after ``ttl``
+    instead of keeping its users online. A user comes online or goes
+    offline for everyone (``on_change``) only when no other worker has a
+    socket for them. Offers the parts of the tracker's interface the app
+    uses, with ``users`` covering every worker.
+    """
+
+    def __init__(self, state, worker_id, tracker, on_change=None, ttl=60, refresh_interval=15,
+                 clock=time.time):
+        self.state = state
+        self.worker_id = worker_id
+        self.tracker = tracker
+        self.on_change = on_change
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.clock = clock
+        self._stop = threading.Event()
+        self._thread = None
+        tracker.on_change = self._local_change
+
+    def start(self):
+        self.tracker.start()
+        self.publish()
+        self._thread = threading.Thread(target=self._refresh_loop, name="presence-share", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.tracker.stop()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.state.hdel("presence", self.worker_id)
+
+    def connect(self, sid, user_id, name):
+        return self.tracker.connect(sid, user_id, name)
+
+    def disconnect(self, sid):
+        return self.tracker.disconnect(sid)
+
+    def heartbeat(self, sid):
+        return self.tracker.heartbeat(sid)
+
+    def user_of(self, sid):
+        return self.tracker.user_of(sid)
+
+    def publish(self):
+        """Store this worker's online users in the shared hash."""
+        self.state.hset("presence", self.worker_id, json.dumps({
+            "expires_at": self.clock() + self.ttl,
+            "users": {user["user_id"]: user["name"] for user in self.tracker.users()}
+        }))
+
+    def workers(self):
+        """Online users per live worker, dropping entries of workers that stopped refreshing."""
+        now = self.clock()
+        live, expired = {}, []
+        for worker_id, value in self.state.hgetall("presence").items():
+            entry = json.loads(value)
+            if entry["expires_at"] > now:
+                live[worker_id] = entry["users"]
+            else:
+                expired.append(worker_id)
+        self.state.hdel("presence", *expired)
+        return live
+
+    def users(self):
+        """Online users on any worker as [{'user_id', 'name'}], sorted by name."""
+        names = {}
+        for users in self.workers().values():
+            names.update(users)
+        return sorted(({"user_id": u, "name": n} for u, n in names.items()),
+                      key=lambda user: (user["name"], user["user_id"]))
+
+    def snapshot(self):
+        return dict(self.tracker.snapshot(), workers=len(self.workers()))
+
+    def _local_change(self, user_id, name, online):
+        self.publish()
+        elsewhere = any(user_id in users for worker_id, users in self.workers().items()
+                        if worker_id != self.worker_id)
+        if not elsewhere and self.on_change is not None:
+            self.on_change(user_id, name, online)
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            self.publish()
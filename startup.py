@@ -0,0 +1,69 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLoader:
+    """Loads the inference engine in the background and warms it up.
+
+    ``load()`` brings up the model (or worker processes) and ``warm_up()``
+    runs a dummy inference so the first real frame doesn't pay for lazy
+    initialisation, kernel selection and allocator growth. The server can
+    accept connections meanwhile; ``ready`` only becomes true once both
+    have finished. Phase durations are measured from ``boot_started``
+    (a ``time.monotonic()`` value taken as early as possible in the
+    process) so the cold boot to ready time can be reported.
+    """
+
+    def __init__(self, load, warm_up, boot_started=None, clock=time.monotonic):
+        self.load = load
+        self.warm_up = warm_up
+        self.clock = clock
+        self.boot_started = clock() if boot_started is None else boot_started
+        self.state = "pending"
+        self.error = None
+        self.timings = {}
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.timings["import_s"] = round(self.clock() - self.boot_started, 3)
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self.state = "loading"
+            started = self.clock()
+            self.load()
+            loaded = self.clock()
+            self.timings["load_s"] = round(loaded - started, 3)
+
+            self.state = "warming_up"
+            self.warm_up()
+            self.timings["warm_up_s"] = round(self.clock() - loaded, 3)
+            self.timings["boot_to_ready_s"] = round(self.clock() - self.boot_started, 3)
+            self.state = "ready"
+            logger.info(f"Model ready {self.timings['boot_to_ready_s']}s after boot "
+                        f"(load {self.timings['load_s']}s, warm-up {self.timings['warm_up_s']}s)")
+        except Exception as e:
+            self.state = "failed"
+            self.error = repr(e)
+            logger.error(f"Model loading failed: {self.error}")
+        finally:
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def wait(self, timeout=None):
+        """Block until loading finished. Returns True if the model is ready."""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def snapshot(self):
+        return dict(self.timings, state=self.state, error=self.error)
@@ -0,0 +1,288 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRing:
+    """Ring buffer of encoded frames shared by every viewer of a stream.
+
+    The producer publishes each JPEG once; viewers read from it at their own
+    pace by sequence number. A viewer that falls more than ``capacity``
+    frames behind skips ahead to the newest frame instead of replaying
+    stale ones. Callers must hold the owning condition's lock.
+    """
+
+    def __init__(self, capacity=8):
+        self.frames = deque(maxlen=max(1, int(capacity)))
+        self.seq = 0
+
+    def append(self, frame):
+        self.seq += 1
+        self.frames.append((self.seq, frame))
+
+    def next_after(self, last_seq):
+        """Return ``(seq, frame)`` following ``last_seq``, or None if there is none yet."""
+        if not self.frames or last_seq >= self.seq:
+            return None
+        oldest_seq = self.frames[0][0]
+        if last_seq < oldest_seq - 1:
+            return self.frames[-1]
+        return self.frames[last_seq - oldest_seq + 1]
+
+
+class StreamState:
+    """Frame buffer, detection state and FPS counter for one camera source.
+
+    Each ring entry holds two JPEGs for the same sequence number: the frame
+    with boxes drawn in by the server and the raw frame for viewers that
+    draw overlays themselves. Either may be None when no viewer needs it.
+    """
+
+    def __init__(self, source_id, owner=None, ring_size=8):
+        self.source_id = source_id
+        self.owner = owner  # Socket.IO sid that feeds this stream, if any
+        self.frame = None
+        self.raw_frame = None
+        self.ring = FrameRing(ring_size)
+        self.viewers = 0
+        self.raw_viewers = 0  # Viewers drawing overlays client-side
+        self.detections = []
+        self.barcodes = []
+        self.size = None  # (width, height) the boxes are in, for overlays drawn on a smaller JPEG
+        self.fps = 0.0
+        self.updated_at = 0.0
+        self._prev_time = None
+        self._pushed = None
+        self._pushed_at = 0.0
+        self._cond = threading.Condition()
+
+    def update(self, frame, detections, barcodes, raw=None, size=None):
+        """Store a processed frame and its results, and update the FPS counter.
+
+        ``frame`` is the annotated JPEG and ``raw`` the unannotated one.
+        ``size`` is the source frame's (width, height), which the boxes'
+        coordinates refer to; the JPEGs may have been downscaled from it.
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._prev_time is not None and now > self._prev_time:
+                self.fps = round(1.0 / (now - self._prev_time), 2)
+            self._prev_time = now
+            self.frame = frame
+            self.raw_frame = raw
+            self.detections = detections
+            self.barcodes = barcodes
+            self.size = size
+            self.ring.append((frame, raw))
+            self.updated_at = now
+            self._cond.notify_all()
+
+    @property
+    def seq(self):
+        return self.ring.seq
+
+    def wait_for_frame(self, last_seq, timeout=1.0, raw=False):
+        """Block until a frame newer than ``last_seq`` is stored.
+
+        Returns ``(seq, frame)`` for the next frame in the ring, annotated
+        or ``raw``; ``frame`` is None if nothing new arrived in time or
+        that version of the frame was not produced.
+        """
+        with self._cond:
+            entry = self.ring.next_after(last_seq)
+            if entry is None:
+                self._cond.wait(timeout)
+                entry = self.ring.next_after(last_seq)
+            if entry is None:
+                return last_seq, None
+            seq, frames = entry
+            return seq, frames[1 if raw else 0]
+
+    def take_push(self, fps_interval=1.0):
+        """Return a snapshot to push to subscribers, or None if nothing changed.
+
+        A change in which objects or codes are visible is pushed straight
+        away. Box positions, confidences, dwell times and FPS move on every
+        frame, so those are pushed at most once every ``fps_interval``
+        seconds.
+        """
+        now = time.monotonic()
+        with self._cond:
+            current = (
+                [(d.get("track_id"), d["label"]) for d in self.detections],
+                [(c["type"], c["data"]) for c in self.barcodes],
+                self.fps
+            )
+            if self._pushed is not None:
+                detections, barcodes, fps = self._pushed
+                if detections == current[0] and barcodes == current[1]:
+                    if fps == self.fps or now - self._pushed_at < fps_interval:
+                        return None
+            self._pushed = current
+            self._pushed_at = now
+            return {
+                "source_id": self.source_id,
+                "seq": self.ring.seq,
+                "objects": self.detections,
+                "barcodes": self.barcodes,
+                "fps": self.fps
+            }
+
+    def overlay(self):
+        """Compact box list for the latest frame, for viewers drawing their own overlays.
+
+        Boxes are ``[x1, y1, x2, y2, label, confidence, track_id]`` and
+        codes ``[x, y, w, h, type, data]``, tagged with the frame's ``seq``.
+        Their coordinates are in a ``width`` x ``height`` frame (None if
+        unknown), so viewers can scale them to the JPEG they got.
+        """
+        with self._cond:
+            width, height = self.size or (None, None)
+            return {
+                "source_id": self.source_id,
+                "seq": self.ring.seq,
+                "width": width,
+                "height": height,
+                "boxes": [d["box"] + [d["label"], d["confidence"], d.get("track_id")]
+                          for d in self.detections if d.get("box")],
+                "codes": [c["rect"] + [c["type"], c["data"]] for c in self.barcodes]
+            }
+
+    def add_viewer(self, delta=1, raw=False):
+        with self._cond:
+            self.viewers += delta
+            if raw:
+                self.raw_viewers += delta
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "seq": self.ring.seq,
+                "objects": self.detections,
+                "barcodes": self.barcodes,
+                "fps": self.fps
+            }
+
+
+class StreamRegistry:
+    """Registry of per-source streams keyed by device or session id."""
+
+    def __init__(self):
+        self._streams = {}
+        self._lock = threading.Lock()
+
+    def get(self, source_id, owner=None, create=True):
+        """Return a source's stream, creating it for ``owner`` if needed.
+
+        An existing stream keeps its owner; use ``claim`` to publish to one.
+        """
+        with self._lock:
+            stream = self._streams.get(source_id)
+            if stream is None and create:
+                stream = self._streams[source_id] = StreamState(source_id, owner)
+            return stream
+
+    def claim(self, source_id, owner, replaces=None):
+        """Return the stream ``owner`` may publish to, or None if someone else feeds it.
+
+        Creates the stream if there is none. A stream fed by another session
+        is handed over if ``replaces(previous_owner)`` is true. Streams
+        without an owner (the webcam) are fed by the server and never
+        handed to a session.
+        """
+        with self._lock:
+            stream = self._streams.get(source_id)
+            if stream is None:
+                stream = self._streams[source_id] = StreamState(source_id, owner)
+            elif self._replaceable(stream, owner, replaces):
+                stream.owner = owner
+            return stream if stream.owner == owner else None
+
+    def available(self, source_id, owner, replaces=None):
+        """True if ``owner`` could claim ``source_id``."""
+        with self._lock:
+            stream = self._streams.get(source_id)
+            return stream is None or stream.owner == owner or self._replaceable(stream, owner, replaces)
+
+    @staticmethod
+    def _replaceable(stream, owner, replaces):
+        return (stream.owner not in (None, owner) and replaces is not None
+                and replaces(stream.owner))
+
+    def remove_owner(self, owner):
+        """Drop every stream fed by the given Socket.IO session."""
+        with self._lock:
+            removed = [sid for sid, s in self._streams.items() if s.owner == owner]
+            for source_id in removed:
+                del self._streams[source_id]
+            return removed
+
+    def latest(self, exclude=()):
+        """Return the most recently updated stream that has a frame, or None."""
+        with self._lock:
+            candidates = [s for s in self._streams.values()
+                          if s.seq > 0 and s.source_id not in exclude]
+        return max(candidates, key=lambda s: s.updated_at, default=None)
+
+    def list(self):
+        with self._lock:
+            streams = list(self._streams.values())
+        return [{"source_id": s.source_id, "fps": s.fps, "frames": s.seq, "viewers": s.viewers,
+                 "raw_viewers": s.raw_viewers} for s in streams]
+
+
+class FrameProducer:
+    """Single background producer that feeds a stream while viewers want it.
+
+    ``produce()`` is called in a loop and should return True when it
+    published a frame. Viewers call ``demand()`` while watching; the
+    thread starts on first demand and exits after ``idle_timeout`` seconds
+    without any, so N viewers share one capture, one inference and one
+    encode per frame. If ``produce()`` raises, the thread keeps running and
+    retries after a delay that doubles up to ``max_backoff`` seconds,
+    logging at most once per ``log_interval``.
+    """
+
+    def __init__(self, produce, idle_timeout=5.0, name="frame-producer", max_backoff=10.0, log_interval=60.0):
+        self.produce = produce
+        self.idle_timeout = idle_timeout
+        self.name = name
+        self.max_backoff = max_backoff
+        self.log_interval = log_interval
+        self.errors = 0
+        self._logged_at = None
+        self._last_demand = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def demand(self):
+        self._last_demand = time.monotonic()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        backoff = 0.0
+        while time.monotonic() - self._last_demand < self.idle_timeout:
+            try:
+                produced = self.produce()
+            except Exception:
+                self.errors += 1
+                now = time.monotonic()
+                if self._logged_at is None or now - self._logged_at >= self.log_interval:
+                    self._logged_at = now
+                    logger.exception(f"{self.name} failed ({self.errors} errors so far); retrying")
+                backoff = min(self.max_backoff, backoff * 2 or 0.1)
+                time.sleep(backoff)
+                continue
+            backoff = 0.0
+            if not produced:
+                time.sleep(0.1)
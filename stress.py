@@ -1,178 +1,370 @@
-import requests
-from threading import Thread
-import time
-from datetime import datetime
-import random
-import string
+"""Load test a running server with dashboards, MJPEG viewers and camera uploaders.
+
+Everything runs on one asyncio loop, so thousands of simulated clients
+cost a few coroutines each rather than a thread:
+
+- dashboards log in, open a Socket.IO connection like index.html does
+  (subscribe to detections, join the chat, heartbeat) and poll the HTTP
+  endpoints a dashboard still uses every ``--poll-interval`` seconds,
+  sending the odd chat message;
+- viewers stream ``/video/<source>`` and time every MJPEG part;
+- uploaders send recorded JPEGs as binary ``android_frame_binary``
+  messages at ``--fps`` and match each ``processed_frame`` reply to its
+  sequence number for the frame round-trip time. Frames never answered
+  (dropped by the server's frame queue) are counted as dropped.
+
+Against several web workers (serve.py) without a load balancer, give
+their URLs comma-separated: dashboards are spread over them, each
+sticking to one, while uploaders and viewers use the first.
+
+Latency is reported as p50/p95/p99 per HTTP endpoint and per Socket.IO
+event. Redirects to the login page count as failures, not successes.
+Results are written as JSON together with the machine, commit and
+settings they were measured with, so runs can be compared.
+
+    pip install aiohttp "python-socketio[asyncio_client]"
+    python stress.py --dashboards 2000 --viewers 20 --uploaders 4 --fps 15 --frames recorded/ --duration 120
+"""
+import argparse
+import asyncio
 import json
+import os
+import platform
+import random
+import subprocess
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
 
-# Configuration
-BASE_URL = "http://localhost:5000"  # Update if your app runs on a different URL
-NUM_THREADS = 50  # Number of concurrent users to simulate
-TEST_DURATION = 60  # Duration of the test in seconds
-
-# Test user credentials
-TEST_USER = {
-    "email": "test@example.com",
-    "password": "password"
-}
-
-# Generate random strings for testing
-def random_string(length=8):
-    return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
-
-# Worker function for each simulated user
-def worker(user_id, results):
-    session = requests.Session()
-    user_stats = {
-        "requests": 0,
-        "success": 0,
-        "errors": 0,
-        "response_times": []
-    }
-    
-    # Register a new user (simulating different users)
-    user_data = {
-        "email": f"stress_{user_id}@test.com",
-        "password": "password",
-        "first_name": f"Stress{user_id}",
-        "last_name": "User",
-        "national_id": str(10000000 + user_id)
+import aiohttp
+import cv2
+import numpy as np
+import socketio
+
+from transport import pack_frame
+
+POLLED_ENDPOINTS = ["/detections", "/camera/status", "/active_users", "/barcodes"]
+
+
+class Recorder:
+    """Latency samples and outcome counts per metric name."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+
+    def record(self, name, ms=None, outcome="ok"):
+        if ms is not None:
+            self.samples[name].append(ms)
+        self.outcomes[name][outcome] += 1
+
+    def summary(self):
+        return {name: dict(latency(self.samples.get(name, [])), outcomes=dict(self.outcomes[name]))
+                for name in sorted(self.outcomes)}
+
+
+def latency(samples):
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples)
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 2),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+        "max_ms": round(float(values.max()), 2)
     }
-    
-    try:
-        # Register
-        start_time = time.time()
-        response = session.post(f"{BASE_URL}/register", data=user_data)
-        user_stats["requests"] += 1
-        if response.status_code == 200:
-            user_stats["success"] += 1
-        else:
-            user_stats["errors"] += 1
-        user_stats["response_times"].append(time.time() - start_time)
-        
-        # Login
-        start_time = time.time()
-        response = session.post(f"{BASE_URL}/login", data={
-            "email": user_data["email"],
-            "password": user_data["password"]
-        })
-        user_stats["requests"] += 1
-        if response.status_code == 200:
-            user_stats["success"] += 1
+
+
+def elapsed_ms(start):
+    return (time.perf_counter() - start) * 1000
+
+
+def load_jpegs(folder):
+    """Recorded frames as JPEG bytes, or synthetic 720p frames if no folder is given."""
+    if folder:
+        jpegs = []
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name.lower().endswith((".jpg", ".jpeg")):
+                with open(path, "rb") as f:
+                    jpegs.append(f.read())
+        if not jpegs:
+            raise SystemExit(f"No JPEGs found in {folder}")
+        return jpegs
+    rng = np.random.default_rng(0)
+    small = rng.integers(0, 255, (45, 80, 3), dtype=np.uint8)
+    return [cv2.imencode(".jpg", cv2.resize(small, (1280, 720), interpolation=cv2.INTER_CUBIC))[1].tobytes()]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.urls = [url.rstrip("/") for url in args.url.split(",")]
+        self.url = self.urls[0]
+        self.recorder = Recorder()
+        self.deadline = 0.0
+        self.frames = {"sent": 0, "processed": 0, "errors": 0, "late_sends": 0}
+        self.rtt = []
+        self.http = None
+
+    # HTTP
+    async def request(self, name, method, path, cookie=None, data=None, url=None):
+        """Time one request. Returns (status, body) or (None, None) on a connection error."""
+        start = time.perf_counter()
+        try:
+            async with self.http.request(method, (url or self.url) + path, data=data, allow_redirects=False,
+                                         headers={"Cookie": cookie} if cookie else None) as response:
+                body = await response.read()
+                location = response.headers.get("Location", "")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.recorder.record(f"http {method} {name}", outcome=type(e).__name__)
+            return None, None
+        if response.status in (301, 302, 303) and "/login?next=" in location:
+            # Flask-Login bouncing an unauthenticated request, not a real response
+            outcome = "redirect_to_login"
         else:
-            user_stats["errors"] += 1
-        user_stats["response_times"].append(time.time() - start_time)
-        
-        # Simulate user activity for the test duration
-        end_time = time.time() + TEST_DURATION
-        while time.time() < end_time:
-            # Randomly select an endpoint to test
-            endpoint = random.choice([
-                ("/", "GET", None),
-                ("/detections", "GET", None),
-                ("/camera/status", "GET", None),
-                ("/camera/toggle", "POST", None),
-                ("/chat/messages", "GET", None),
-                ("/chat/send", "POST", {"message": f"Test message {random_string()}"}),
-                ("/active_users", "GET", None)
-            ])
-            
+            outcome = str(response.status)
+        self.recorder.record(f"http {method} {name}", elapsed_ms(start), outcome)
+        return response.status, body
+
+    async def login(self, index):
+        """Register (if needed) and log in stress user ``index``; returns its session cookie."""
+        email = f"stress_{index}@test.com"
+        await self.request("/register", "POST", "/register", data={
+            "email": email, "password": "password", "confirm_password": "password",
+            "first_name": f"Stress{index}", "last_name": "User", "national_id": str(10000000 + index)})
+        start = time.perf_counter()
+        async with self.http.post(self.url + "/login", data={"email": email, "password": "password"},
+                                  allow_redirects=False) as response:
+            await response.read()
+            session = response.cookies.get("session")
+            ok = response.status == 302 and session is not None
+            self.recorder.record("http POST /login", elapsed_ms(start), "302" if ok else str(response.status))
+        if not ok:
+            raise RuntimeError(f"Login failed for {email}: HTTP {response.status}")
+        return f"session={session.value}"
+
+    # Socket.IO
+    async def connect_socket(self, cookie, name, url=None):
+        client = socketio.AsyncClient(http_session=self.http, reconnection=False)
+        start = time.perf_counter()
+        try:
+            # Polling first, then upgrade, as browsers do; the handshake request carries the cookie
+            await client.connect(url or self.url, headers={"Cookie": cookie}, wait_timeout=10)
+        except (socketio.exceptions.ConnectionError, asyncio.TimeoutError) as e:
+            self.recorder.record(f"connect {name}", outcome=type(e).__name__)
+            return None
+        self.recorder.record(f"connect {name}", elapsed_ms(start))
+        return client
+
+    async def call(self, client, event, data=None):
+        """Emit an event and time until its ack."""
+        start = time.perf_counter()
+        try:
+            response = await client.call(event, data, timeout=10)
+        except (socketio.exceptions.TimeoutError, socketio.exceptions.BadNamespaceError) as e:
+            self.recorder.record(f"event {event}", outcome=type(e).__name__)
+            return None
+        status = response.get("status", "ok") if isinstance(response, dict) else "ok"
+        self.recorder.record(f"event {event}", elapsed_ms(start), status)
+        return response
+
+    def count_pushes(self, client, *events):
+        for event in events:
+            client.on(event, lambda *_, event=event: self.recorder.record(f"push {event}"))
+
+    # Clients
+    async def dashboard(self, index, cookie):
+        await asyncio.sleep(random.uniform(0, self.args.ramp))
+        url = self.urls[index % len(self.urls)]
+        client = await self.connect_socket(cookie, "dashboard", url)
+        if client is None:
+            return
+        self.count_pushes(client, "detections", "new_code", "chat_message", "presence")
+        try:
+            await self.call(client, "subscribe_detections", {})
+            await self.call(client, "join_chat", {"room": self.args.chat_room})
+            next_heartbeat = time.monotonic() + 20
+            while time.monotonic() < self.deadline:
+                await asyncio.sleep(random.uniform(0.5, 1.5) * self.args.poll_interval)
+                path = random.choice(POLLED_ENDPOINTS)
+                await self.request(path, "GET", path, cookie, url=url)
+                if random.random() < self.args.chat_rate:
+                    await self.call(client, "send_chat", {"room": self.args.chat_room,
+                                                          "message": f"load test {index}"})
+                if time.monotonic() >= next_heartbeat:
+                    await self.call(client, "heartbeat")
+                    next_heartbeat += 20
+        finally:
+            await client.disconnect()
+
+    async def viewer(self, index, cookie, path):
+        await asyncio.sleep(random.uniform(0, self.args.ramp))
+        name = f"mjpeg {path.split('?')[0]}"
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=10)
+        while time.monotonic() < self.deadline:
+            start = time.perf_counter()
             try:
-                start_time = time.time()
-                if endpoint[1] == "GET":
-                    response = session.get(f"{BASE_URL}{endpoint[0]}")
-                else:
-                    response = session.post(f"{BASE_URL}{endpoint[0]}", data=endpoint[2])
-                
-                user_stats["requests"] += 1
-                if response.status_code == 200:
-                    user_stats["success"] += 1
+                async with self.http.get(self.url + path, headers={"Cookie": cookie}, timeout=timeout) as response:
+                    if response.status == 200:
+                        await self.read_mjpeg(response, name, start)
+                        return
+                    self.recorder.record(name, outcome=str(response.status))
+            except (aiohttp.ClientError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                self.recorder.record(name, outcome=type(e).__name__)
+                return
+            # 404 until the uploader's first frame has been processed
+            await asyncio.sleep(1)
+
+    async def read_mjpeg(self, response, name, start):
+        last = None
+        while time.monotonic() < self.deadline:
+            # --frame boundary, part headers, blank line, then Content-Length bytes of JPEG
+            length = None
+            while True:
+                line = await response.content.readline()
+                if not line:
+                    return
+                line = line.strip()
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+                elif not line and length is not None:
+                    break
+            await response.content.readexactly(length)
+            now = time.perf_counter()
+            if last is None:
+                self.recorder.record(f"{name} first frame", (now - start) * 1000)
+            else:
+                self.recorder.record(f"{name} frame gap", (now - last) * 1000)
+            last = now
+
+    async def uploader(self, index, cookie, jpegs):
+        client = await self.connect_socket(cookie, "uploader")
+        if client is None:
+            return
+        source_id = f"stress-cam-{index}"
+        pending = {}
+
+        async def processed(data):
+            sent = pending.pop(data.get("seq"), None)
+            if data.get("status") != "success":
+                self.frames["errors"] += 1
+            elif sent is not None:
+                self.frames["processed"] += 1
+                self.rtt.append(elapsed_ms(sent))
+
+        client.on("processed_frame", processed)
+        interval = 1.0 / self.args.fps
+        next_send = time.perf_counter()
+        seq = 0
+        try:
+            while time.monotonic() < self.deadline:
+                seq += 1
+                pending[seq] = time.perf_counter()
+                await client.emit("android_frame_binary", pack_frame(jpegs[seq % len(jpegs)], source_id, seq))
+                self.frames["sent"] += 1
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
                 else:
-                    user_stats["errors"] += 1
-                user_stats["response_times"].append(time.time() - start_time)
-                
-                # Random delay between requests (0.1-1 second)
-                time.sleep(random.uniform(0.1, 1))
-                
-            except Exception as e:
-                user_stats["errors"] += 1
-                user_stats["requests"] += 1
-                print(f"User {user_id} error: {str(e)}")
-                
-    except Exception as e:
-        print(f"User {user_id} setup failed: {str(e)}")
-    
-    results[user_id] = user_stats
-
-# Main test function
-def run_stress_test():
-    print(f"Starting stress test with {NUM_THREADS} users for {TEST_DURATION} seconds...")
-    start_time = datetime.now()
-    
-    threads = []
-    results = {}
-    
-    # Create and start worker threads
-    for i in range(NUM_THREADS):
-        t = Thread(target=worker, args=(i, results))
-        threads.append(t)
-        t.start()
-    
-    # Wait for all threads to complete
-    for t in threads:
-        t.join()
-    
-    # Calculate statistics
-    total_requests = 0
-    total_success = 0
-    total_errors = 0
-    all_response_times = []
-    
-    for user_id, stats in results.items():
-        total_requests += stats["requests"]
-        total_success += stats["success"]
-        total_errors += stats["errors"]
-        all_response_times.extend(stats["response_times"])
-    
-    if all_response_times:
-        avg_response_time = sum(all_response_times) / len(all_response_times)
-        min_response_time = min(all_response_times)
-        max_response_time = max(all_response_times)
-    else:
-        avg_response_time = min_response_time = max_response_time = 0
-    
-    test_duration = (datetime.now() - start_time).total_seconds()
-    requests_per_second = total_requests / test_duration if test_duration > 0 else 0
-    
-    # Print summary
-    print("\nStress Test Results:")
-    print(f"Test Duration: {test_duration:.2f} seconds")
-    print(f"Total Requests: {total_requests}")
-    print(f"Successful Requests: {total_success}")
-    print(f"Failed Requests: {total_errors}")
-    print(f"Requests per Second: {requests_per_second:.2f}")
-    print(f"Average Response Time: {avg_response_time:.4f} seconds")
-    print(f"Minimum Response Time: {min_response_time:.4f} seconds")
-    print(f"Maximum Response Time: {max_response_time:.4f} seconds")
-    
-    # Save detailed results to file
-    with open("stress_test_results.json", "w") as f:
-        json.dump({
-            "summary": {
-                "test_duration": test_duration,
-                "total_requests": total_requests,
-                "successful_requests": total_success,
-                "failed_requests": total_errors,
-                "requests_per_second": requests_per_second,
-                "avg_response_time": avg_response_time,
-                "min_response_time": min_response_time,
-                "max_response_time": max_response_time
-            },
-            "detailed_results": results
-        }, f, indent=2)
-    
-    print("Detailed results saved to stress_test_results.json")
+                    # The client itself can't keep up; don't burst to catch up
+                    self.frames["late_sends"] += 1
+                    next_send = time.perf_counter()
+            # Give frames still in the pipeline a chance to come back
+            await asyncio.sleep(self.args.drain)
+        finally:
+            await client.disconnect()
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar(),
+                                         timeout=aiohttp.ClientTimeout(total=30)) as self.http:
+            cookies = [await self.login(i) for i in range(self.args.users)]
+            jpegs = load_jpegs(self.args.frames)
+            self.deadline = time.monotonic() + self.args.ramp + self.args.duration
+            video_path = ("/video/stress-cam-0" if self.args.uploaders else "/video") + (
+                "?overlay=client" if self.args.client_overlay else "")
+            tasks = [self.dashboard(i, cookies[i % len(cookies)]) for i in range(self.args.dashboards)]
+            tasks += [self.viewer(i, cookies[i % len(cookies)], video_path) for i in range(self.args.viewers)]
+            tasks += [self.uploader(i, cookies[i % len(cookies)], jpegs) for i in range(self.args.uploaders)]
+            started = time.perf_counter()
+            await asyncio.gather(*tasks)
+            wall = time.perf_counter() - started
+            _, health = await self.request("/health", "GET", "/health")
+        return wall, json.loads(health) if health else None
+
+
+def machine_info():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"host": platform.node(), "platform": platform.platform(), "python": platform.python_version(),
+            "cpus": os.cpu_count(), "commit": commit}
+
+
+def raise_file_limit():
+    """Thousands of sockets need more file descriptors than the usual soft limit of 1024."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000",
+                        help="Server URL, or comma-separated worker URLs to spread dashboards over")
+    parser.add_argument("--dashboards", type=int, default=500, help="Simulated dashboard tabs")
+    parser.add_argument("--viewers", type=int, default=10, help="MJPEG /video viewers")
+    parser.add_argument("--uploaders", type=int, default=2, help="Camera uploaders")
+    parser.add_argument("--users", type=int, default=50, help="Accounts the clients are spread over")
+    parser.add_argument("--fps", type=float, default=15, help="Frames per second per uploader")
+    parser.add_argument("--frames", help="Folder of recorded JPEGs to upload (synthetic if omitted)")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of full load after ramp-up")
+    parser.add_argument("--ramp", type=float, default=10, help="Seconds over which clients connect")
+    parser.add_argument("--poll-interval", type=float, default=5, help="Mean seconds between dashboard polls")
+    parser.add_argument("--chat-rate", type=float, default=0.02, help="Chance a poll also sends a chat message")
+    parser.add_argument("--chat-room", default="general")
+    parser.add_argument("--drain", type=float, default=3, help="Seconds to wait for in-flight frames")
+    parser.add_argument("--client-overlay", action="store_true", help="Viewers request ?overlay=client")
+    parser.add_argument("--output", default="stress_test_results.json")
+    args = parser.parse_args()
+
+    raise_file_limit()
+    test = LoadTest(args)
+    print(f"{args.dashboards} dashboards, {args.viewers} viewers, {args.uploaders} uploaders at "
+          f"{args.fps} fps for {args.duration}s against {args.url}...")
+    started_at = datetime.now(timezone.utc).isoformat()
+    wall, health = asyncio.run(test.run())
+
+    frames = dict(test.frames)
+    frames["dropped"] = frames["sent"] - frames["processed"] - frames["errors"]
+    frames["drop_rate"] = round(frames["dropped"] / frames["sent"], 4) if frames["sent"] else None
+    frames["rtt"] = latency(test.rtt)
+    metrics = test.recorder.summary()
+
+    print(f"\n{'metric':<40} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  outcomes")
+    for name, stats in metrics.items():
+        print(f"{name:<40} {sum(stats['outcomes'].values()):>7} {str(stats.get('p50_ms', '-')):>8} "
+              f"{str(stats.get('p95_ms', '-')):>8} {str(stats.get('p99_ms', '-')):>8}  {stats['outcomes']}")
+    rtt = frames["rtt"]
+    print(f"\nframes: sent {frames['sent']}, processed {frames['processed']}, dropped {frames['dropped']} "
+          f"({frames['drop_rate']}), errors {frames['errors']}; round trip p50 {rtt.get('p50_ms')} "
+          f"p95 {rtt.get('p95_ms')} p99 {rtt.get('p99_ms')} ms")
+
+    with open(args.output, "w") as f:
+        json.dump({"started_at": started_at, "wall_s": round(wall, 2), "machine": machine_info(),
+                   "config": vars(args), "metrics": metrics, "frames": frames, "server_health": health},
+                  f, indent=2)
+    print(f"Results saved to {args.output}")
+
 
 if __name__ == "__main__":
-    run_stress_test()
\ No newline at end of file
+    main()
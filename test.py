@@ -1,8 +1,43 @@
 import unittest
-from run import app, db, User, ChatMessage
+import os
+import tempfile
+
+# run.py reads the events database path at import; keep the suite's rows out of the real audit store
+os.environ['EVENTS_DB_PATH'] = os.path.join(tempfile.mkdtemp(), 'events.db')
+
+from run import app, db, socketio, User, ChatMessage, streams, barcode_tracker, event_store, user_cache, chat_history, shared, socketio_clients, publish_stage, start_services
+from pipeline import FrameQueue, FramePipeline
+from batching import BatchScheduler
+from streams import StreamRegistry, StreamState, FrameRing, FrameProducer
+from transport import pack_frame, unpack_frame, decode_data_url, decode_jpeg, jpeg_size
+from adaptive import QualityController
+from barcodes import BarcodeScanner, BarcodeTracker, decode_codes
+from tracking import ObjectTracker, iou_matrix
+from events import EventStore
+from encoding import JpegEncoder
+from workers import ProcessPoolEngine
+from startup import ModelLoader
+from presence import PresenceTracker
+from shared import LocalState, SharedPresence
+from cache import LRUCache
+from chat import ChatHistory
+from detectors import letterbox, postprocess, guess_backend, Detections
+from analyze import Source, find_sources, analyze_source, prefetch, run_parallel
+from metrics import MetricsRegistry
+import cv2
+import numpy as np
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask import url_for
 from datetime import datetime, timedelta, timezone
+import threading
+import time
+import json
+import subprocess
+import sys
+
+def setUpModule():
+    # Not on import: inference worker processes import this module to find stub_analyzer
+    start_services()
 
 class FlaskTestCase(unittest.TestCase):
     
@@ -35,6 +70,8 @@ class FlaskTestCase(unittest.TestCase):
         with app.app_context():
             db.session.remove()
             db.drop_all()
+        user_cache.clear()
+        chat_history.clear()
     
     # Authentication Tests
     def test_login_success(self):
@@ -119,6 +156,131 @@ class FlaskTestCase(unittest.TestCase):
         self.assertIn('barcodes', response.json)
         self.assertIn('fps', response.json)
     
+    def test_source_detections_endpoint(self):
+        """Test per-source detections are kept separate"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ), follow_redirects=True)
+
+        streams.get("lane1").update(b"jpeg1", [{"label": "truck", "confidence": 91.0}], [])
+        streams.get("lane2").update(b"jpeg2", [], [{"data": "CONT123", "type": "CODE128"}])
+
+        response = self.app.get('/detections/lane1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['objects'][0]['label'], "truck")
+        self.assertEqual(response.json['barcodes'], [])
+
+        response = self.app.get('/detections/lane2')
+        self.assertEqual(response.json['barcodes'][0]['data'], "CONT123")
+
+        response = self.app.get('/detections/unknown')
+        self.assertEqual(response.status_code, 404)
+
+    def test_tracked_barcodes_endpoint(self):
+        """Test tracked codes are listed with first and last seen times"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ), follow_redirects=True)
+
+        barcode_tracker.update("lane3", [{"data": "CONT9", "type": "QRCODE", "rect": [0, 0, 50, 50]}])
+        response = self.app.get('/barcodes?source_id=lane3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0]['data'], "CONT9")
+        self.assertIn('first_seen', response.json[0])
+        self.assertIn('last_seen', response.json[0])
+
+    def test_event_history_endpoints(self):
+        """Test stored barcode sightings and hourly counts are queryable"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ), follow_redirects=True)
+
+        event_store.record_barcodes("lane4", [{"data": "AUDIT-1", "type": "CODE128", "rect": [0, 0, 50, 20]}])
+        event_store.record_detections("lane4", [{"label": "forklift", "confidence": 80.0, "box": [0, 0, 9, 9]}])
+        self.assertTrue(event_store.flush())
+
+        response = self.app.get('/events/barcodes/AUDIT-1?source_id=lane4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0]['data'], "AUDIT-1")
+
+        response = self.app.get('/events/counts?label=forklift&source_id=lane4')
+        self.assertGreaterEqual(response.json[0]['count'], 1)
+
+        response = self.app.get('/events/detections?since=not-a-time')
+        self.assertEqual(response.status_code, 400)
+
+        # A negative limit would mean no limit to SQLite
+        event_store.record_barcodes("lane4", [{"data": "AUDIT-1", "type": "CODE128", "rect": [0, 0, 50, 20]}])
+        self.assertTrue(event_store.flush())
+        response = self.app.get('/events/barcodes/AUDIT-1?limit=-1')
+        self.assertEqual(len(response.json), 1)
+
+    def test_metrics_endpoint(self):
+        """Test /metrics serves request, database and pipeline metrics in Prometheus format"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        self.app.get('/events/counts')
+        self.app.get('/video/no-such-source')
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{method="POST",route="/login",status="302"}', text)
+        self.assertIn('http_requests_total{method="GET",route="/video/<source_id>",status="404"}', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="/events/counts",le="+Inf"}', text)
+        self.assertIn('db_query_seconds_count{db="users"}', text)
+        self.assertIn('db_query_seconds_count{db="events"}', text)
+        self.assertIn('# TYPE frame_stage_seconds histogram', text)
+        self.assertIn('frames_dropped_total ', text)
+        self.assertIn('socketio_clients ', text)
+
+    def test_raw_frame_stored_as_bytes(self):
+        """Test a binary upload's memoryview is stored as bytes, and only for raw viewers"""
+        job = {'source_id': 'lane-raw', 'sid': 'sid-raw', 'jpeg': b'annotated', 'detections': [],
+               'barcodes': [], 'data': memoryview(b'..raw..')[2:5]}
+        publish_stage(dict(job))
+        stream = streams.get('lane-raw', create=False)
+        try:
+            self.assertIsNone(stream.wait_for_frame(0, timeout=0.01, raw=True)[1])
+            stream.add_viewer(1, raw=True)
+            publish_stage(dict(job))
+            raw = stream.wait_for_frame(1, timeout=0.01, raw=True)[1]
+            self.assertEqual(raw, b'raw')
+            self.assertIsInstance(raw, bytes)
+        finally:
+            streams.remove_owner('sid-raw')
+
+    def test_socketio_clients_gauge(self):
+        """Test the connected-clients gauge counts each accepted socket once and rejected ones not at all"""
+        before = socketio_clients.value
+        client = socketio.test_client(app, query_string='EIO=4')
+        self.assertEqual(socketio_clients.value, before + 1)
+        rejected = socketio.test_client(app, query_string='EIO=3')
+        self.assertFalse(rejected.is_connected())
+        client.disconnect()
+        self.assertEqual(socketio_clients.value, before)
+
+    def test_stream_encoder_settings(self):
+        """Test per-stream JPEG quality and max width can be read and changed"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ), follow_redirects=True)
+
+        response = self.app.post('/streams/lane5/encoder', json={"quality": 55, "max_width": 640})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['quality'], 55)
+        self.assertEqual(self.app.get('/streams/lane5/encoder').json['max_width'], 640)
+
+        response = self.app.post('/streams/lane5/encoder', json={"quality": 500})
+        self.assertEqual(response.status_code, 400)
+
     def test_camera_toggle(self):
         """Test camera toggle endpoint"""
         # First login
@@ -181,11 +343,175 @@ class FlaskTestCase(unittest.TestCase):
             password="password"
         ), follow_redirects=True)
         
-        response = self.app.get('/active_users')
-        self.assertEqual(response.status_code, 200)
-        users = response.json
-        self.assertEqual(len(users), 1)
-        self.assertEqual(users[0]['name'], "Test User")
+        # Presence comes from the dashboard's socket, not from HTTP requests
+        self.assertEqual(self.app.get('/active_users').json, [])
+        client = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        try:
+            response = self.app.get('/active_users')
+            self.assertEqual(response.status_code, 200)
+            users = response.json
+            self.assertEqual(len(users), 1)
+            self.assertEqual(users[0]['name'], "Test User")
+        finally:
+            client.disconnect()
+        self.assertEqual(self.app.get('/active_users').json, [])
+
+    def test_uploads_cannot_take_over_streams(self):
+        """Test a socket can't upload to the webcam, another session's stream or an unsafe id"""
+        owner = socketio.test_client(app, query_string='EIO=4')
+        owner_sid = socketio.server.manager.sid_from_eio_sid(owner.eio_sid, '/')
+        streams.get("phone-x", owner=owner_sid)
+        client = socketio.test_client(app, query_string='EIO=4')
+        try:
+            for source_id in ("webcam", "phone-x", "cam\r\nX-Injected: 1", "x" * 65):
+                client.emit('android_frame_binary', {'data': b'jpeg', 'source_id': source_id})
+                replies = [r['args'][0] for r in client.get_received() if r['name'] == 'processed_frame']
+                self.assertEqual(replies[-1]['status'], 'error')
+            self.assertEqual(streams.get("phone-x", create=False).owner, owner_sid)
+        finally:
+            client.disconnect()
+            owner.disconnect()
+
+    def test_reconnected_phone_takes_over_its_stream(self):
+        """Test a new session takes over a stream whose owner is gone or is the same user"""
+        def publish(source_id, sid, user_id=None):
+            publish_stage({'source_id': source_id, 'sid': sid, 'user_id': user_id, 'jpeg': b'frame',
+                           'detections': [], 'barcodes': [], 'data': b'raw'})
+
+        # The old session dropped without a disconnect reaching the server
+        streams.claim("phone-y", "dropped-sid")
+        stranger = socketio.test_client(app, query_string='EIO=4')
+        stranger_sid = socketio.server.manager.sid_from_eio_sid(stranger.eio_sid, '/')
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        old = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        new = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        old_sid, new_sid = (socketio.server.manager.sid_from_eio_sid(c.eio_sid, '/') for c in (old, new))
+        try:
+            publish("phone-y", stranger_sid)
+            self.assertEqual(streams.get("phone-y", create=False).owner, stranger_sid)
+
+            # Still connected: only the same user may take it over
+            streams.claim("phone-z", old_sid)
+            with self.assertRaises(ValueError):
+                publish("phone-z", stranger_sid)
+            new.emit('android_frame_binary', {'data': b'jpeg', 'source_id': 'phone-z'})
+            replies = [r['args'][0] for r in new.get_received() if r['name'] == 'processed_frame']
+            self.assertFalse([r for r in replies if 'in use' in r.get('message', '')])
+            publish("phone-z", new_sid, "test123")
+            self.assertEqual(streams.get("phone-z", create=False).owner, new_sid)
+
+            # The old session's late disconnect leaves the stream alone
+            old.disconnect()
+            self.assertIsNotNone(streams.get("phone-z", create=False))
+        finally:
+            stranger.disconnect()
+            new.disconnect()
+
+    def test_chat_since_id(self):
+        """Test chat history can be fetched incrementally and is served from memory"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        for text in ("one", "two", "three"):
+            self.app.post('/chat/send', data=dict(message=text))
+        messages = self.app.get('/chat/messages').json
+        self.assertEqual([m['message'] for m in messages], ["one", "two", "three"])
+
+        with app.app_context():
+            ChatMessage.query.delete()
+            db.session.commit()
+        newer = self.app.get(f"/chat/messages?since_id={messages[0]['id']}").json
+        self.assertEqual([m['message'] for m in newer], ["two", "three"])
+        self.assertEqual(self.app.get('/chat/messages?room=nowhere').status_code, 404)
+
+    def test_chat_rejects_bad_input(self):
+        """Test over-long messages and a non-numeric since_id are rejected"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        response = self.app.post('/chat/send', data=dict(message="x" * 501))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.post('/chat/send', data=dict(message="x" * 500)).status_code, 200)
+
+        client = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        try:
+            ack = client.emit('join_chat', {'since_id': 'abc'}, callback=True)
+            self.assertEqual(ack['status'], 'error')
+            ack = client.emit('send_chat', {'message': 'x' * 501}, callback=True)
+            self.assertEqual(ack['status'], 'error')
+            self.assertEqual(len(self.app.get('/chat/messages').json), 1)
+        finally:
+            client.disconnect()
+
+    def test_chat_pushed_to_room_members(self):
+        """Test chat messages are pushed over Socket.IO only to clients in that room"""
+        app.config['CHAT_ROOMS'] = ['general', 'lane-3']
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        general = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        lane = socketio.test_client(app, flask_test_client=self.app, query_string='EIO=4')
+        try:
+            self.assertEqual(general.emit('join_chat', {'room': 'general'}, callback=True)['messages'], [])
+            lane.emit('join_chat', {'room': 'lane-3'}, callback=True)
+            ack = lane.emit('send_chat', {'room': 'lane-3', 'message': 'Truck at gate'}, callback=True)
+            self.assertEqual(ack['status'], 'success')
+
+            pushed = [e['args'][0] for e in lane.get_received() if e['name'] == 'chat_message']
+            self.assertEqual([m['message'] for m in pushed], ['Truck at gate'])
+            self.assertFalse([e for e in general.get_received() if e['name'] == 'chat_message'])
+        finally:
+            general.disconnect()
+            lane.disconnect()
+            app.config['CHAT_ROOMS'] = ['general']
+
+    def test_streams_of_other_workers(self):
+        """Test detections pushed by another worker are served from shared state"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ), follow_redirects=True)
+
+        shared.hset('streams', 'gate9', json.dumps({
+            "source_id": "gate9", "seq": 7, "objects": [{"label": "truck", "confidence": 88.0}],
+            "barcodes": [], "fps": 12.0, "quality": {}, "counts": {"active": {}, "total": {}},
+            "viewers": 1, "raw_viewers": 0, "worker": "other-worker", "updated_at": time.time()
+        }))
+        try:
+            response = self.app.get('/detections/gate9')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json['objects'][0]['label'], "truck")
+            self.assertEqual(response.json['seq'], 7)
+
+            listed = {s['source_id']: s for s in self.app.get('/streams').json}
+            self.assertEqual(listed['gate9']['worker'], "other-worker")
+        finally:
+            shared.hdel('streams', 'gate9')
+
+    def test_user_loader_cache(self):
+        """Test logged-in requests reuse the cached user and a password reset invalidates it"""
+        self.app.post('/login', data=dict(
+            email="test@example.com",
+            password="password"
+        ))
+        misses = user_cache.misses
+        for _ in range(3):
+            self.assertEqual(self.app.get('/active_users').status_code, 200)
+        self.assertEqual(user_cache.misses, misses + 1)
+
+        self.app.post('/reset_password', data=dict(
+            email="test@example.com",
+            password="newpassword",
+            confirm_password="newpassword"
+        ))
+        self.app.get('/active_users')
+        self.assertEqual(user_cache.misses, misses + 2)
 
     # Chat Message Time Filter Test
     def test_chat_message_time_filter(self):
@@ -225,5 +551,842 @@ class FlaskTestCase(unittest.TestCase):
         self.assertEqual(len(messages), 1)
         self.assertEqual(messages[0]['message'], "New message")
 
+class FramePipelineTestCase(unittest.TestCase):
+
+    def test_frame_queue_drops_oldest(self):
+        """Test the per-source queue keeps only the newest frames"""
+        queue = FrameQueue(maxsize=1)
+        self.assertEqual(queue.put("cam1", 1), 0)
+        self.assertEqual(queue.put("cam1", 2), 1)
+        self.assertEqual(queue.put("cam2", 3), 0)
+        self.assertEqual(queue.depth(), 2)
+        self.assertEqual(queue.get(timeout=0.1), ("cam1", 2))
+        self.assertEqual(queue.get(timeout=0.1), ("cam2", 3))
+        self.assertIsNone(queue.get(timeout=0.01))
+
+    def test_pipeline_bounds_backlog(self):
+        """Test a slow inference stage drops frames instead of queueing them"""
+        published = []
+        release = threading.Event()
+
+        def infer(job):
+            release.wait(1)
+            return job
+
+        pipeline = FramePipeline(infer, lambda job: job, published.append)
+        pipeline.start()
+        try:
+            for i in range(20):
+                pipeline.submit("cam1", {"seq": i})
+            release.set()
+            deadline = time.time() + 2
+            while time.time() < deadline and (not published or published[-1]["seq"] != 19):
+                time.sleep(0.01)
+        finally:
+            pipeline.stop()
+
+        stats = pipeline.snapshot()
+        self.assertEqual(stats["received"], 20)
+        self.assertEqual(published[-1]["seq"], 19)
+        self.assertLess(len(published), 20)
+        self.assertEqual(stats["processed"] + stats["dropped"], 20)
+
+    def test_stage_timings(self):
+        """Test every stage of a processed frame is reported to on_timing"""
+        timings = []
+        published = threading.Event()
+        pipeline = FramePipeline(lambda job: job, lambda job: job, lambda job: published.set(),
+                                 on_timing=lambda stage, seconds: timings.append((stage, seconds)))
+        pipeline.start()
+        try:
+            pipeline.submit("cam1", {"seq": 1})
+            self.assertTrue(published.wait(1))
+            deadline = time.time() + 1
+            while time.time() < deadline and len(timings) < 5:
+                time.sleep(0.01)
+        finally:
+            pipeline.stop()
+        self.assertEqual([stage for stage, _ in timings], ["queue", "infer", "encode", "publish", "total"])
+        self.assertTrue(all(seconds >= 0 for _, seconds in timings))
+
+class StreamRegistryTestCase(unittest.TestCase):
+
+    def test_streams_removed_with_owner(self):
+        """Test streams fed by a session are dropped when it disconnects"""
+        registry = StreamRegistry()
+        registry.get("phone-a", owner="sid1").update(b"a", [], [])
+        registry.get("phone-b", owner="sid2").update(b"b", [], [])
+        self.assertEqual(registry.latest().source_id, "phone-b")
+        self.assertEqual(registry.remove_owner("sid2"), ["phone-b"])
+        self.assertIsNone(registry.get("phone-b", create=False))
+        self.assertEqual(registry.latest().source_id, "phone-a")
+
+    def test_claim_keeps_existing_owner(self):
+        """Test a stream is only published to by the session that created it"""
+        registry = StreamRegistry()
+        registry.get("webcam")
+        self.assertIsNotNone(registry.claim("phone-a", "sid1"))
+        self.assertIsNone(registry.claim("phone-a", "sid2"))
+        self.assertIsNone(registry.claim("webcam", "sid2"))
+        self.assertFalse(registry.available("phone-a", "sid2"))
+        self.assertEqual(registry.get("phone-a", owner="sid2").owner, "sid1")
+
+    def test_wait_for_frame(self):
+        """Test viewers only get frames newer than the one they have"""
+        stream = StreamState("cam")
+        self.assertEqual(stream.wait_for_frame(0, timeout=0.01), (0, None))
+        stream.update(b"frame", [], [])
+        self.assertEqual(stream.wait_for_frame(0, timeout=0.01), (1, b"frame"))
+        self.assertEqual(stream.wait_for_frame(1, timeout=0.01), (1, None))
+
+    def test_take_push_only_on_change(self):
+        """Test detection pushes are only produced when results change"""
+        stream = StreamState("cam")
+        stream.update(b"1", [{"label": "truck", "confidence": 90.0}], [])
+        self.assertEqual(stream.take_push()["objects"][0]["label"], "truck")
+        stream.update(b"2", [{"label": "truck", "confidence": 90.0}], [])
+        self.assertIsNone(stream.take_push())
+        stream.update(b"3", [], [{"data": "CONT123", "type": "CODE128"}])
+        self.assertEqual(stream.take_push()["barcodes"][0]["data"], "CONT123")
+
+    def test_raw_frames_and_overlay(self):
+        """Test raw frames share the annotated frame's seq and the overlay carries it"""
+        stream = StreamState("cam")
+        stream.update(None, [{"label": "truck", "confidence": 90.0, "box": [1, 2, 3, 4], "track_id": 7}],
+                      [{"data": "CONT1", "type": "QRCODE", "rect": [5, 6, 7, 8]}], raw=b"raw1")
+        self.assertEqual(stream.wait_for_frame(0, timeout=0.01, raw=True), (1, b"raw1"))
+        self.assertEqual(stream.wait_for_frame(0, timeout=0.01), (1, None))
+        self.assertEqual(stream.overlay(), {
+            "source_id": "cam",
+            "seq": 1,
+            "width": None,
+            "height": None,
+            "boxes": [[1, 2, 3, 4, "truck", 90.0, 7]],
+            "codes": [[5, 6, 7, 8, "QRCODE", "CONT1"]]
+        })
+
+        # A downscaled JPEG still gets boxes in source pixels, with the size to scale them by
+        stream.update(None, [], [], raw=b"raw2", size=(1920, 1080))
+        self.assertEqual((stream.overlay()["width"], stream.overlay()["height"]), (1920, 1080))
+
+    def test_producer_backs_off_and_recovers_from_errors(self):
+        """Test a failing producer keeps its thread, backs off, logs once and recovers"""
+        calls = []
+
+        def produce():
+            calls.append(time.monotonic())
+            if len(calls) <= 4:
+                raise RuntimeError("Model not ready (failed)")
+            time.sleep(0.01)
+            return True
+
+        producer = FrameProducer(produce, idle_timeout=5.0, max_backoff=0.2)
+        with self.assertLogs('streams', level='ERROR') as logs:
+            producer.demand()
+            deadline = time.monotonic() + 5
+            while len(calls) < 6 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        try:
+            self.assertTrue(producer.running)
+            self.assertEqual(producer.errors, 4)
+            self.assertEqual(len(logs.records), 1)
+            # Retries wait 0.1s, then 0.2s, capped at max_backoff
+            self.assertGreaterEqual(calls[2] - calls[1], 0.19)
+            self.assertLess(calls[4] - calls[3], 0.5)
+        finally:
+            producer._last_demand = 0.0
+
+    def test_ring_skips_ahead_for_slow_viewers(self):
+        """Test a viewer that falls behind the ring jumps to the newest frame"""
+        ring = FrameRing(capacity=3)
+        for frame in (b"1", b"2", b"3", b"4", b"5"):
+            ring.append(frame)
+        self.assertEqual(ring.next_after(3), (4, b"4"))
+        self.assertEqual(ring.next_after(1), (5, b"5"))
+        self.assertIsNone(ring.next_after(5))
+
+class TransportTestCase(unittest.TestCase):
+
+    def test_binary_frame_round_trip(self):
+        """Test the binary frame header survives a pack/unpack round trip"""
+        packed = pack_frame(b"\xff\xd8jpeg", source_id="lane-1", seq=42, captured_at=1700000000.5)
+        source_id, seq, captured_at, jpeg = unpack_frame(packed)
+        self.assertEqual(source_id, "lane-1")
+        self.assertEqual(seq, 42)
+        self.assertAlmostEqual(captured_at, 1700000000.5)
+        self.assertEqual(bytes(jpeg), b"\xff\xd8jpeg")
+
+    def test_binary_frame_rejects_truncated_payload(self):
+        """Test truncated binary frames raise ValueError"""
+        with self.assertRaises(ValueError):
+            unpack_frame(b"\x01\x00")
+        with self.assertRaises(ValueError):
+            unpack_frame(pack_frame(b"", source_id="lane-1"))
+
+    def test_data_url_payload(self):
+        """Test the legacy base64 data URL path still decodes"""
+        self.assertEqual(decode_data_url("data:image/jpeg;base64,aGVsbG8="), b"hello")
+        self.assertEqual(decode_data_url({"data": "data:image/jpeg;base64,aGVsbG8="}), b"hello")
+
+    def test_reduced_jpeg_decode(self):
+        """Test large JPEGs are decoded at reduced size and small ones at full size"""
+        jpeg = cv2.imencode('.jpg', np.zeros((1080, 1920, 3), np.uint8))[1].tobytes()
+        self.assertEqual(jpeg_size(jpeg), (1920, 1080))
+        self.assertIsNone(jpeg_size(b"not a jpeg"))
+
+        frame, reduction = decode_jpeg(jpeg, min_width=960)
+        self.assertEqual((reduction, frame.shape), (2, (540, 960, 3)))
+        frame, reduction = decode_jpeg(jpeg, min_width=480)
+        self.assertEqual((reduction, frame.shape), (4, (270, 480, 3)))
+        frame, reduction = decode_jpeg(jpeg)
+        self.assertEqual((reduction, frame.shape), (1, (1080, 1920, 3)))
+
+class QualityControllerTestCase(unittest.TestCase):
+
+    def test_degrades_and_recovers(self):
+        """Test the controller skips frames under load and restores full quality"""
+        quality = QualityController(target_fps=10, cooldown=0)
+        self.assertEqual(quality.mode()["mode"], "full")
+
+        # 250ms per detection against a 100ms budget
+        for _ in range(3):
+            quality.record(250.0)
+        self.assertGreater(quality.level, 0)
+        self.assertGreater(quality.detect_every, 1)
+        detected = [quality.should_detect("cam") for _ in range(quality.detect_every * 3)]
+        self.assertEqual(detected.count(True), 3)
+
+        for _ in range(10):
+            quality.record(5.0)
+        self.assertEqual(quality.mode()["mode"], "full")
+        self.assertEqual(quality.scale, 1.0)
+
+    def test_backlog_triggers_degradation(self):
+        """Test a growing inference queue lowers quality even when latency is fine"""
+        quality = QualityController(target_fps=10, cooldown=0, max_queue_depth=1)
+        quality.record(10.0, queue_depth=3)
+        self.assertEqual(quality.level, 1)
+
+    def test_keyframe_interval_at_full_quality(self):
+        """Test the detector only runs on keyframes even without load"""
+        quality = QualityController(keyframe_interval=3)
+        self.assertEqual(quality.mode()["mode"], "full")
+        detected = [quality.should_detect("cam") for _ in range(9)]
+        self.assertEqual(detected, [True, False, False] * 3)
+
+class BarcodeScannerTestCase(unittest.TestCase):
+
+    def make_frame(self):
+        qr = cv2.QRCodeEncoder.create().encode("MSCU1234567")
+        qr = cv2.resize(qr, (qr.shape[1] * 6, qr.shape[0] * 6), interpolation=cv2.INTER_NEAREST)
+        frame = np.full((720, 1280, 3), 255, np.uint8)
+        frame[300:300 + qr.shape[0], 600:600 + qr.shape[1]] = cv2.cvtColor(qr, cv2.COLOR_GRAY2BGR)
+        return frame, [560, 260, 600 + qr.shape[1] + 40, 300 + qr.shape[0] + 40]
+
+    def test_roi_scan_matches_full_scan(self):
+        """Test codes decoded from crops are reported in full-frame coordinates"""
+        frame, box = self.make_frame()
+        full = decode_codes(frame)
+        scanner = BarcodeScanner(full_scan_every=100)
+        scanner.scan(frame, [box], source_id="cam")  # First frame is a full scan
+        roi = scanner.scan(frame, [box], source_id="cam")
+
+        self.assertEqual(scanner.snapshot(), {"full_scans": 1, "roi_scans": 1})
+        self.assertEqual([c["data"] for c in roi], ["MSCU1234567"])
+        for roi_value, full_value in zip(roi[0]["rect"], full[0]["rect"]):
+            self.assertAlmostEqual(roi_value, full_value, delta=2)
+
+    def test_recent_codes_are_rescanned_without_boxes(self):
+        """Test a code seen recently is found again when the detector gives no box"""
+        frame, _ = self.make_frame()
+        scanner = BarcodeScanner(full_scan_every=100)
+        scanner.scan(frame, [], source_id="cam")
+        roi = scanner.scan(frame, [], source_id="cam")
+        self.assertEqual(scanner.snapshot()["roi_scans"], 1)
+        self.assertEqual([c["data"] for c in roi], ["MSCU1234567"])
+
+class BarcodeTrackerTestCase(unittest.TestCase):
+
+    def code(self, data, x):
+        return {"data": data, "type": "CODE128", "rect": [x, 100, 80, 30]}
+
+    def test_new_code_reported_once(self):
+        """Test a code seen on consecutive frames is only new the first time"""
+        now = [1000.0]
+        tracker = BarcodeTracker(ttl=5, clock=lambda: now[0])
+        self.assertEqual(len(tracker.update("cam", [self.code("CONT1", 100)])), 1)
+        for x in (104, 110, 118):
+            now[0] += 0.1
+            self.assertEqual(tracker.update("cam", [self.code("CONT1", x)]), [])
+
+        active = tracker.active("cam")
+        self.assertEqual(len(active), 1)
+        self.assertEqual(active[0]["sightings"], 4)
+        self.assertEqual(active[0]["first_seen"], 1000.0)
+
+    def test_same_data_far_apart_is_a_new_code(self):
+        """Test two labels with the same data in different places are tracked separately"""
+        tracker = BarcodeTracker()
+        tracker.update("cam", [self.code("CONT1", 100)])
+        self.assertEqual(len(tracker.update("cam", [self.code("CONT1", 900)])), 1)
+        self.assertEqual(len(tracker.update("other", [self.code("CONT1", 100)])), 1)
+
+    def test_code_is_new_again_after_ttl(self):
+        """Test codes are evicted after the TTL and reported again when they return"""
+        now = [1000.0]
+        tracker = BarcodeTracker(ttl=5, clock=lambda: now[0])
+        tracker.update("cam", [self.code("CONT1", 100)])
+        now[0] += 6
+        self.assertEqual(tracker.active(), [])
+        self.assertEqual(len(tracker.update("cam", [self.code("CONT1", 100)])), 1)
+
+class ObjectTrackerTestCase(unittest.TestCase):
+
+    def det(self, x, label="person"):
+        return {"label": label, "confidence": 90.0, "box": [x, 100, x + 50, 200]}
+
+    def test_iou_matrix(self):
+        """Test pairwise IoU of identical, disjoint and half-overlapping boxes"""
+        a = np.array([[0, 0, 10, 10]], dtype=float)
+        b = np.array([[0, 0, 10, 10], [20, 20, 30, 30], [5, 0, 15, 10]], dtype=float)
+        np.testing.assert_allclose(iou_matrix(a, b), [[1.0, 0.0, 1 / 3]])
+
+    def test_track_ids_are_stable_across_keyframes(self):
+        """Test a moving object keeps its track id and dwell time grows"""
+        now = [1000.0]
+        tracker = ObjectTracker(clock=lambda: now[0])
+        first = tracker.update([self.det(100), self.det(400, "car")])
+        for x in (110, 120, 130):
+            now[0] += 0.5
+            result = tracker.update([self.det(x), self.det(400, "car")])
+        self.assertEqual([d["track_id"] for d in result], [d["track_id"] for d in first])
+        self.assertEqual(result[0]["dwell"], 1.5)
+        self.assertEqual(tracker.counts(), {"active": {"person": 1, "car": 1},
+                                            "total": {"person": 1, "car": 1}})
+
+    def test_predict_moves_boxes_between_keyframes(self):
+        """Test predicted boxes follow the estimated velocity"""
+        tracker = ObjectTracker()
+        tracker.update([self.det(100)])
+        tracker.update([self.det(110)])
+        self.assertEqual(tracker.predict()[0]["box"][0], 115)
+        self.assertEqual(tracker.predict()[0]["box"][0], 120)
+
+    def test_lost_tracks_are_dropped(self):
+        """Test a track is removed after max_missed keyframes without a match"""
+        tracker = ObjectTracker(max_missed=2)
+        tracker.update([self.det(100)])
+        for _ in range(3):
+            tracker.update([])
+        self.assertEqual(tracker.counts()["active"], {})
+        self.assertEqual(tracker.counts()["total"], {"person": 1})
+        self.assertNotEqual(tracker.update([self.det(100)])[0]["track_id"], 1)
+
+class EventStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = EventStore(os.path.join(self.tmpdir.name, "events.db"), flush_interval=0.01).start()
+
+    def tearDown(self):
+        self.store.stop()
+        self.tmpdir.cleanup()
+
+    def test_barcode_sightings_by_data_and_time(self):
+        """Test sightings of one code are filtered by source and time range"""
+        code = {"data": "CONT1", "type": "CODE128", "rect": [1, 2, 3, 4]}
+        self.store.record_barcodes("lane1", [code], ts=1000.0)
+        self.store.record_barcodes("lane2", [code], ts=2000.0)
+        self.store.record_barcodes("lane1", [dict(code, data="CONT2")], ts=3000.0)
+        self.assertTrue(self.store.flush())
+
+        sightings = self.store.barcode_sightings("CONT1")
+        self.assertEqual([s["source_id"] for s in sightings], ["lane2", "lane1"])
+        self.assertEqual(len(self.store.barcode_sightings("CONT1", source_id="lane1")), 1)
+        self.assertEqual(len(self.store.barcode_sightings("CONT1", since=1500.0)), 1)
+        self.assertEqual(sightings[0]["rect"], [1, 2, 3, 4])
+
+    def test_hourly_counts_rollup(self):
+        """Test detections are counted per label per hour"""
+        truck = {"label": "truck", "confidence": 90.0, "box": [0, 0, 10, 10]}
+        self.store.record_detections("cam", [truck, truck], ts=3600.0 * 5 + 10)
+        self.store.record_detections("cam", [truck, dict(truck, label="person")], ts=3600.0 * 6 + 10)
+        self.assertTrue(self.store.flush())
+
+        self.assertEqual(self.store.hourly_counts(), [
+            {"hour": 18000, "label": "truck", "count": 2},
+            {"hour": 21600, "label": "person", "count": 1},
+            {"hour": 21600, "label": "truck", "count": 1}
+        ])
+        self.assertEqual(len(self.store.hourly_counts(since=3600.0 * 6)), 2)
+        self.assertEqual(len(self.store.detection_events(label="truck")), 3)
+
+class JpegEncoderTestCase(unittest.TestCase):
+
+    def test_per_stream_quality_and_size(self):
+        """Test stream settings override the defaults and frames are downscaled"""
+        frame = np.random.default_rng(0).integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+        encoder = JpegEncoder(quality=90, max_width=640, backend="opencv")
+        encoder.configure("lane1", quality=40)
+
+        default = encoder.encode(frame, "lane2")
+        reduced = encoder.encode(frame, "lane1")
+        self.assertLess(len(reduced), len(default))
+        decoded = cv2.imdecode(np.frombuffer(reduced, np.uint8), cv2.IMREAD_COLOR)
+        self.assertEqual(decoded.shape, (360, 640, 3))
+        self.assertEqual(encoder.settings("lane1"), {"quality": 40, "max_width": 640})
+
+    def test_encode_stats(self):
+        """Test encode time and size are tracked per stream"""
+        encoder = JpegEncoder(backend="opencv")
+        frame = np.zeros((120, 160, 3), np.uint8)
+        jpeg = encoder.encode(frame, "cam")
+        encoder.encode(frame, "cam")
+        stats = encoder.stats("cam")
+        self.assertEqual(stats["frames"], 2)
+        self.assertEqual(stats["last_bytes"], len(jpeg))
+        self.assertGreater(stats["avg_ms"], 0)
+        with self.assertRaises(ValueError):
+            encoder.configure("cam", quality=0)
+
+class ModelLoaderTestCase(unittest.TestCase):
+
+    def test_ready_after_load_and_warm_up(self):
+        """Test the loader only reports ready once the warm-up inference has run"""
+        calls = []
+        warm_up_started = threading.Event()
+        release = threading.Event()
+
+        def warm_up():
+            calls.append("warm_up")
+            warm_up_started.set()
+            release.wait(1)
+
+        loader = ModelLoader(lambda: calls.append("load"), warm_up).start()
+        self.assertTrue(warm_up_started.wait(1))
+        self.assertEqual(loader.state, "warming_up")
+        self.assertFalse(loader.wait(0.01))
+        release.set()
+        self.assertTrue(loader.wait(1))
+        self.assertEqual(calls, ["load", "warm_up"])
+        self.assertIn("boot_to_ready_s", loader.snapshot())
+
+    def test_failed_load(self):
+        """Test a failing model load is reported instead of hanging callers"""
+        def load():
+            raise OSError("missing weights")
+        loader = ModelLoader(load, lambda: None).start()
+        self.assertFalse(loader.wait(1))
+        self.assertEqual(loader.state, "failed")
+        self.assertIn("missing weights", loader.snapshot()["error"])
+
+class PresenceTrackerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.changes = []
+        self.presence = PresenceTracker(timeout=60, clock=lambda: self.now,
+                                        on_change=lambda *change: self.changes.append(change))
+
+    def test_user_online_until_last_tab_closes(self):
+        """Test a user with several sockets stays online until all of them disconnect"""
+        self.assertTrue(self.presence.connect("sid1", "u1", "Ann Lee"))
+        self.assertFalse(self.presence.connect("sid2", "u1", "Ann Lee"))
+        self.presence.connect("sid3", "u2", "Bob Ray")
+        self.assertEqual(self.presence.users(), [{"user_id": "u1", "name": "Ann Lee"},
+                                                 {"user_id": "u2", "name": "Bob Ray"}])
+        self.assertFalse(self.presence.disconnect("sid1"))
+        self.assertTrue(self.presence.is_online("u1"))
+        self.assertTrue(self.presence.disconnect("sid2"))
+        self.assertFalse(self.presence.disconnect("sid2"))
+        self.assertEqual(self.presence.users(), [{"user_id": "u2", "name": "Bob Ray"}])
+        self.assertEqual(self.changes, [("u1", "Ann Lee", True), ("u2", "Bob Ray", True),
+                                        ("u1", "Ann Lee", False)])
+
+    def test_silent_sockets_expire(self):
+        """Test sockets without a heartbeat are dropped by the sweep"""
+        self.presence.connect("sid1", "u1", "Ann Lee")
+        self.presence.connect("sid2", "u2", "Bob Ray")
+        self.now = 50
+        self.assertTrue(self.presence.heartbeat("sid1"))
+        self.now = 70
+        self.assertEqual(self.presence.expire(), 1)
+        self.assertEqual([u["user_id"] for u in self.presence.users()], ["u1"])
+        self.assertFalse(self.presence.heartbeat("sid2"))
+        self.assertEqual(self.changes[-1], ("u2", "Bob Ray", False))
+
+class SharedStateTestCase(unittest.TestCase):
+
+    def test_local_state_hashes_and_publish(self):
+        """Test the in-process shared state stores hashes and delivers messages as bytes"""
+        state = LocalState()
+        state.hset("streams", "cam1", "{}")
+        state.hdel("streams", "missing")
+        self.assertEqual(state.hgetall("streams"), {"cam1": "{}"})
+
+        received = []
+        state.subscribe("chat", received.append)
+        self.assertEqual(state.publish("chat", "hello"), 1)
+        state.unsubscribe("chat", received.append)
+        self.assertEqual(state.publish("chat", "again"), 0)
+        self.assertEqual(received, [b"hello"])
+
+    def test_presence_across_workers(self):
+        """Test a user stays online while any worker has a socket for them"""
+        state = LocalState()
+        now = [1000.0]
+        changes = []
+        workers = [SharedPresence(state, f"worker{i}", PresenceTracker(),
+                                  on_change=lambda *change: changes.append(change), clock=lambda: now[0])
+                   for i in range(2)]
+        for worker in workers:
+            worker.publish()
+
+        workers[0].connect("sid1", "u1", "Ann")
+        workers[1].connect("sid2", "u1", "Ann")
+        workers[1].connect("sid3", "u2", "Bob")
+        self.assertEqual(changes, [("u1", "Ann", True), ("u2", "Bob", True)])
+        self.assertEqual([u["user_id"] for u in workers[0].users()], ["u1", "u2"])
+
+        workers[0].disconnect("sid1")
+        self.assertEqual(len(changes), 2)
+        workers[1].disconnect("sid2")
+        self.assertEqual(changes[-1], ("u1", "Ann", False))
+
+        # A worker that stops refreshing its entry drops out after the ttl
+        now[0] += workers[1].ttl + 1
+        workers[0].publish()
+        self.assertEqual(workers[0].users(), [])
+        self.assertEqual(list(state.hgetall("presence")), ["worker0"])
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the cache stays bounded and evicts the entry unused the longest"""
+        cache = LRUCache(max_size=2)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        self.assertEqual(cache.get(1), "a")
+        cache.put(3, "c")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), "c")
+        stats = cache.snapshot()
+        self.assertEqual((stats["size"], stats["hits"], stats["misses"], stats["evictions"]), (2, 2, 1, 1))
+
+    def test_entries_expire_after_ttl(self):
+        """Test entries are not served after their TTL or once invalidated"""
+        now = [0.0]
+        cache = LRUCache(ttl=10, clock=lambda: now[0])
+        cache.put(1, "a")
+        cache.put(2, "b")
+        now[0] = 9
+        self.assertEqual(cache.get(1), "a")
+        cache.invalidate(2)
+        self.assertIsNone(cache.get(2))
+        now[0] = 10
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.snapshot()["expirations"], 1)
+
+class ChatHistoryTestCase(unittest.TestCase):
+
+    def test_ring_buffer_and_age_limit(self):
+        """Test only the newest messages within the age limit are kept and returned"""
+        now = [datetime(2024, 1, 1, 12, 0)]
+        history = ChatHistory(max_messages=3, max_age=3600, clock=lambda: now[0])
+        for i in range(1, 5):
+            history.add("general", now[0] - timedelta(minutes=90 - i * 30), {"id": i})
+        self.assertEqual([m["id"] for m in history.since("general")], [2, 3, 4])
+        self.assertEqual([m["id"] for m in history.since("general", since_id=3)], [4])
+        now[0] += timedelta(minutes=31)
+        self.assertEqual([m["id"] for m in history.since("general")], [3, 4])
+
+    def test_load_merges_messages_added_meanwhile(self):
+        """Test filling a room from the database keeps messages sent during the query"""
+        sent_at = datetime.utcnow()
+        history = ChatHistory()
+        history.add("general", sent_at, {"id": 3})
+        self.assertFalse(history.loaded("general"))
+        history.load("general", [(sent_at, {"id": 1}), (sent_at, {"id": 2}), (sent_at, {"id": 3})])
+        history.load("general", [])
+        self.assertTrue(history.loaded("general"))
+        self.assertEqual([m["id"] for m in history.since("general")], [1, 2, 3])
+
+class DetectorsTestCase(unittest.TestCase):
+
+    def test_letterbox(self):
+        """Test frames are resized keeping the aspect ratio and padded to a square"""
+        image, ratio, pad = letterbox(np.zeros((720, 1280, 3), np.uint8), 640)
+        self.assertEqual(image.shape, (640, 640, 3))
+        self.assertEqual(ratio, 0.5)
+        self.assertEqual(pad, (0, 140))
+        self.assertEqual(tuple(image[0, 0]), (114, 114, 114))
+
+    def test_postprocess_maps_boxes_to_frame(self):
+        """Test exported model output is filtered, deduplicated and scaled back to the frame"""
+        output = np.zeros((84, 8400), np.float32)
+        for anchor, (cx, cy, score) in enumerate([(320, 320, 0.9), (322, 320, 0.8), (100, 100, 0.1)]):
+            output[:4, anchor] = (cx, cy, 100, 50)
+            output[4 + 2, anchor] = score
+        boxes = postprocess(output, 0.5, (0, 140), (720, 1280, 3), 0.25, 0.7)
+        self.assertEqual(len(boxes), 1)
+        np.testing.assert_allclose(boxes[0], [540, 310, 740, 410, 0.9, 2], rtol=1e-5)
+
+    def test_guess_backend(self):
+        """Test the backend is picked from the model path"""
+        self.assertEqual(guess_backend("yolov8n.pt"), "pytorch")
+        self.assertEqual(guess_backend("yolov8n.onnx"), "onnx")
+        self.assertEqual(guess_backend("yolov8n_int8_openvino_model/"), "openvino")
+
+def crash_on_source(source):
+    """Stand-in for a worker's analysis of one source: its process dies on 'crash'."""
+    if source.name == "crash":
+        time.sleep(0.5)  # Let this worker's earlier results leave its queue feeder first
+        os._exit(1)
+    yield {"source_id": source.name, "frame": 0}
+
+class OfflineAnalysisTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.video = os.path.join(self.tmp.name, "gate.avi")
+        writer = cv2.VideoWriter(self.video, cv2.VideoWriter_fourcc(*"MJPG"), 10, (320, 240))
+        for _ in range(10):
+            writer.write(np.zeros((240, 320, 3), np.uint8))
+        writer.release()
+        os.makedirs(os.path.join(self.tmp.name, "stills"))
+        cv2.imwrite(os.path.join(self.tmp.name, "stills", "1.jpg"), np.zeros((60, 80, 3), np.uint8))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_find_sources(self):
+        """Test folders expand into their videos plus one image sequence"""
+        sources = find_sources([self.tmp.name, os.path.join(self.tmp.name, "stills")])
+        self.assertEqual([(s.name, s.kind) for s in sources],
+                         [(self.video, "video"), (os.path.join(self.tmp.name, "stills"), "images")])
+        with self.assertRaises(ValueError):
+            find_sources([os.path.join(self.tmp.name, "notes.txt")])
+
+    def test_video_frames_batched_and_tracked(self):
+        """Test every Nth frame is detected in batches and tracked on the recording clock"""
+        batch_sizes = []
+
+        class Detector:
+            def predict_batch(self, frames):
+                batch_sizes.append(len(frames))
+                return [Detections(np.array([[10, 10, 60, 60, 0.9, 0]], np.float32), {0: "truck"})
+                        for _ in frames]
+
+        source = find_sources([self.video])[0]
+        records = list(analyze_source(source, Detector(), None, batch_size=4, stride=2, start=1000.0))
+        self.assertEqual(batch_sizes, [4, 1])
+        self.assertEqual([r["frame"] for r in records], [0, 2, 4, 6, 8])
+        self.assertEqual([r["timestamp"] for r in records], [1000.0, 1000.2, 1000.4, 1000.6, 1000.8])
+        self.assertEqual({d["track_id"] for r in records for d in r["detections"]}, {1})
+        self.assertEqual([len(r["new_tracks"]) for r in records], [1, 0, 0, 0, 0])
+        self.assertEqual(records[-1]["detections"][0]["dwell"], 0.8)
+
+    def test_prefetch_is_bounded(self):
+        """Test the decode thread stays at most a few items ahead of the consumer"""
+        produced = []
+
+        def frames():
+            for i in range(100):
+                produced.append(i)
+                yield i
+
+        items = prefetch(frames(), depth=2)
+        self.assertEqual(next(items), 0)
+        time.sleep(0.1)
+        self.assertLessEqual(len(produced), 4)
+        items.close()
+
+    def test_parallel_run_reports_sources_of_dead_workers(self):
+        """Test a source whose worker process dies is reported failed instead of hanging the run"""
+        sources = [Source(name, "images", []) for name in ("lane1", "crash", "lane2")]
+        messages = list(run_parallel(sources, 2, "stub.pt", "auto", 1, 1, 1, None,
+                                     records=crash_on_source, poll_interval=0.2))
+        done = {m[1]: m[2:] for m in messages if m[0] == "done"}
+        self.assertEqual(done["lane1"], (1, None))
+        self.assertEqual(done["lane2"], (1, None))
+        self.assertIn("exited", done["crash"][1])
+        self.assertFalse([m for m in messages if m[0] == "started"])
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test histogram buckets, sum and count in the text format"""
+        registry = MetricsRegistry()
+        latency = registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.01, 0.1))
+        for value in (0.005, 0.01, 0.05, 3):
+            latency.labels('infer').observe(value)
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[:2], ['# HELP stage_seconds Stage time', '# TYPE stage_seconds histogram'])
+        self.assertIn('stage_seconds_bucket{stage="infer",le="0.01"} 2', lines)
+        self.assertIn('stage_seconds_bucket{stage="infer",le="0.1"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="infer",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_sum{stage="infer"} 3.065', lines)
+        self.assertIn('stage_seconds_count{stage="infer"} 4', lines)
+
+    def test_counters_gauges_and_callbacks(self):
+        """Test counters, gauges and values read from a callback at render time"""
+        registry = MetricsRegistry()
+        requests = registry.counter('requests_total', 'Requests', ['route'])
+        requests.labels('/login').inc()
+        requests.labels('/login').inc()
+        clients = registry.gauge('clients', 'Clients').labels()
+        clients.inc()
+        fps = {'lane "1"': 14.5}
+        registry.gauge('stream_fps', 'FPS', ['source_id'], callback=lambda: dict(fps))
+        registry.counter('dropped_total', 'Dropped', callback=lambda: 7)
+
+        text = registry.render()
+        self.assertIn('requests_total{route="/login"} 2\n', text)
+        self.assertIn('clients 1\n', text)
+        self.assertIn('stream_fps{source_id="lane \\"1\\""} 14.5\n', text)
+        self.assertIn('dropped_total 7\n', text)
+        fps.clear()
+        self.assertNotIn('stream_fps{', registry.render())
+
+def stub_analyzer(model_path, threads):
+    """Stand-in for load_yolo_analyzer in worker processes: inverts the frame, no model."""
+    def analyze(frame, scale=1.0, source_id=None, annotate=True):
+        if source_id == "fail":
+            raise ValueError("bad frame")
+        detections = [{"label": "mean", "confidence": float(frame.mean())}]
+        return (255 - frame if annotate else None), detections, []
+    return analyze
+
+class ProcessPoolEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = ProcessPoolEngine("stub.pt", workers=1, slot_bytes=64 * 64 * 3,
+                                        load_analyzer=stub_analyzer).start()
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_frames_round_trip_and_slot_grows(self):
+        """Test frames are analyzed in a worker and a slot grows for bigger frames"""
+        annotated, detections, codes = self.engine.process(np.full((32, 32, 3), 10, np.uint8))
+        self.assertTrue((annotated == 245).all())
+        self.assertEqual(detections[0]["confidence"], 10.0)
+
+        big = np.full((128, 96, 3), 20, np.uint8)
+        annotated, _, _ = self.engine.process(big)
+        self.assertEqual(annotated.shape, big.shape)
+        self.assertTrue((annotated == 235).all())
+        self.assertGreaterEqual(self.engine._workers[0].slot.size, big.nbytes)
+
+        annotated, detections, _ = self.engine.process(big, annotate=False)
+        self.assertIsNone(annotated)
+        self.assertEqual(self.engine.snapshot()["frames"], [3])
+
+    def test_analyzer_error_and_killed_worker(self):
+        """Test an analyzer error fails one frame and a killed worker is restarted"""
+        frame = np.zeros((16, 16, 3), np.uint8)
+        with self.assertRaises(RuntimeError):
+            self.engine.process(frame, source_id="fail")
+        self.engine.process(frame)
+
+        worker = self.engine._workers[0]
+        worker.process.kill()
+        worker.process.join(5)
+        with self.assertRaises(RuntimeError):
+            self.engine.process(frame)
+        annotated, _, _ = self.engine.process(frame)
+        self.assertTrue((annotated == 255).all())
+        snapshot = self.engine.snapshot()
+        self.assertEqual(snapshot["restarts"], 1)
+        self.assertEqual(snapshot["alive"], 1)
+
+    def test_workers_started_from_a_script_do_not_boot_the_app(self):
+        """Test spawned workers re-importing a script that imports run.py don't start a second app"""
+        root = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            script = os.path.join(tmpdir, "entry.py")
+            with open(script, "w") as f:
+                f.write(f"""import sys
+sys.path.insert(0, {root!r})
+import numpy as np
+import run
+from test import stub_analyzer
+from workers import ProcessPoolEngine
+
+if __name__ == "__main__":
+    engine = ProcessPoolEngine("stub.pt", workers=2, load_analyzer=stub_analyzer).start()
+    try:
+        print(engine.process(np.full((8, 8, 3), 3, np.uint8))[1][0]["confidence"])
+    finally:
+        engine.stop()
+""")
+            env = dict(os.environ, EVENTS_DB_PATH=os.path.join(tmpdir, "events.db"), MESSAGE_QUEUE="")
+            result = subprocess.run([sys.executable, script], cwd=tmpdir, env=env,
+                                    capture_output=True, text=True, timeout=120)
+            self.assertEqual(result.returncode, 0, result.stderr)
+            self.assertEqual(result.stdout.strip(), "3.0")
+            self.assertNotIn("Model loading", result.stderr)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "events.db")))
+
+class BatchSchedulerTestCase(unittest.TestCase):
+
+    def test_concurrent_frames_share_a_batch(self):
+        """Test frames from concurrent callers are run as one batch"""
+        batch_sizes = []
+
+        def predict_batch(frames):
+            batch_sizes.append(len(frames))
+            return [frame * 2 for frame in frames]
+
+        scheduler = BatchScheduler(predict_batch, max_batch_size=4, max_wait_ms=50).start()
+        results = {}
+        try:
+            threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, scheduler.predict(i)))
+                       for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            scheduler.stop()
+
+        self.assertEqual(results, {0: 0, 1: 2, 2: 4, 3: 6})
+        self.assertEqual(batch_sizes, [4])
+
+    def test_predict_without_scheduler_thread(self):
+        """Test predict runs inline when the scheduler is not started"""
+        scheduler = BatchScheduler(lambda frames: [f + 1 for f in frames])
+        self.assertEqual(scheduler.predict(1), 2)
+
+    def test_mismatched_results_fail_the_batch(self):
+        """Test every frame fails when predict_batch returns the wrong number of results"""
+        scheduler = BatchScheduler(lambda frames: frames[:1], max_batch_size=2, max_wait_ms=200).start()
+        try:
+            futures = [scheduler.submit(i) for i in range(2)]
+            for future in futures:
+                with self.assertRaises(RuntimeError):
+                    future.result(5)
+        finally:
+            scheduler.stop()
+
+    def test_stop_fails_pending_frames(self):
+        """Test frames still queued when the scheduler stops get an error instead of hanging"""
+        started, release = threading.Event(), threading.Event()
+
+        def predict_batch(frames):
+            started.set()
+            release.wait(5)
+            return frames
+
+        scheduler = BatchScheduler(predict_batch, max_batch_size=1, max_wait_ms=0).start()
+        first = scheduler.submit(1)
+        started.wait(5)
+        queued = scheduler.submit(2)
+        scheduler.stop(timeout=0.1)
+        release.set()
+        self.assertEqual(first.result(5), 1)
+        with self.assertRaises(RuntimeError):
+            queued.result(1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
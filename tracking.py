@@ -0,0 +1,178 @@
+import threading
+import time
+
+import numpy as np
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) arrays of [x1, y1, x2, y2] boxes."""
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class ObjectTracker:
+    """IoU-based multi-object tracker for one camera source.
+
+    Track state lives in NumPy arrays so matching and motion prediction are
+    vectorized. ``update`` is called on detector keyframes: detections are
+    matched greedily to tracks of the same label by IoU, unmatched
+    detections start new tracks and tracks missing for more than
+    ``max_missed`` keyframes are dropped. ``predict`` is called on the
+    frames in between and moves every box along its estimated velocity,
+    which costs a few array operations instead of a YOLO pass.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=3, clock=time.time):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.clock = clock
+        self.boxes = np.zeros((0, 4))
+        self.velocity = np.zeros((0, 4))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.missed = np.zeros(0, dtype=np.int64)
+        self.first_seen = np.zeros(0)
+        self.labels = []
+        self.confidences = []
+        self.frames_since_update = 0
+        self.started = []  # Detections that opened a new track on the last update
+        self.totals = {}  # label -> distinct tracks ever seen
+        self._next_id = 1
+
+    def update(self, detections):
+        """Match keyframe detections to tracks. Returns detections with track ids and dwell."""
+        now = self.clock()
+        steps = self.frames_since_update + 1
+        self.frames_since_update = 0
+        det_boxes = np.array([d["box"] for d in detections], dtype=float).reshape(-1, 4)
+
+        predicted = self.boxes + self.velocity * steps
+        iou = iou_matrix(predicted, det_boxes)
+        if iou.size:
+            same_label = np.array([[t == d["label"] for d in detections] for t in self.labels])
+            iou = np.where(same_label, iou, 0.0)
+
+        track_for_det = np.full(len(detections), -1)
+        if iou.size:
+            # Greedy assignment, best overlaps first
+            order = np.dstack(np.unravel_index(np.argsort(-iou, axis=None), iou.shape))[0]
+            used_tracks = set()
+            for t, d in order:
+                if iou[t, d] < self.iou_threshold:
+                    break
+                if t in used_tracks or track_for_det[d] != -1:
+                    continue
+                used_tracks.add(t)
+                track_for_det[d] = t
+
+        matched = track_for_det >= 0
+        tracks = track_for_det[matched]
+        if len(tracks):
+            new_velocity = (det_boxes[matched] - self.boxes[tracks]) / steps
+            self.velocity[tracks] = 0.5 * self.velocity[tracks] + 0.5 * new_velocity
+            self.boxes[tracks] = det_boxes[matched]
+            self.missed[tracks] = 0
+            for t, d in zip(tracks, np.flatnonzero(matched)):
+                self.confidences[t] = detections[d]["confidence"]
+
+        unmatched_tracks = np.ones(len(self.ids), dtype=bool)
+        unmatched_tracks[tracks] = False
+        self.missed[unmatched_tracks] += 1
+        self.boxes[unmatched_tracks] = predicted[unmatched_tracks]
+
+        new = np.flatnonzero(~matched)
+        if len(new):
+            self.boxes = np.vstack([self.boxes, det_boxes[new]])
+            self.velocity = np.vstack([self.velocity, np.zeros((len(new), 4))])
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + len(new))])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new), dtype=np.int64)])
+            self.first_seen = np.concatenate([self.first_seen, np.full(len(new), now)])
+            for d in new:
+                label = detections[d]["label"]
+                self.labels.append(label)
+                self.confidences.append(detections[d]["confidence"])
+                self.totals[label] = self.totals.get(label, 0) + 1
+            track_for_det[new] = np.arange(len(self.ids) - len(new), len(self.ids))
+            self._next_id += len(new)
+
+        result = []
+        for d, t in enumerate(track_for_det):
+            result.append(dict(detections[d], track_id=int(self.ids[t]),
+                               dwell=round(float(now - self.first_seen[t]), 1)))
+        self.started = [result[d] for d in new]
+
+        self._drop(self.missed > self.max_missed)
+        return result
+
+    def predict(self):
+        """Advance tracks by one frame without running the detector."""
+        self.frames_since_update += 1
+        now = self.clock()
+        visible = np.flatnonzero(self.missed == 0)
+        boxes = self.boxes[visible] + self.velocity[visible] * self.frames_since_update
+        return [{
+            "label": self.labels[t],
+            "confidence": self.confidences[t],
+            "box": [int(v) for v in box],
+            "track_id": int(self.ids[t]),
+            "dwell": round(float(now - self.first_seen[t]), 1)
+        } for t, box in zip(visible, boxes)]
+
+    def counts(self):
+        active = {}
+        for label in self.labels:
+            active[label] = active.get(label, 0) + 1
+        return {"active": active, "total": dict(self.totals)}
+
+    def _drop(self, mask):
+        if not mask.any():
+            return
+        keep = ~mask
+        self.boxes = self.boxes[keep]
+        self.velocity = self.velocity[keep]
+        self.ids = self.ids[keep]
+        self.missed = self.missed[keep]
+        self.first_seen = self.first_seen[keep]
+        self.labels = [l for l, k in zip(self.labels, keep) if k]
+        self.confidences = [c for c, k in zip(self.confidences, keep) if k]
+
+
+class TrackerRegistry:
+    """One ObjectTracker per camera source."""
+
+    def __init__(self, **tracker_args):
+        self.tracker_args = tracker_args
+        self._trackers = {}
+        self._lock = threading.Lock()
+
+    def _get(self, source_id):
+        tracker = self._trackers.get(source_id)
+        if tracker is None:
+            tracker = self._trackers[source_id] = ObjectTracker(**self.tracker_args)
+        return tracker
+
+    def update(self, source_id, detections):
+        """Returns the tracked detections and the ones that started a new track."""
+        with self._lock:
+            tracker = self._get(source_id)
+            return tracker.update(detections), tracker.started
+
+    def predict(self, source_id):
+        with self._lock:
+            return self._get(source_id).predict()
+
+    def counts(self, source_id):
+        with self._lock:
+            tracker = self._trackers.get(source_id)
+            return tracker.counts() if tracker else {"active": {}, "total": {}}
+
+    def forget(self, source_id):
+        with self._lock:
+            self._trackers.pop(source_id, None)
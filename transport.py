@@ -0,0 +1,97 @@
+import base64
+import struct
+import time
+
+import cv2
+import numpy as np
+
+# libjpeg DCT scaling: decode straight to 1/2 or 1/4 size without a full-size pass
+REDUCED_DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+# Start-of-frame markers that carry the image size (all but DHT/JPG/DAC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Binary android_frame header, big-endian:
+#   version (uint8), sequence number (uint32), capture time in unix ms (float64),
+#   source id length (uint8), then the UTF-8 source id and the raw JPEG bytes.
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('!BIdB')
+
+
+def pack_frame(jpeg, source_id='', seq=0, captured_at=None):
+    """Build a binary frame message. ``captured_at`` is unix time in seconds."""
+    if captured_at is None:
+        captured_at = time.time()
+    source = source_id.encode('utf-8')[:255]
+    header = FRAME_HEADER.pack(FRAME_VERSION, seq & 0xFFFFFFFF, captured_at * 1000.0, len(source))
+    return header + source + bytes(jpeg)
+
+
+def unpack_frame(payload):
+    """Parse a binary frame message without copying the JPEG bytes.
+
+    Returns ``(source_id, seq, captured_at, jpeg)`` where ``jpeg`` is a
+    memoryview into ``payload`` that can go straight to ``np.frombuffer``.
+    """
+    view = memoryview(payload)
+    if len(view) < FRAME_HEADER.size:
+        raise ValueError("Frame message too short")
+    version, seq, captured_ms, source_len = FRAME_HEADER.unpack_from(view)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+    start = FRAME_HEADER.size + source_len
+    if len(view) <= start:
+        raise ValueError("Frame message has no image data")
+    source_id = bytes(view[FRAME_HEADER.size:start]).decode('utf-8')
+    return source_id, seq, captured_ms / 1000.0, view[start:]
+
+
+def decode_data_url(data):
+    """Extract the JPEG bytes from a data URL, either bare or wrapped in a dict."""
+    payload = data['data'] if isinstance(data, dict) else data
+    return base64.b64decode(payload.split(",")[1])
+
+
+def jpeg_size(data):
+    """Read ``(width, height)`` from a JPEG's SOF header without decoding it.
+
+    Returns None if ``data`` is not a JPEG or the header can't be found.
+    """
+    view = memoryview(data)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 4 <= len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        length = (view[pos + 2] << 8) | view[pos + 3]
+        if marker in SOF_MARKERS:
+            if pos + 9 > len(view):
+                return None
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def decode_jpeg(data, min_width=0):
+    """Decode a JPEG for inference, as small as ``min_width`` allows.
+
+    Picks the largest DCT reduction (1, 2 or 4) that keeps the decoded
+    width at or above ``min_width`` and returns ``(frame, reduction)``;
+    multiply coordinates found in ``frame`` by ``reduction`` to get
+    coordinates in the original image.
+    """
+    reduction = 1
+    size = jpeg_size(data) if min_width else None
+    if size is not None:
+        for factor in (4, 2):
+            if size[0] // factor >= min_width:
+                reduction = factor
+                break
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_DECODE_FLAGS[reduction])
+    return frame, reduction
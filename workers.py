@@ -0,0 +1,197 @@
+import multiprocessing as mp
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3  # One 1080p BGR frame
+
+
+def load_yolo_analyzer(model_path, threads, backend="auto"):
+    """Load the model inside a worker process and return its frame analyzer."""
+    import cv2
+    from barcodes import BarcodeScanner
+    from detection import analyze_frame
+    from detectors import load_detector
+
+    # One or two threads per process scales better than every process fighting for all cores
+    cv2.setNumThreads(threads)
+    detector = load_detector(model_path, backend, threads)
+    scanner = BarcodeScanner(max_workers=threads)
+
+    def analyze(frame, scale=1.0, source_id=None, annotate=True):
+        return analyze_frame(frame, lambda f: detector.predict_batch([f])[0], scale, scanner, source_id,
+                             annotate)
+    return analyze
+
+
+def _worker_main(conn, load_analyzer, model_path, threads):
+    analyze = load_analyzer(model_path, threads)
+    conn.send(("ready", None))
+    shm = None
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            name, shape, scale, source_id, annotate = message
+            if shm is None or shm.name != name:
+                # The engine grew this worker's slot; drop the old mapping
+                if shm is not None:
+                    shm.close()
+                # Spawned workers share the parent's resource tracker, so the
+                # parent stays responsible for unlinking the segment
+                shm = shared_memory.SharedMemory(name=name)
+            frame = np.ndarray(shape, np.uint8, buffer=shm.buf)
+            try:
+                annotated, detections, codes = analyze(frame, scale, source_id, annotate)
+                if annotated is None:
+                    conn.send(("ok", (None, detections, codes)))
+                    continue
+                annotated = np.ascontiguousarray(annotated, dtype=np.uint8)
+                if annotated.nbytes > shm.size:
+                    raise ValueError("Annotated frame does not fit the shared slot")
+                # Write the result back over the input in the same slot
+                out = np.ndarray(annotated.shape, np.uint8, buffer=shm.buf)
+                out[...] = annotated
+                del out
+                conn.send(("ok", (annotated.shape, detections, codes)))
+            except Exception as e:
+                conn.send(("error", repr(e)))
+            finally:
+                del frame
+    finally:
+        if shm is not None:
+            shm.close()
+
+
+class _Worker:
+    def __init__(self, process, conn, slot):
+        self.process = process
+        self.conn = conn
+        self.slot = slot
+        self.ready = False
+        self.frames = 0
+        self.restarts = 0
+
+
+class ProcessPoolEngine:
+    """Pool of inference processes fed through shared-memory frame slots.
+
+    Each worker process loads the model once. Every worker owns one
+    shared-memory slot: the caller copies its frame into the slot, the
+    worker analyzes it in place and writes the annotated frame back, and
+    only the small detection/barcode lists travel over the pipe. Numpy
+    arrays are never pickled, and Flask/Socket.IO stay in the main process.
+
+    ``process(frame)`` is thread-safe and blocks until an idle worker has
+    produced ``(annotated_frame, detections, barcodes)``. A worker whose
+    process died is restarted in place; the frame it was given fails.
+    """
+
+    def __init__(self, model_path, workers=None, threads_per_worker=1,
+                 slot_bytes=DEFAULT_SLOT_BYTES, load_analyzer=load_yolo_analyzer):
+        self.model_path = model_path
+        self.workers = max(1, int(workers or mp.cpu_count()))
+        self.threads_per_worker = threads_per_worker
+        self.slot_bytes = slot_bytes
+        self.load_analyzer = load_analyzer
+        self._workers = []
+        self._idle = queue.Queue()
+
+    def start(self):
+        for index in range(self.workers):
+            process, conn = self._spawn(index)
+            slot = shared_memory.SharedMemory(create=True, size=self.slot_bytes)
+            self._workers.append(_Worker(process, conn, slot))
+            self._idle.put(index)
+        return self
+
+    def _spawn(self, index):
+        ctx = mp.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_worker_main, name=f"inference-worker-{index}",
+                              args=(child_conn, self.load_analyzer, self.model_path,
+                                    self.threads_per_worker),
+                              daemon=True)
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _restart(self, index):
+        """Replace a dead worker's process; it keeps its slot and index."""
+        worker = self._workers[index]
+        worker.conn.close()
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(1)
+        worker.process, worker.conn = self._spawn(index)
+        worker.ready = False
+        worker.restarts += 1
+
+    def stop(self, timeout=5.0):
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            worker.slot.close()
+            worker.slot.unlink()
+        self._workers = []
+
+    def process(self, frame, scale=1.0, source_id=None, annotate=True, timeout=None):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        index = self._idle.get(timeout=timeout)
+        worker = self._workers[index]
+        try:
+            if frame.nbytes > worker.slot.size:
+                worker.slot.close()
+                worker.slot.unlink()
+                worker.slot = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+
+            view = np.ndarray(frame.shape, np.uint8, buffer=worker.slot.buf)
+            view[...] = frame
+            del view
+            try:
+                worker.conn.send((worker.slot.name, frame.shape, scale, source_id, annotate))
+                status, payload = worker.conn.recv()
+                if status == "ready":
+                    # First frame for this worker waits for its model to load
+                    worker.ready = True
+                    status, payload = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                # The process died (or failed to load the model); don't hand out a dead index again
+                self._restart(index)
+                raise RuntimeError(f"Inference worker {index} died and was restarted: {e!r}") from e
+            if status == "error":
+                raise RuntimeError(f"Inference worker {index} failed: {payload}")
+
+            shape, detections, codes = payload
+            annotated = None
+            if shape is not None:
+                annotated = np.ndarray(shape, np.uint8, buffer=worker.slot.buf).copy()
+            worker.frames += 1
+            return annotated, detections, codes
+        finally:
+            self._idle.put(index)
+
+    def warm_up(self, frame, timeout=None):
+        """Run ``frame`` through every worker once so each has its model loaded and warm."""
+        with ThreadPoolExecutor(max_workers=len(self._workers)) as executor:
+            # Each call holds its worker until done, so N concurrent calls reach all N workers
+            list(executor.map(lambda _: self.process(frame, timeout=timeout), range(len(self._workers))))
+
+    def snapshot(self):
+        return {
+            "workers": len(self._workers),
+            "alive": sum(1 for w in self._workers if w.process.is_alive()),
+            "idle": self._idle.qsize(),
+            "frames": [w.frames for w in self._workers],
+            "restarts": sum(w.restarts for w in self._workers),
+        }